@@ -0,0 +1,306 @@
+import asyncio
+from collections import defaultdict
+import functools
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs
+import uuid
+
+from models import auth
+from models import metrics
+from models.player import LegalActions
+from models.registry import TableNotFound, WorkerPool, _table_id
+from models.serializer import JSON, MSGPACK, dumps
+from models.tracing import DEFAULT_PROFILE_DIRECTORY, Profiler
+
+# Same settings as the Flask server
+LOG_DIRECTORY = os.environ.get("POKER_LOG_DIRECTORY", "logs")
+WORKERS = int(os.environ.get("POKER_WORKERS", os.cpu_count() or 1))
+PROFILE_EVERY = int(os.environ.get("POKER_PROFILE_EVERY", 0))
+PROFILE_DIRECTORY = os.environ.get(
+    "POKER_PROFILE_DIRECTORY", DEFAULT_PROFILE_DIRECTORY)
+STORE_PATH = os.environ.get("POKER_STORE")
+
+CONTENT_TYPES = {JSON: b"application/json", MSGPACK: b"application/msgpack"}
+
+logger = logging.getLogger(__name__)
+
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+
+
+def _player(body) -> uuid.UUID:
+    return uuid.UUID(body["player_uuid"])
+
+
+# Endpoint: Poker method, arguments from the JSON body
+ACTIONS: Dict[str, Tuple[str, Callable[[Dict[str, Any]], tuple]]] = {
+    "add-player": ("add_player", lambda body: (body["name"],)),
+    "buy-in": ("buy_in", lambda body: (_player(body), int(body["amount"]))),
+    "start-game": ("start_game", lambda body: ()),
+    "deal": ("deal", lambda body: ()),
+    "end-round": ("end_round", lambda body: ()),
+    "flop": ("flop", lambda body: ()),
+    "turn": ("turn", lambda body: ()),
+    "river": ("river", lambda body: ()),
+    "showdown": ("showdown", lambda body: ()),
+    "check": ("check", lambda body: (_player(body),)),
+    "bet": ("bet", lambda body: (_player(body), int(body["amount"]))),
+    "call": ("call", lambda body: (_player(body), int(body["amount"]))),
+    "raise": ("raise_bet", lambda body: (_player(body), int(body["amount"]))),
+    "fold": ("fold", lambda body: (_player(body),)),
+    "cash-out": ("cash_out", lambda body: (_player(body),)),
+}
+# Endpoints answering with the method's result rather than the state
+RESULT_ENDPOINTS = frozenset(("add-player", "cash-out"))
+
+
+# Buckets of every endpoint up front, so timing a request allocates none
+_ENDPOINT_SECONDS = {
+    endpoint: metrics.REQUEST_SECONDS.child(endpoint) for endpoint in (
+        *ACTIONS, "state", "legal-actions", "tables", "metrics", "reconcile",
+        "other")}
+
+
+class App(object):
+    """ASGI app serving the Flask server's endpoints, plus a WebSocket per
+    client at /tables/<table_id>/ws?token=... Every action pushes the
+    changes to the table's state to all of its sockets, so clients don't
+    need to poll /state.
+
+    Tables run in a WorkerPool; calls to it block, so they run in the
+    default thread pool to keep the event loop free.
+    """
+
+    tables: Optional[WorkerPool]
+
+    def __init__(self, tables: Optional[WorkerPool] = None):
+        self.tables = tables
+        # Sockets of each table: viewer, state version last sent, format
+        self.sockets: Dict[str, Dict[Send, Tuple[Optional[uuid.UUID], int, str]]] = (
+            defaultdict(dict))
+
+    async def __call__(self, scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            start = time.perf_counter()
+            await self._http(scope, receive, send)
+            _ENDPOINT_SECONDS[_endpoint(scope)].observe(
+                time.perf_counter() - start)
+        elif scope["type"] == "websocket":
+            await self._websocket(scope, receive, send)
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                if self.tables is None:
+                    self.tables = WorkerPool(
+                        WORKERS, LOG_DIRECTORY,
+                        profiler=Profiler(PROFILE_EVERY, PROFILE_DIRECTORY),
+                        store_path=STORE_PATH)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.tables is not None:
+                    self.tables.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(func, *args, **kwargs))
+
+    async def _http(self, scope, receive: Receive, send: Send) -> None:
+        parts = scope["path"].strip("/").split("/")
+        method = scope["method"]
+        try:
+            query = _query(scope)
+            if parts == ["metrics"] and method == "GET":
+                collections = await self._run(self.tables.metrics)
+                collections.append(metrics.REGISTRY.collect())
+                return await _respond(
+                    send, 200, metrics.render(collections).encode(),
+                    content_type=metrics.CONTENT_TYPE.encode())
+            if parts == ["reconcile"] and method == "GET":
+                mismatches = await self._run(self.tables.reconcile)
+                return await _respond(send, 200, dumps({
+                    table_id: {str(account): chips
+                               for account, chips in accounts.items()}
+                    for table_id, accounts in mismatches.items()}), JSON)
+            if parts == ["tables"] and method == "POST":
+                table_id = await self._run(self.tables.create_table)
+                return await _respond(send, 200, table_id.encode())
+            if len(parts) != 3 or parts[0] != "tables":
+                return await _respond(send, 404, b"Not found")
+            # Canonical, so that every spelling of the id reaches its sockets
+            table_id, endpoint = _table_id(parts[1]), parts[2]
+            if endpoint == "state" and method == "GET":
+                _, state = await self._run(
+                    self.tables.call, table_id, **_view(scope, query, table_id))
+                return await _respond(send, 200, state, query["format"])
+            if endpoint == "legal-actions" and method == "GET":
+                player_uuid = query.get("player_uuid")
+                legal, _ = await self._run(
+                    self.tables.call, table_id, "legal_actions",
+                    None if player_uuid is None else uuid.UUID(player_uuid))
+                return await _respond(
+                    send, 200, dumps(LegalActions.to_dict(legal)), JSON)
+            if endpoint not in ACTIONS or method != "POST":
+                return await _respond(send, 404, b"Not found")
+
+            body = await _read_body(receive)
+            body = json.loads(body) if body else {}
+            if not isinstance(body, dict):
+                raise ValueError("Body must be a JSON object")
+            poker_method, parse = ACTIONS[endpoint]
+            args = parse(body)
+            result, state = await self._run(
+                self.tables.call, table_id, poker_method, *args,
+                **_view(scope, query, table_id))
+        except TableNotFound as error:
+            return await _respond(send, 404, str(error).encode())
+        except PermissionError as error:
+            return await _respond(send, 403, str(error).encode())
+        except (KeyError, ValueError) as error:
+            return await _respond(send, 400, str(error).encode())
+
+        # The action went through, whether or not its sockets hear of it
+        try:
+            await self._push(table_id)
+        except Exception:
+            logger.exception("Could not push table %s to its sockets", table_id)
+        if endpoint == "add-player":
+            await _respond(send, 200, dumps({
+                "player_uuid": str(result),
+                "token": auth.issue(table_id, result),
+            }), JSON)
+        elif endpoint in RESULT_ENDPOINTS:
+            await _respond(send, 200, str(result).encode())
+        else:
+            await _respond(send, 200, state, query["format"])
+
+    async def _websocket(self, scope, receive: Receive, send: Send) -> None:
+        parts = scope["path"].strip("/").split("/")
+        if (await receive())["type"] != "websocket.connect":
+            return
+        if len(parts) != 3 or parts[0] != "tables" or parts[2] != "ws":
+            return await send({"type": "websocket.close", "code": 4404})
+        try:
+            table_id = _table_id(parts[1])
+            options = _view(scope, _query(scope), table_id)
+            version, (state,) = await self._run(
+                self.tables.views, table_id,
+                ((options["viewer"], None, options["format"]),))
+        except TableNotFound:
+            return await send({"type": "websocket.close", "code": 4404})
+        except PermissionError:
+            return await send({"type": "websocket.close", "code": 4403})
+        except ValueError:
+            return await send({"type": "websocket.close", "code": 4400})
+
+        await send({"type": "websocket.accept"})
+        await send(_frame(state, options["format"]))
+        sockets = self.sockets[table_id]
+        sockets[send] = (options["viewer"], version, options["format"])
+        try:
+            # Push only: incoming messages are ignored until disconnect
+            while (await receive())["type"] != "websocket.disconnect":
+                pass
+        finally:
+            sockets.pop(send, None)
+            if not sockets:
+                self.sockets.pop(table_id, None)
+
+    async def _push(self, table_id: str) -> None:
+        """Sends every socket of the table the changes since the version it
+        last got, as seen by its player. Each distinct view is encoded once
+        by the table's worker."""
+        sockets = self.sockets.get(table_id)
+        if not sockets:
+            return
+        targets = list(sockets.items())
+        views = list(dict.fromkeys(view for _, view in targets))
+        version, encoded = await self._run(
+            self.tables.views, table_id, views)
+        messages = dict(zip(views, encoded))
+        results = await asyncio.gather(
+            *(send(_frame(messages[view], view[2])) for send, view in targets),
+            return_exceptions=True)
+        for (send, (viewer, _, format)), result in zip(targets, results):
+            if isinstance(result, Exception):
+                sockets.pop(send, None)
+            elif send in sockets and sockets[send][1] < version:
+                sockets[send] = (viewer, version, format)
+
+
+def _endpoint(scope) -> str:
+    parts = scope["path"].strip("/").split("/")
+    if len(parts) == 1 and parts[0] in _ENDPOINT_SECONDS:
+        return parts[0]
+    if len(parts) == 3 and parts[0] == "tables" and parts[2] in _ENDPOINT_SECONDS:
+        return parts[2]
+    return "other"
+
+
+def _query(scope) -> Dict[str, Any]:
+    values = parse_qs(scope.get("query_string", b"").decode())
+    return {name: value[0] for name, value in values.items()}
+
+
+def _view(scope, query: Dict[str, Any], table_id: str) -> Dict[str, Any]:
+    """Whose view to send back, see server._view. Browsers can't set
+    headers on a WebSocket, so sockets may pass their token as ?token=."""
+    headers = dict(scope.get("headers", ()))
+    token = headers.get(b"authorization", b"").decode("latin-1")
+    if not token and scope["type"] == "websocket":
+        token = query.get("token")
+    since_version = query.get("since_version")
+    return {
+        "viewer": auth.player(table_id, token),
+        "since_version": None if since_version is None else int(since_version),
+        "format": query.setdefault("format", JSON),
+    }
+
+
+def _frame(encoded: bytes, format: str) -> Dict[str, Any]:
+    if format == JSON:
+        return {"type": "websocket.send", "text": encoded.decode()}
+    return {"type": "websocket.send", "bytes": encoded}
+
+
+async def _read_body(receive: Receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _respond(send: Send,
+        status: int,
+        body: bytes,
+        format: Optional[str] = None,
+        content_type: Optional[bytes] = None) -> None:
+    """Sends a response in format, or plain text unless content_type."""
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type or CONTENT_TYPES.get(
+            format, b"text/plain; charset=utf-8"))],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+app = App()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", 8000)))
@@ -0,0 +1,4 @@
+"""Reproducible benchmarks for the hand evaluation hot paths.
+
+Run from the server directory with `python -m benchmarks --help`.
+"""
@@ -0,0 +1,178 @@
+import argparse
+import copy
+import datetime
+import gc
+import json
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from models.card import Card
+from models.deck import Deck
+from models.evaluator import evaluate
+from models.hand import determine_hand, Hand
+
+from .corpus import DEFAULT_SEED, random_hands, stratified_hands
+
+PERCENTILES = (50, 90, 99)
+
+
+def measure(func: Callable[[Any], Any], inputs: Sequence[Any],
+        repeat: int) -> Dict[str, Any]:
+    """Times func over every input: total throughput from a tight loop, and
+    per-call latency percentiles from individually timed calls."""
+    gc.collect()
+    gc.disable()
+    try:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for item in inputs:
+                func(item)
+            best = min(best, time.perf_counter() - start)
+
+        timings: List[int] = []
+        clock = time.perf_counter_ns
+        for item in inputs:
+            start = clock()
+            func(item)
+            timings.append(clock() - start)
+    finally:
+        gc.enable()
+
+    timings.sort()
+    result = {
+        "calls": len(inputs),
+        "per_sec": len(inputs) / best,
+    }
+    for percentile in PERCENTILES:
+        index = min(len(timings) - 1, len(timings) * percentile // 100)
+        result[f"p{percentile}_ns"] = timings[index]
+    result["max_ns"] = timings[-1]
+    return result
+
+
+def _split(cards: List[Card]):
+    return cards[:2], cards[2:]
+
+
+def benchmarks(size: int, seed: int) -> Dict[str, Callable[[], tuple]]:
+    """Named (func, inputs) factories, built lazily so --filter skips the
+    corpus generation of unselected benchmarks."""
+    def hand_corpus(num_cards: int):
+        return [_split(cards) for cards in random_hands(size, num_cards, seed)]
+
+    def stratified(type_name: Optional[str] = None):
+        per_type = max(1, size // 9)
+        by_type = stratified_hands(per_type, seed=seed)
+        return [_split(cards) for type, hands in by_type.items()
+                if type_name is None or type.name == type_name
+                for cards in hands]
+
+    def determine(split):
+        return determine_hand(*split)
+
+    def lut(split):
+        hole, board = split
+        return evaluate([card.code for card in hole + board])
+
+    def hand_pairs():
+        hands = [determine_hand(*split) for split in hand_corpus(7)]
+        return list(zip(hands, hands[1:]))
+
+    def deal(deck_seed):
+        deck = Deck(deck_seed)
+        for _ in range(9):
+            deck.draw(2)
+        deck.draw(3)
+        deck.draw(1)
+        deck.draw(1)
+
+    suite = {}
+    for num_cards in (5, 6, 7):
+        suite[f"determine_hand/{num_cards}"] = (
+            lambda n=num_cards: (determine, hand_corpus(n)))
+        suite[f"evaluate/{num_cards}"] = (
+            lambda n=num_cards: (lut, hand_corpus(n)))
+    suite["determine_hand/stratified"] = lambda: (determine, stratified())
+    suite["evaluate/stratified"] = lambda: (lut, stratified())
+    for type_name in ("STRAIGHT_FLUSH", "FULL_HOUSE"):
+        suite[f"determine_hand/{type_name.lower()}"] = (
+            lambda t=type_name: (determine, stratified(t)))
+    suite["hand/gt"] = lambda: (lambda pair: pair[0] > pair[1], hand_pairs())
+    suite["hand/eq"] = lambda: (lambda pair: pair[0] == pair[1], hand_pairs())
+    suite["deck/new"] = lambda: (Deck, list(range(size)))
+    suite["deck/reset"] = lambda: (
+        lambda deck: deck.reset(), [Deck(seed)] * size)
+    suite["deck/copy"] = lambda: (copy.copy, [Deck(seed)] * size)
+    suite["deck/deal_9_handed"] = lambda: (deal, list(range(size)))
+    return suite
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+            check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print(name: str, result: Dict[str, Any],
+        baseline: Optional[Dict[str, Any]]) -> None:
+    line = (f"{name:32} {result['per_sec']:>14,.0f}/s"
+            f"  p50 {result['p50_ns']:>8,}ns"
+            f"  p90 {result['p90_ns']:>8,}ns"
+            f"  p99 {result['p99_ns']:>8,}ns")
+    if baseline and name in baseline:
+        line += f"  x{result['per_sec'] / baseline[name]['per_sec']:.2f}"
+    print(line)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Benchmarks hand evaluation, comparison and dealing.")
+    parser.add_argument("--size", type=int, default=10000,
+                        help="inputs per benchmark")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="throughput runs, the best is kept")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--filter", default="",
+                        help="only run benchmarks whose name contains this")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare",
+                        help="JSON results of a previous run to compare to")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+
+    results = {}
+    for name, factory in benchmarks(args.size, args.seed).items():
+        if args.filter not in name:
+            continue
+        func, inputs = factory()
+        results[name] = measure(func, inputs, args.repeat)
+        _print(name, results[name], baseline)
+
+    report = {
+        "commit": _commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version,
+        "platform": platform.platform(),
+        "size": args.size,
+        "seed": args.seed,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
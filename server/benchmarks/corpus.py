@@ -0,0 +1,86 @@
+import random
+from typing import Callable, Dict, List
+
+from models.card import Card, CARDS
+from models.evaluator import evaluate_cards, hand_type
+from models.hand import HandType
+
+DEFAULT_SEED = 1234
+STRATIFIED_SIZE = 7  # Card count of the stratified corpus
+
+
+def random_hands(size: int, num_cards: int,
+        seed: int = DEFAULT_SEED) -> List[List[Card]]:
+    """Uniformly random hands of num_cards cards."""
+    rng = random.Random(seed * 10 + num_cards)
+    return [rng.sample(CARDS, num_cards) for _ in range(size)]
+
+
+def stratified_hands(per_type: int,
+        num_cards: int = STRATIFIED_SIZE,
+        seed: int = DEFAULT_SEED) -> Dict[HandType, List[List[Card]]]:
+    """per_type hands of every HandType, so rare branches such as straight
+    flushes and full houses get exercised as often as high cards."""
+    rng = random.Random(seed * 10 + num_cards + 100)
+    hands: Dict[HandType, List[List[Card]]] = {}
+    for type, make_core in _CORES.items():
+        hands[type] = []
+        while len(hands[type]) < per_type:
+            core = make_core(rng)
+            # Cards compare by rank only, so filter on codes
+            used = {card.code for card in core}
+            rest = [card for card in CARDS if card.code not in used]
+            cards = core + rng.sample(rest, num_cards - len(core))
+            # Extra cards can promote the hand, so keep only exact matches
+            if hand_type(evaluate_cards(cards)) is type:
+                rng.shuffle(cards)
+                hands[type].append(cards)
+    return hands
+
+
+def _ranks(rng: random.Random, count: int) -> List[int]:
+    return rng.sample(range(2, 15), count)
+
+
+def _suits(rng: random.Random, count: int) -> List[int]:
+    return rng.sample(range(4), count)
+
+
+def _card(rank: int, suit_index: int) -> Card:
+    return Card.from_code((rank - 2) * 4 + suit_index)
+
+
+def _of_a_kind(rng: random.Random, counts: List[int]) -> List[Card]:
+    cards = []
+    for rank, count in zip(_ranks(rng, len(counts)), counts):
+        cards.extend(_card(rank, suit) for suit in _suits(rng, count))
+    return cards
+
+
+def _straight(rng: random.Random, suited: bool) -> List[Card]:
+    # Six-high and up: determine_hand doesn't count wheels (A-2-3-4-5), so
+    # they would make the old and new evaluators score different hands
+    high = rng.randrange(6, 15)
+    suit = rng.randrange(4)
+    ranks = list(range(high, high - 5, -1))
+    return [_card(rank, suit if suited else rng.randrange(4))
+            for rank in ranks]
+
+
+def _flush(rng: random.Random) -> List[Card]:
+    suit = rng.randrange(4)
+    return [_card(rank, suit) for rank in _ranks(rng, 5)]
+
+
+# Builds the cards that make up each hand type; the rest is filled randomly
+_CORES: Dict[HandType, Callable[[random.Random], List[Card]]] = {
+    HandType.HIGH_CARD: lambda rng: [],
+    HandType.PAIR: lambda rng: _of_a_kind(rng, [2]),
+    HandType.TWO_PAIR: lambda rng: _of_a_kind(rng, [2, 2]),
+    HandType.THREE_OF_A_KIND: lambda rng: _of_a_kind(rng, [3]),
+    HandType.STRAIGHT: lambda rng: _straight(rng, suited=False),
+    HandType.FLUSH: _flush,
+    HandType.FULL_HOUSE: lambda rng: _of_a_kind(rng, [3, 2]),
+    HandType.FOUR_OF_A_KIND: lambda rng: _of_a_kind(rng, [4]),
+    HandType.STRAIGHT_FLUSH: lambda rng: _straight(rng, suited=True),
+}
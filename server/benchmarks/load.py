@@ -0,0 +1,455 @@
+import argparse
+import asyncio
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+from .__main__ import _commit
+
+HOST = "127.0.0.1"
+PERCENTILES = (50, 95, 99)
+STREETS = ("flop", "turn", "river")
+STARTUP_TIMEOUT = 30  # Seconds to wait for a started server to listen
+
+
+def _serve(kind: str, port: int, log_directory: str, workers: int) -> None:
+    """Runs the server in this (spawned) process until SIGINT."""
+    os.environ["POKER_LOG_DIRECTORY"] = log_directory
+    os.environ["POKER_WORKERS"] = str(workers)
+    if kind == "asgi":
+        import uvicorn
+        import asgi
+        uvicorn.run(asgi.app, host=HOST, port=port, log_level="warning")
+        return
+    import logging
+    from werkzeug.serving import run_simple
+    import server
+    # Logging every request would cost more than serving it
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    try:
+        run_simple(HOST, port, server.app, threaded=True)
+    except KeyboardInterrupt:
+        pass
+    if server.tables is not None:
+        server.tables.close()
+
+
+def start_server(kind: str, workers: int) -> Tuple[multiprocessing.Process, str, str]:
+    """Starts the Flask (or ASGI) server on a free port with a fresh log
+    directory, returning the process, its URL and the directory."""
+    with socket.socket() as probe:
+        probe.bind((HOST, 0))
+        port = probe.getsockname()[1]
+    log_directory = tempfile.mkdtemp(prefix="poker-load-")
+    process = multiprocessing.get_context("spawn").Process(
+        target=_serve, args=(kind, port, log_directory, workers))
+    process.start()
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while True:
+        try:
+            socket.create_connection((HOST, port), timeout=1).close()
+            break
+        except OSError:
+            if time.monotonic() > deadline or not process.is_alive():
+                stop_server(process, log_directory)
+                raise RuntimeError("Server did not start")
+            time.sleep(0.1)
+    return process, f"http://{HOST}:{port}", log_directory
+
+
+def stop_server(process: multiprocessing.Process, log_directory: str) -> None:
+    # SIGINT, so the server shuts its table workers down cleanly
+    if process.is_alive():
+        os.kill(process.pid, signal.SIGINT)
+        process.join(10)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+    shutil.rmtree(log_directory, ignore_errors=True)
+
+
+class Connection(object):
+    """A keep-alive HTTP/1.1 connection on asyncio streams. Far lighter
+    than an HTTP client library, so that the harness isn't what
+    saturates first."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self,
+            method: str,
+            path: str,
+            body: Optional[bytes] = None,
+            token: Optional[str] = None) -> Tuple[int, bytes]:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(
+                self.host, self.port)
+        body = body or b""
+        authorization = "" if token is None else f"Authorization: Bearer {token}\r\n"
+        self._writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Content-Type: application/json\r\n{authorization}"
+            f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        try:
+            return await self._response()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            self.close()
+            raise ConnectionError(f"{method} {path} failed")
+
+    async def _response(self) -> Tuple[int, bytes]:
+        await self._writer.drain()
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip().lower()
+
+        if "content-length" in headers:
+            body = await self._reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding") == "chunked":
+            chunks = []
+            while True:
+                size = int((await self._reader.readline()).split(b";")[0], 16)
+                chunks.append(await self._reader.readexactly(size + 2))
+                if size == 0:
+                    break
+            body = b"".join(chunk[:-2] for chunk in chunks)
+        else:
+            body = await self._reader.read()
+            headers["connection"] = "close"
+        if headers.get("connection") == "close":
+            self.close()
+        return status, body
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+class Pacer(object):
+    """Spaces requests evenly at `rate` per second across every virtual
+    player (0 for as fast as the server answers)."""
+
+    def __init__(self, rate: float):
+        self._interval = 1 / rate if rate > 0 else 0.0
+        self._next = 0.0
+
+    async def wait(self) -> None:
+        if not self._interval:
+            return
+        now = time.perf_counter()
+        slot = max(now, self._next)
+        self._next = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+class Stats(object):
+    """Latencies and errors per endpoint."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def record(self, endpoint: str, seconds: float, ok: bool) -> None:
+        self.latencies.setdefault(endpoint, []).append(seconds)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, seconds: float) -> Dict[str, Dict[str, Any]]:
+        results = {}
+        everything: List[float] = []
+        for endpoint in sorted(self.latencies):
+            latencies = self.latencies[endpoint]
+            everything.extend(latencies)
+            results[endpoint] = _summarize(
+                latencies, self.errors.get(endpoint, 0), seconds)
+        results["total"] = _summarize(
+            everything, sum(self.errors.values()), seconds)
+        return results
+
+
+def _summarize(latencies: List[float], errors: int, seconds: float) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "error_rate": errors / len(latencies) if latencies else 0.0,
+        "per_sec": len(latencies) / seconds,
+    }
+    for percentile in PERCENTILES:
+        index = min(len(latencies) - 1, len(latencies) * percentile // 100)
+        result[f"p{percentile}_ms"] = latencies[index] * 1000 if latencies else 0.0
+    return result
+
+
+class Client(object):
+    """A virtual player's (or dealer's) connection, timing every call."""
+
+    def __init__(self, url: str, pacer: Pacer, stats: Stats):
+        parts = urlsplit(url)
+        self.connection = Connection(parts.hostname, parts.port or 80)
+        self.pacer = pacer
+        self.stats = stats
+
+    async def call(self,
+            endpoint: str,
+            method: str,
+            path: str,
+            body: Optional[Dict[str, Any]] = None,
+            token: Optional[str] = None) -> Optional[bytes]:
+        """The response body, or None (counted as an error) unless 200.
+        With a player's token (see auth), states come back as they see them."""
+        await self.pacer.wait()
+        start = time.perf_counter()
+        try:
+            status, response = await self.connection.request(
+                method, path, None if body is None else json.dumps(body).encode(),
+                token)
+        except ConnectionError:
+            status, response = None, b""
+        self.stats.record(endpoint, time.perf_counter() - start, status == 200)
+        return response if status == 200 else None
+
+    async def state(self, endpoint: str, path: str,
+            body: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """POSTs an action, returning the table state it answers with."""
+        response = await self.call(endpoint, "POST", path, body)
+        return None if response is None else json.loads(response)
+
+
+async def _poll(url: str, pacer: Pacer, stats: Stats, table_id: str,
+        token: str, interval: float, deadline: float) -> None:
+    """What a player's client does while waiting: fetch the state changes
+    since the version it has."""
+    client = Client(url, pacer, stats)
+    version = None
+    while time.perf_counter() < deadline:
+        path = f"/tables/{table_id}/state"
+        if version is not None:
+            path += f"?since_version={version}"
+        response = await client.call("state", "GET", path, token=token)
+        if response is not None:
+            version = json.loads(response)["version"]
+        await asyncio.sleep(interval)
+    client.connection.close()
+
+
+async def _table(url: str, pacer: Pacer, stats: Stats, players: int,
+        stack: int, poll_interval: float, deadline: float,
+        rng: random.Random) -> None:
+    """Seats `players` virtual players at a new table and plays hands until
+    the deadline, each decision asking /legal-actions first like a real
+    client would."""
+    client = Client(url, pacer, stats)
+    response = await client.call("create-table", "POST", "/tables")
+    if response is None:
+        return
+    table_id = response.decode()
+    table = f"/tables/{table_id}"
+    seats = []
+    tokens = []
+    for seat in range(players):
+        response = await client.call(
+            "add-player", "POST", f"{table}/add-player", {"name": f"Seat {seat}"})
+        if response is None:
+            return
+        seated = json.loads(response)
+        seats.append(seated["player_uuid"])
+        tokens.append(seated["token"])
+        await client.state("buy-in", f"{table}/buy-in",
+                           {"player_uuid": seats[-1], "amount": stack})
+    pollers = [asyncio.ensure_future(_poll(
+        url, pacer, stats, table_id, token, poll_interval,
+        deadline)) for token in tokens]
+
+    state = None
+    while time.perf_counter() < deadline:
+        if state is not None:
+            for player_uuid, chips in state["stacks"].items():
+                if chips < state["blinds"]["big"]:
+                    await client.state(
+                        "buy-in", f"{table}/buy-in",
+                        {"player_uuid": player_uuid, "amount": stack - chips})
+        state = await _hand(client, table, rng)
+    await asyncio.gather(*pollers)
+    client.connection.close()
+
+
+async def _hand(client: Client, table: str,
+        rng: random.Random) -> Optional[Dict[str, Any]]:
+    """Plays one hand, returning the last state seen (None if a request
+    failed, abandoning the hand)."""
+    state = await client.state("start-game", f"{table}/start-game")
+    if state is None:
+        return None
+    state = await client.state("deal", f"{table}/deal")
+    state = state and await _betting_round(client, table, state, rng)
+    for street in STREETS:
+        if state is None or len(state["in_play"]) == 1:
+            return state
+        state = await client.state("end-round", f"{table}/end-round")
+        state = state and await client.state(street, f"{table}/{street}")
+        state = state and await _betting_round(client, table, state, rng)
+    if state is None:
+        return None
+    return await client.state("showdown", f"{table}/showdown")
+
+
+async def _betting_round(client: Client, table: str, state: Dict[str, Any],
+        rng: random.Random) -> Optional[Dict[str, Any]]:
+    """Mostly checks and calls, with the odd minimum bet, raise or fold."""
+    pending = set(state["in_play"])
+    while len(state["in_play"]) > 1:
+        pending = {player_uuid for player_uuid in pending
+                   if player_uuid in state["in_play"] and state["stacks"][player_uuid]}
+        if not pending:
+            return state
+        response = await client.call(
+            "legal-actions", "GET", f"{table}/legal-actions")
+        if response is None:
+            return None
+        legal = json.loads(response)
+        player_uuid = legal["player_uuid"]
+        pending.discard(player_uuid)
+        body = {"player_uuid": player_uuid}
+        roll = rng.random()
+        if "Check" in legal["types"]:
+            endpoint = "check" if roll < 0.8 or "Bet" not in legal["types"] else "bet"
+        elif roll < 0.25:
+            endpoint = "fold"
+        elif roll < 0.35 and "Raise" in legal["types"]:
+            endpoint = "raise"
+        else:
+            endpoint = "call"
+        if endpoint in ("bet", "raise"):
+            body["amount"] = legal["min_amount"]
+            pending = set(state["in_play"]) - {player_uuid}
+        elif endpoint == "call":
+            body["amount"] = legal["to_call"]
+        state = await client.state(endpoint, f"{table}/{endpoint}", body)
+        if state is None:
+            return None
+    return state
+
+
+async def warm_up(url: str) -> Dict[str, Dict[str, Any]]:
+    """Creates a table and reads its state, so that what a server does on
+    its first requests (e.g. Flask starting its table workers) isn't
+    counted in the run. Returns the stats of these requests."""
+    stats = Stats()
+    client = Client(url, Pacer(0), stats)
+    start = time.perf_counter()
+    response = await client.call("create-table", "POST", "/tables")
+    if response is not None:
+        await client.call("state", "GET", f"/tables/{response.decode()}/state")
+    client.connection.close()
+    return stats.summary(time.perf_counter() - start)
+
+
+async def run(url: str, tables: int, players: int, duration: float,
+        rate: float, poll_interval: float, stack: int,
+        seed: Optional[int]
+        ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """Main entry point to load the server at url for `duration` seconds,
+    once warmed up (see warm_up). Returns the warm-up's stats and the run's
+    per endpoint throughput, error rate and latency percentiles."""
+    warm_up_results = await warm_up(url)
+    pacer = Pacer(rate)
+    stats = Stats()
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*(
+        _table(url, pacer, stats, players, stack, poll_interval, deadline,
+               random.Random(rng.getrandbits(64)))
+        for _ in range(tables)))
+    return warm_up_results, stats.summary(time.perf_counter() - start)
+
+
+def _print(name: str, result: Dict[str, Any]) -> None:
+    print(f"{name:14} {result['requests']:>8,} req {result['per_sec']:>9,.1f}/s"
+          f"  errors {result['error_rate']:6.2%}"
+          f"  p50 {result['p50_ms']:>7.2f}ms"
+          f"  p95 {result['p95_ms']:>7.2f}ms"
+          f"  p99 {result['p99_ms']:>7.2f}ms")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.load",
+        description="Load tests the HTTP API with virtual tables of players.")
+    parser.add_argument("--url", help="server to load, instead of starting one")
+    parser.add_argument("--server", choices=("flask", "asgi"), default="flask",
+                        help="server to start when no --url is given")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="table worker processes of the started server")
+    parser.add_argument("--tables", type=int, default=10)
+    parser.add_argument("--players", type=int, default=4,
+                        help="virtual players per table")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--rate", type=float, default=0,
+                        help="target requests per second, 0 for no limit")
+    parser.add_argument("--poll-interval", type=float, default=0.5,
+                        help="seconds between each player's /state polls")
+    parser.add_argument("--stack", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    process = None
+    url = args.url
+    if url is None:
+        process, url, log_directory = start_server(args.server, args.workers)
+    try:
+        warm_up_results, results = asyncio.run(run(
+            url, args.tables, args.players, args.duration, args.rate,
+            args.poll_interval, args.stack, args.seed))
+    finally:
+        if process is not None:
+            stop_server(process, log_directory)
+
+    print("Warm-up (not counted):")
+    for name, result in warm_up_results.items():
+        _print(name, result)
+    print("Run:")
+    for name, result in results.items():
+        _print(name, result)
+    if args.output:
+        report = {
+            "commit": _commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": sys.version,
+            "platform": platform.platform(),
+            "arguments": {name: value for name, value in vars(args).items()
+                          if name != "output"},
+            "warm_up": warm_up_results,
+            "results": results,
+        }
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+from collections import deque
+from concurrent.futures import Executor, Future
+import threading
+from typing import Any, Callable, Deque
+
+from .poker import Poker
+from .state import State
+
+# A message runs against the table's Poker on the actor's turn
+Message = Callable[[Poker], None]
+
+
+class TableActor(object):
+    """Serializes one table's actions: messages queue in a mailbox with a
+    single consumer, run one at a time in arrival order on a shared
+    executor, so a table never uses more than one thread and idle tables
+    use none.
+
+    Each action publishes a new immutable State by rebinding poker.state,
+    so readers take `state` without a lock and see either the state before
+    an action or after it, never a half-applied one.
+    """
+
+    poker: Poker
+
+    def __init__(self, poker: Poker, executor: Executor):
+        self.poker = poker
+        self._executor = executor
+        self._mailbox: Deque[Message] = deque()
+        # Guards the mailbox and whether a drain is scheduled, not the state
+        self._lock = threading.Lock()
+        self._scheduled = False
+
+    @property
+    def state(self) -> State:
+        return self.poker.state
+
+    def tell(self, message: Message) -> None:
+        """Queues message; it must handle its own errors."""
+        with self._lock:
+            self._mailbox.append(message)
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self._executor.submit(self._drain)
+
+    def ask(self, method: str, *args) -> "Future[Any]":
+        """Queues a Poker method call, returning a future of its result."""
+        future: "Future[Any]" = Future()
+
+        def message(poker: Poker) -> None:
+            try:
+                future.set_result(getattr(poker, method)(*args))
+            except Exception as error:
+                future.set_exception(error)
+        self.tell(message)
+        return future
+
+    def _drain(self) -> None:
+        while True:
+            with self._lock:
+                if not self._mailbox:
+                    self._scheduled = False
+                    return
+                message = self._mailbox.popleft()
+            message(self.poker)
@@ -0,0 +1,45 @@
+from typing import Tuple
+
+import numpy as np
+
+from .evaluator import (
+    CARD_KEYS, FLUSH_BITS, FLUSH_TABLE, NUM_RANKS, RANK_MASK, RANK_TABLE,
+    SUIT_OFFSET, TYPE_SHIFT)
+
+_CARD_KEYS = np.array(CARD_KEYS, dtype=np.int64)
+_RANK_KEYS = np.array(sorted(RANK_TABLE), dtype=np.int64)
+_RANK_STRENGTHS = np.array(
+    [RANK_TABLE[key] for key in sorted(RANK_TABLE)], dtype=np.int64)
+_FLUSH_STRENGTHS = np.array(FLUSH_TABLE, dtype=np.int64)
+_RANK_BITS = 1 << np.arange(NUM_RANKS, dtype=np.int64)
+
+
+def evaluate_many(holes, boards) -> Tuple[np.ndarray, np.ndarray]:
+    """Scores N hands of card codes, holes shaped (N, 2) and boards (N, k).
+
+    Returns an (N,) array of strengths (as from evaluator.evaluate) and an
+    (N,) array of HandType values.
+    """
+    cards = np.concatenate(
+        [np.asarray(holes, dtype=np.intp), np.asarray(boards, dtype=np.intp)],
+        axis=1)
+
+    keys = _CARD_KEYS[cards].sum(axis=1)
+    strengths = _RANK_STRENGTHS[
+        np.searchsorted(_RANK_KEYS, keys & RANK_MASK)]
+
+    # Within seven cards a flush always outranks any non-flush hand, and at
+    # most one suit can hold five cards
+    flushes = np.flatnonzero((keys + SUIT_OFFSET) & FLUSH_BITS)
+    if flushes.size:
+        flush_cards = cards[flushes]
+        suits = flush_cards & 3
+        bits = _RANK_BITS[flush_cards >> 2]
+        flush_strengths = np.zeros(flushes.size, dtype=np.int64)
+        for suit in range(4):
+            masks = np.where(suits == suit, bits, 0).sum(axis=1)
+            np.maximum(flush_strengths, _FLUSH_STRENGTHS[masks],
+                       out=flush_strengths)
+        strengths[flushes] = flush_strengths
+
+    return strengths, strengths >> TYPE_SHIFT
@@ -1,4 +1,4 @@
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
 
 from aenum import Enum
 
@@ -68,13 +68,37 @@ class CardValue(Enum):
 
 
 class Card(object):
+    """Immutable card, interned so that there is exactly one instance per
+    card. Cards are encoded as ``code = (rank - 2) * 4 + suit_index`` (0-51),
+    which lets the rest of the engine work on plain ints."""
 
+    __slots__ = ("code", "rank", "suit_index", "value", "suit")
+
+    code: int
+    rank: int
+    suit_index: int
     value: CardValue
     suit: CardSuit
 
-    def __init__(self, value: Any, suit: Any):
-        self.value = CardValue(value)
-        self.suit = CardSuit(suit)
+    def __new__(cls, value: Any, suit: Any):
+        try:
+            return _LOOKUP[value, suit]
+        except (KeyError, TypeError):
+            return CARDS[encode(CardValue(value), CardSuit(suit))]
+
+    @classmethod
+    def _create(cls, code: int):
+        card = object.__new__(cls)
+        object.__setattr__(card, "code", code)
+        object.__setattr__(card, "rank", (code >> 2) + 2)
+        object.__setattr__(card, "suit_index", code & 3)
+        object.__setattr__(card, "value", CardValue((code >> 2) + 2))
+        object.__setattr__(card, "suit", SUITS[code & 3])
+        return card
+
+    @staticmethod
+    def from_code(code: int):
+        return CARDS[code]
 
     @staticmethod
     def to_dict(card) -> Dict[str, Any]:
@@ -83,22 +107,53 @@ class Card(object):
             "suit": str(card.suit),
         }
 
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return Card.from_code, (self.code,)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
     def __eq__(self, other):
         """Each card is unique, so only value is required for equality."""
-        return self.value == other.value
+        return self.rank == other.rank
 
     def __gt__(self, other):
-        return self.value > other.value
+        return self.rank > other.rank
 
     def __lt__(self, other):
-        return self.value < other.value
+        return self.rank < other.rank
 
     def __hash__(self):
         """Reflects __eq__."""
-        return hash(self.value)
+        return self.rank
 
     def __repr__(self):
         return f"{self.value}{self.suit!r}"
 
     def __str__(self):
         return f"{self.value}{self.suit}"
+
+
+SUITS = tuple(CardSuit)
+NUM_CARDS = len(CardValue) * len(SUITS)
+
+
+def encode(value: CardValue, suit: CardSuit) -> int:
+    return (value.value - 2) * 4 + SUITS.index(suit)
+
+
+# The only Card instances that will ever exist, indexed by code
+CARDS = tuple(Card._create(code) for code in range(NUM_CARDS))
+
+# Fast path for Card(value, suit) with the common argument spellings
+_LOOKUP: Dict[Tuple[Any, Any], Card] = {}
+for _card in CARDS:
+    for _value in (_card.value, _card.rank, _card.value.display):
+        for _suit in (_card.suit, _card.suit.value, _card.suit.long):
+            _LOOKUP[_value, _suit] = _card
@@ -1,37 +1,114 @@
 import random
-from typing import List, Optional
+from typing import Iterable, List, Optional
 
-from .card import Card, CardSuit, CardValue
+from .card import Card, CARDS
+from .tracing import traced
 
 
 class Deck(object):
+    """Shuffled cards in one preallocated list: cards before `position` have
+    been drawn, cards from `end` on have been removed as dead. Copies share
+    the list until one of them reshuffles or removes cards, and the random
+    generator until one of them shuffles, so copying only costs a few
+    attributes."""
 
     cards: List[Card]
+    position: int
+    end: int
 
+    @traced("Deck.__init__")
     def __init__(self, seed: Optional[int] = None):
-        random.seed(seed)
-        self.cards = self._init_cards()
+        self._random = random.Random(seed)
+        self._shared = False
+        self._shared_random = False
+        self.cards = list(CARDS)
+        self.end = len(self.cards)
+        self.shuffle()
 
-    def _init_cards(self) -> List[Card]:
-        cards = [Card(value, suit)
-                 for value in CardValue
-                 for suit in CardSuit]
-        random.shuffle(cards)
-        return cards
+    @traced("Deck.shuffle")
+    def shuffle(self) -> None:
+        """Returns drawn cards to the deck and shuffles it in place."""
+        self._own_cards()
+        self._own_random()
+        self.position = 0
+        cards = self.cards
+        rand = self._random.random
+        for i in range(self.end - 1, 0, -1):
+            j = int(rand() * (i + 1))
+            cards[i], cards[j] = cards[j], cards[i]
+
+    def reset(self, seed: Optional[int] = None) -> None:
+        """Restores all 52 cards (including dead ones) and shuffles. A given
+        seed always produces the same order."""
+        if seed is not None and self._shared_random:
+            self._random = random.Random(seed)
+            self._shared_random = False
+        elif seed is not None:
+            self._random.seed(seed)
+        # Start from the same order every time, so the shuffle only depends
+        # on the seed
+        if self._shared:
+            self.cards = list(CARDS)
+            self._shared = False
+        else:
+            self.cards[:] = CARDS
+        self.end = len(self.cards)
+        self.shuffle()
+
+    def remove(self, dead_cards: Iterable[Card]) -> None:
+        """Takes known cards out of the undrawn cards by swapping them past
+        `end`, e.g. hole cards and board fixed by a simulation."""
+        self._own_cards()
+        cards = self.cards
+        # Cards compare by rank only, so locate them by code
+        positions = {cards[index].code: index
+                     for index in range(self.position, self.end)}
+        for card in dead_cards:
+            index = positions.pop(card.code, None)
+            if index is None:
+                raise ValueError(f"{card!r} is not left in the deck")
+            last = self.end - 1
+            cards[index], cards[last] = cards[last], cards[index]
+            if index != last:
+                positions[cards[index].code] = index
+            self.end = last
+
+    def _own_cards(self) -> None:
+        if self._shared:
+            self.cards = list(self.cards)
+            self._shared = False
+
+    def _own_random(self) -> None:
+        # Shuffling one copy mustn't change how the others shuffle
+        if self._shared_random:
+            state = self._random.getstate()
+            self._random = random.Random()
+            self._random.setstate(state)
+            self._shared_random = False
 
     def draw(self, num: int = 1) -> List[Card]:
-        drawn_cards = self.cards[:num]
-        self.cards = self.cards[num:]
+        drawn_cards = self.cards[self.position:min(self.position + num, self.end)]
+        self.position += len(drawn_cards)
         return drawn_cards
 
+    def __copy__(self):
+        deck = object.__new__(Deck)
+        deck._random = self._random
+        deck.cards = self.cards
+        deck.position = self.position
+        deck.end = self.end
+        deck._shared = self._shared = True
+        deck._shared_random = self._shared_random = True
+        return deck
+
     def __iter__(self):
-        return iter(self.cards)
+        return iter(self.cards[self.position:self.end])
 
     def __len__(self):
-        return len(self.cards)
+        return self.end - self.position
 
     def __repr__(self):
-        return "\n".join(map(str, self.cards))
+        return "\n".join(map(str, self))
 
     def __str__(self):
-        return ", ".join(map(str, self.cards))
+        return ", ".join(map(str, self))
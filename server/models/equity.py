@@ -0,0 +1,306 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+import functools
+import itertools
+import math
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .card import Card
+from .deck import Deck
+from .evaluator import card_key, evaluate, evaluate_key
+
+BOARD_SIZE = 5  # Number of cards on a complete board
+MIN_EXACT_BOARD = 3  # Enumerate from the flop on (at most 990 runouts)
+MIN_PLAYERS = 2
+MAX_PLAYERS = 10
+DEFAULT_SAMPLES = 10000
+EXACT_CACHE_SIZE = 1024
+ENUMERATED_CACHE_SIZE = 64  # Preflop enumerations are far larger
+ENUMERATION_CHUNK = 100000  # Runouts scored per numpy batch
+Z_95 = 1.96  # Normal quantile for a 95% confidence interval
+CLOCK_CHECK_INTERVAL = 256  # Samples between wall-clock budget checks
+
+_executors: Dict[int, ProcessPoolExecutor] = {}
+
+
+class Equity(object):
+
+    win: float  # Fraction of runouts won outright
+    tie: float  # Fraction of runouts split with other players
+    equity: float  # Expected share of the pot
+    error: float  # Half-width of the 95% confidence interval on equity
+    samples: int
+
+    def __init__(self,
+            win: float, tie: float, equity: float, error: float, samples: int):
+        self.win = win
+        self.tie = tie
+        self.equity = equity
+        self.error = error
+        self.samples = samples
+
+    @property
+    def interval(self) -> Tuple[float, float]:
+        return (max(0.0, self.equity - self.error),
+                min(1.0, self.equity + self.error))
+
+    @staticmethod
+    def to_dict(equity) -> Dict[str, Any]:
+        return {
+            "win": equity.win,
+            "tie": equity.tie,
+            "equity": equity.equity,
+            "interval": list(equity.interval),
+            "samples": equity.samples,
+        }
+
+    def __repr__(self):
+        return f"{self.equity:.2%} ± {self.error:.2%}"
+
+
+def equity(holes: Sequence[Sequence[Card]],
+        board: Sequence[Card] = (),
+        samples: Optional[int] = None,
+        seconds: Optional[float] = None,
+        workers: Optional[int] = None,
+        seed: Optional[int] = None) -> List[Equity]:
+    """Main entry point to estimate each hole's equity by sampling runouts.
+
+    Stops after `samples` runouts or `seconds` of wall-clock time, whichever
+    comes first (DEFAULT_SAMPLES if neither is given).
+    """
+    hole_codes, board_codes, remaining = _validate(holes, board)
+    if samples is None and seconds is None:
+        samples = DEFAULT_SAMPLES
+    workers = workers or os.cpu_count() or 1
+    seeds = _worker_seeds(seed, workers)
+
+    jobs = []
+    for index in range(workers):
+        worker_samples = None
+        if samples is not None:
+            worker_samples = samples // workers + (index < samples % workers)
+            if worker_samples == 0:
+                continue
+        jobs.append((hole_codes, board_codes, remaining,
+                     worker_samples, seconds, seeds[index]))
+
+    if len(jobs) == 1:
+        results = [_simulate(*jobs[0])]
+    else:
+        executor = _get_executor(workers)
+        results = list(executor.map(_simulate, *zip(*jobs)))
+    return _combine(results, len(hole_codes))
+
+
+def exact_equity(holes: Sequence[Sequence[Card]],
+        board: Sequence[Card]) -> List[Equity]:
+    """Computes each hole's equity over every remaining runout.
+
+    Results are memoized per (holes, board), so repeated queries for the
+    same all-in (e.g. every spectator refresh) are free.
+    """
+    if len(board) < MIN_EXACT_BOARD:
+        raise ValueError(
+            f"Exact equity needs at least {MIN_EXACT_BOARD} board cards")
+    hole_codes, board_codes, _ = _validate(holes, board)
+    # Order within a hole or the board doesn't matter, so share cache entries
+    # Fresh Equity objects every call, so callers can't alter cached results
+    return [Equity(win, tie, share, 0.0, samples)
+            for win, tie, share, samples in _exact_equity(
+                tuple(tuple(sorted(hole)) for hole in hole_codes),
+                tuple(sorted(board_codes)))]
+
+
+@functools.lru_cache(maxsize=EXACT_CACHE_SIZE)
+def _exact_equity(hole_codes: Tuple[Tuple[int, ...], ...],
+        board_codes: Tuple[int, ...]) -> Tuple[Tuple[float, float, float, int], ...]:
+    """(win, tie, equity, runouts) of each hole, immutable as it's cached."""
+    _, _, remaining = _validate_codes(hole_codes, board_codes)
+    num_players = len(hole_codes)
+    hole_keys = [card_key(hole) for hole in hole_codes]
+    board_key = card_key(board_codes)
+    wins = [0] * num_players
+    ties = [0] * num_players
+    shares = [0.0] * num_players
+    squares = [0.0] * num_players
+
+    count = 0
+    for runout in itertools.combinations(
+            remaining, BOARD_SIZE - len(board_codes)):
+        # Board work is done once per runout and shared by every player
+        full_board = board_codes + runout
+        full_key = board_key + card_key(runout)
+        strengths = [evaluate_key(full_key + hole_key, hole + full_board)
+                     for hole, hole_key in zip(hole_codes, hole_keys)]
+        _tally(strengths, wins, ties, shares, squares)
+        count += 1
+
+    equities = _combine([(count, wins, ties, shares, squares)], num_players)
+    return tuple((result.win, result.tie, result.equity, result.samples)
+                 for result in equities)
+
+
+def enumerated_equity(holes: Sequence[Sequence[Card]],
+        board: Sequence[Card] = ()) -> List[Equity]:
+    """Computes each hole's equity over every remaining runout from any
+    board, preflop included, for settling chips where estimates won't do.
+
+    Preflop means about 1.7 million runouts heads-up: they are scored in
+    numpy batches (see batch.evaluate_many) when numpy is installed, in a
+    much slower pure Python loop otherwise.
+    """
+    if len(board) >= MIN_EXACT_BOARD:
+        return exact_equity(holes, board)
+    hole_codes, board_codes, _ = _validate(holes, board)
+    return [Equity(win, tie, share, 0.0, samples)
+            for win, tie, share, samples in _enumerated_equity(
+                tuple(tuple(sorted(hole)) for hole in hole_codes),
+                tuple(sorted(board_codes)))]
+
+
+@functools.lru_cache(maxsize=ENUMERATED_CACHE_SIZE)
+def _enumerated_equity(hole_codes: Tuple[Tuple[int, ...], ...],
+        board_codes: Tuple[int, ...]) -> Tuple[Tuple[float, float, float, int], ...]:
+    try:
+        import numpy as np
+        from .batch import evaluate_many
+    except ImportError:
+        return _exact_equity.__wrapped__(hole_codes, board_codes)
+    _, _, remaining = _validate_codes(hole_codes, board_codes)
+    needed = BOARD_SIZE - len(board_codes)
+    runouts = itertools.combinations(remaining, needed)
+    num_players = len(hole_codes)
+    wins = np.zeros(num_players)
+    ties = np.zeros(num_players)
+    shares = np.zeros(num_players)
+    count = 0
+    while True:
+        chunk = np.fromiter(
+            itertools.chain.from_iterable(
+                itertools.islice(runouts, ENUMERATION_CHUNK)),
+            dtype=np.intp).reshape(-1, needed)
+        if not len(chunk):
+            break
+        boards = np.concatenate(
+            [np.broadcast_to(np.array(board_codes, dtype=np.intp),
+                             (len(chunk), len(board_codes))), chunk], axis=1)
+        strengths = np.stack([
+            evaluate_many(np.broadcast_to(np.array(hole, dtype=np.intp),
+                                          (len(chunk), len(hole))), boards)[0]
+            for hole in hole_codes])
+        best = strengths == strengths.max(axis=0)
+        splits = best.sum(axis=0)
+        wins += (best & (splits == 1)).sum(axis=1)
+        ties += (best & (splits > 1)).sum(axis=1)
+        shares += (best / splits).sum(axis=1)
+        count += len(chunk)
+    return tuple((float(win) / count, float(tie) / count, float(share) / count, count)
+                 for win, tie, share in zip(wins, ties, shares))
+
+
+def _validate(holes: Sequence[Sequence[Card]], board: Sequence[Card]):
+    if not MIN_PLAYERS <= len(holes) <= MAX_PLAYERS:
+        raise ValueError(
+            f"Equity needs {MIN_PLAYERS} to {MAX_PLAYERS} players")
+    if len(board) > BOARD_SIZE:
+        raise ValueError(f"Board has more than {BOARD_SIZE} cards")
+
+    return _validate_codes(
+        [tuple(card.code for card in hole) for hole in holes],
+        tuple(card.code for card in board))
+
+
+def _validate_codes(hole_codes: Sequence[Tuple[int, ...]],
+        board_codes: Tuple[int, ...]):
+    known = [code for hole in hole_codes for code in hole] + list(board_codes)
+    if len(set(known)) != len(known):
+        raise ValueError("Duplicate cards among holes and board")
+
+    deck = Deck()
+    deck.remove(Card.from_code(code) for code in known)
+    # Sorted so that runouts only depend on the seed, not the shuffle
+    remaining = tuple(sorted(card.code for card in deck))
+    return hole_codes, board_codes, remaining
+
+
+def _worker_seeds(seed: Optional[int], workers: int) -> List[int]:
+    rng = random.Random(seed) if seed is not None else random.SystemRandom()
+    return [rng.getrandbits(64) for _ in range(workers)]
+
+
+def _get_executor(workers: int) -> Executor:
+    """Reuses one process pool per size so workers stay warm."""
+    executor = _executors.get(workers)
+    if executor is None:
+        executor = _executors[workers] = ProcessPoolExecutor(workers)
+    return executor
+
+
+def _simulate(hole_codes: List[Tuple[int, ...]],
+        board_codes: Tuple[int, ...],
+        remaining: Tuple[int, ...],
+        samples: Optional[int],
+        seconds: Optional[float],
+        seed: int) -> Tuple[int, List[int], List[int], List[float], List[float]]:
+    """Samples runouts, returning the count and per-player win/tie counts
+    and sums (and sums of squares) of pot shares."""
+    rng = random.Random(seed)
+    num_players = len(hole_codes)
+    needed = BOARD_SIZE - len(board_codes)
+    deadline = time.monotonic() + seconds if seconds is not None else None
+    wins = [0] * num_players
+    ties = [0] * num_players
+    shares = [0.0] * num_players
+    squares = [0.0] * num_players
+
+    count = 0
+    while samples is None or count < samples:
+        if (deadline is not None and count % CLOCK_CHECK_INTERVAL == 0
+                and time.monotonic() >= deadline):
+            break
+        full_board = board_codes + tuple(rng.sample(remaining, needed))
+        strengths = [evaluate(hole + full_board) for hole in hole_codes]
+        _tally(strengths, wins, ties, shares, squares)
+        count += 1
+
+    return count, wins, ties, shares, squares
+
+
+def _tally(strengths: List[int],
+        wins: List[int],
+        ties: List[int],
+        shares: List[float],
+        squares: List[float]) -> None:
+    best = max(strengths)
+    winners = [index for index, strength in enumerate(strengths)
+               if strength == best]
+    share = 1.0 / len(winners)
+    if len(winners) == 1:
+        wins[winners[0]] += 1
+    else:
+        for index in winners:
+            ties[index] += 1
+    for index in winners:
+        shares[index] += share
+        squares[index] += share * share
+
+
+def _combine(results, num_players: int) -> List[Equity]:
+    count = sum(result[0] for result in results)
+    if count == 0:
+        raise ValueError("Budget too small to sample any runouts")
+
+    equities = []
+    for index in range(num_players):
+        wins = sum(result[1][index] for result in results)
+        ties = sum(result[2][index] for result in results)
+        shares = sum(result[3][index] for result in results)
+        squares = sum(result[4][index] for result in results)
+        mean = shares / count
+        variance = max(0.0, squares / count - mean * mean)
+        error = Z_95 * math.sqrt(variance / count)
+        equities.append(Equity(wins / count, ties / count, mean, error, count))
+    return equities
@@ -0,0 +1,252 @@
+from typing import Collection, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .card import Card, CARDS, NUM_CARDS
+from .hand import Hand, HandType, HAND_SIZE
+
+# A hand strength is a single int: the HandType value in the high bits, then
+# up to five ranks (4 bits each, most important first). Comparing two
+# strengths as ints compares the hands.
+TYPE_SHIFT = 20
+RANK_SHIFTS = (16, 12, 8, 4, 0)
+
+NUM_RANKS = 13
+ACE_LOW = 1  # Rank of the ace in a wheel (A-2-3-4-5)
+
+# Cards are summed into a single key: a 3-bit count per rank in the low bits
+# and a 4-bit count per suit above them. Adding SUIT_OFFSET sets bit 3 of a
+# suit's count exactly when that suit has 5 or more cards.
+RANK_COUNT_BITS = 3
+SUIT_SHIFT = 40
+SUIT_COUNT_BITS = 4
+RANK_MASK = (1 << (RANK_COUNT_BITS * NUM_RANKS)) - 1
+SUIT_OFFSET = sum(3 << (SUIT_SHIFT + SUIT_COUNT_BITS * suit)
+                  for suit in range(4))
+FLUSH_BITS = sum(8 << (SUIT_SHIFT + SUIT_COUNT_BITS * suit)
+                 for suit in range(4))
+
+CARD_KEYS: Tuple[int, ...] = tuple(
+    (1 << (RANK_COUNT_BITS * (code >> 2)))
+    | (1 << (SUIT_SHIFT + SUIT_COUNT_BITS * (code & 3)))
+    for code in range(NUM_CARDS))
+
+HAND_TYPES: Tuple[HandType, ...] = tuple(HandType)
+
+# Number of cards contributed by each packed rank, per hand type
+TYPE_PATTERNS: Dict[HandType, Tuple[int, ...]] = {
+    HandType.HIGH_CARD: (1, 1, 1, 1, 1),
+    HandType.PAIR: (2,),
+    HandType.TWO_PAIR: (2, 2),
+    HandType.THREE_OF_A_KIND: (3,),
+    HandType.STRAIGHT: (1, 1, 1, 1, 1),
+    HandType.FLUSH: (1, 1, 1, 1, 1),
+    HandType.FULL_HOUSE: (3, 2),
+    HandType.FOUR_OF_A_KIND: (4,),
+    HandType.STRAIGHT_FLUSH: (1, 1, 1, 1, 1),
+}
+
+
+def evaluate(codes: Sequence[int]) -> int:
+    """Main entry point to score up to seven card codes; higher is better."""
+    return evaluate_key(sum(map(CARD_KEYS.__getitem__, codes)), codes)
+
+
+def card_key(codes: Iterable[int]) -> int:
+    """Sums card codes into a key; keys of disjoint card sets can be added."""
+    return sum(map(CARD_KEYS.__getitem__, codes))
+
+
+def evaluate_key(key: int, codes: Sequence[int]) -> int:
+    """Scores a precomputed key, only reading the codes for flushes."""
+    flush = (key + SUIT_OFFSET) & FLUSH_BITS
+    if flush:
+        suit = (flush.bit_length() - SUIT_SHIFT - 4) >> 2
+        mask = 0
+        for code in codes:
+            if code & 3 == suit:
+                mask |= 1 << (code >> 2)
+        return FLUSH_TABLE[mask]
+    return RANK_TABLE[key & RANK_MASK]
+
+
+def evaluate_cards(cards: Iterable[Card]) -> int:
+    return evaluate([card.code for card in cards])
+
+
+class BoardEvaluator(object):
+    """Board cards preprocessed once per street, so that scoring a player
+    only has to fold in their hole cards."""
+
+    __slots__ = ("codes", "key", "suit_masks")
+
+    codes: Tuple[int, ...]
+    key: int  # Rank and suit counts of the board, see card_key
+    suit_masks: Tuple[int, ...]  # Rank bitmask of the board per suit
+
+    def __init__(self, board: Iterable[Card] = ()):
+        self.codes = tuple(card.code for card in board)
+        self.key = card_key(self.codes)
+        suit_masks = [0] * 4
+        for code in self.codes:
+            suit_masks[code & 3] |= 1 << (code >> 2)
+        self.suit_masks = tuple(suit_masks)
+
+    def extend(self, cards: Iterable[Card]):
+        """Returns the evaluator for this board plus the newly dealt cards."""
+        extended = object.__new__(BoardEvaluator)
+        codes = tuple(card.code for card in cards)
+        extended.codes = self.codes + codes
+        extended.key = self.key + card_key(codes)
+        suit_masks = list(self.suit_masks)
+        for code in codes:
+            suit_masks[code & 3] |= 1 << (code >> 2)
+        extended.suit_masks = tuple(suit_masks)
+        return extended
+
+    def evaluate(self, hole: Iterable[Card]) -> int:
+        codes = [card.code for card in hole]
+        key = self.key + sum(map(CARD_KEYS.__getitem__, codes))
+        flush = (key + SUIT_OFFSET) & FLUSH_BITS
+        if flush:
+            suit = (flush.bit_length() - SUIT_SHIFT - 4) >> 2
+            mask = self.suit_masks[suit]
+            for code in codes:
+                if code & 3 == suit:
+                    mask |= 1 << (code >> 2)
+            return FLUSH_TABLE[mask]
+        return RANK_TABLE[key & RANK_MASK]
+
+    def to_hand(self, hole: Iterable[Card]) -> Hand:
+        hole = list(hole)
+        cards = hole + [CARDS[code] for code in self.codes]
+        return to_hand(cards, self.evaluate(hole))
+
+
+def hand_type(strength: int) -> HandType:
+    return HAND_TYPES[strength >> TYPE_SHIFT]
+
+
+def to_hand(cards: Collection[Card], strength: Optional[int] = None) -> Hand:
+    """Builds the displayable Hand for the cards (and their strength)."""
+    sorted_cards: List[Card] = sorted(cards, reverse=True)
+    if strength is None:
+        strength = evaluate_cards(sorted_cards)
+    type = hand_type(strength)
+
+    pool: List[Card] = sorted_cards
+    if type in (HandType.FLUSH, HandType.STRAIGHT_FLUSH):
+        suits = [card.suit_index for card in sorted_cards]
+        flush_suit = max(set(suits), key=suits.count)
+        pool = [card for card in sorted_cards if card.suit_index == flush_suit]
+
+    type_cards: List[Card] = []
+    for shift, count in zip(RANK_SHIFTS, TYPE_PATTERNS[type]):
+        rank = (strength >> shift) & 0xF
+        if rank == ACE_LOW:
+            rank = 14
+        matching = [card for card in pool if card.rank == rank]
+        type_cards.extend(matching[:count])
+    # Cards compare by rank only, so match on identity
+    used = {card.code for card in type_cards}
+    other_cards = [card for card in sorted_cards if card.code not in used]
+    return Hand(type, type_cards, other_cards)
+
+
+def _pack(type: HandType, ranks: Iterable[int]) -> int:
+    strength = type.value << TYPE_SHIFT
+    for shift, rank in zip(RANK_SHIFTS, ranks):
+        strength |= rank << shift
+    return strength
+
+
+def _straight_high(mask: int) -> int:
+    """Returns the high rank of the best straight in a rank bitmask, or 0."""
+    for high in range(14, 5, -1):
+        run = 0b11111 << (high - 6)
+        if mask & run == run:
+            return high
+    wheel = (1 << (NUM_RANKS - 1)) | 0b1111
+    if mask & wheel == wheel:
+        return 5
+    return 0
+
+
+# High rank of the best straight keyed by 13-bit rank mask (0 if none)
+STRAIGHT_TABLE: Tuple[int, ...] = tuple(
+    _straight_high(mask) for mask in range(1 << NUM_RANKS))
+
+
+def _straight_ranks(high: int) -> Tuple[int, ...]:
+    return tuple(rank if rank > ACE_LOW else ACE_LOW
+                 for rank in range(high, high - HAND_SIZE, -1))
+
+
+def _score_flush(mask: int) -> int:
+    high = STRAIGHT_TABLE[mask]
+    if high:
+        return _pack(HandType.STRAIGHT_FLUSH, _straight_ranks(high))
+    ranks = [rank + 2 for rank in range(NUM_RANKS - 1, -1, -1)
+             if mask & (1 << rank)]
+    return _pack(HandType.FLUSH, ranks)
+
+
+def _score_groups(mask: int,
+        quads: Tuple[int, ...],
+        trips: Tuple[int, ...],
+        pairs: Tuple[int, ...],
+        singles: Tuple[int, ...]) -> int:
+    """Scores a multiset of ranks, grouped by multiplicity (each desc)."""
+    if quads:
+        kickers = sorted(quads[1:] + trips + pairs + singles, reverse=True)
+        return _pack(HandType.FOUR_OF_A_KIND, quads[:1] + tuple(kickers[:1]))
+    if trips and (len(trips) > 1 or pairs):
+        pair = max(trips[1:] + pairs)
+        return _pack(HandType.FULL_HOUSE, (trips[0], pair))
+    high = STRAIGHT_TABLE[mask]
+    if high:
+        return _pack(HandType.STRAIGHT, _straight_ranks(high))
+    if trips:
+        return _pack(HandType.THREE_OF_A_KIND, trips[:1] + singles[:2])
+    if len(pairs) > 1:
+        kickers = sorted(pairs[2:] + singles, reverse=True)
+        return _pack(HandType.TWO_PAIR, pairs[:2] + tuple(kickers[:1]))
+    if pairs:
+        return _pack(HandType.PAIR, pairs[:1] + singles[:3])
+    return _pack(HandType.HIGH_CARD, singles[:HAND_SIZE])
+
+
+def _build_rank_table(max_cards: int = 7) -> Dict[int, int]:
+    """Scores every multiset of 1 to max_cards ranks (at most 4 of each)."""
+    table: Dict[int, int] = {}
+
+    def fill(rank, remaining, key, mask, quads, trips, pairs, singles):
+        # Walk ranks from high to low so every group stays sorted desc
+        if rank < 2:
+            if remaining < max_cards:
+                table[key] = _score_groups(mask, quads, trips, pairs, singles)
+            return
+        shift = RANK_COUNT_BITS * (rank - 2)
+        bit = 1 << (rank - 2)
+        fill(rank - 1, remaining, key, mask, quads, trips, pairs, singles)
+        if remaining >= 1:
+            fill(rank - 1, remaining - 1, key | 1 << shift, mask | bit,
+                 quads, trips, pairs, singles + (rank,))
+        if remaining >= 2:
+            fill(rank - 1, remaining - 2, key | 2 << shift, mask | bit,
+                 quads, trips, pairs + (rank,), singles)
+        if remaining >= 3:
+            fill(rank - 1, remaining - 3, key | 3 << shift, mask | bit,
+                 quads, trips + (rank,), pairs, singles)
+        if remaining >= 4:
+            fill(rank - 1, remaining - 4, key | 4 << shift, mask | bit,
+                 quads + (rank,), trips, pairs, singles)
+
+    fill(14, max_cards, 0, 0, (), (), (), ())
+    return table
+
+
+# Non-flush strength keyed by the rank-count part of a card key
+RANK_TABLE: Dict[int, int] = _build_rank_table()
+# Flush / straight flush strength keyed by the 13-bit rank mask of one suit
+FLUSH_TABLE: Tuple[int, ...] = tuple(
+    _score_flush(mask) if bin(mask).count("1") >= HAND_SIZE else 0
+    for mask in range(1 << NUM_RANKS))
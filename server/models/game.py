@@ -1,13 +1,24 @@
-import random
-from typing import Dict, List, Optional
+import copy
+from typing import Callable, Dict, List, Optional, Sequence
 import uuid
 
 from .action import Action, ActionType
 from .blinds import Blinds
 from .card import Card
 from .deck import Deck
-from .hand import determine_hand, Hand
-from .state import State
+from . import metrics
+from . import preflop
+from .equity import (
+    BOARD_SIZE, MIN_EXACT_BOARD, Equity, enumerated_equity, exact_equity)
+from .evaluator import BoardEvaluator
+from .hand import Hand
+from .state import FrozenDict, State
+from .tracing import traced
+
+
+HAND_EVALUATIONS = metrics.REGISTRY.register(metrics.Counter(
+    "poker_hand_evaluations_total",
+    "Hands scored to find winners or show players their hands"))
 
 
 class GameActionType(ActionType):
@@ -20,55 +31,61 @@ class GameActionType(ActionType):
     RIVER = 5, "River"
     SHOWDOWN = 6, "Showdown"
     END_GAME = 7, "End Game"
+    RUN_IT = 8, "Run It"
+    SETTLE_EQUITY = 9, "Settle Equity"
 
 
 def next(state: State, action: Action) -> State:
-    if action.type is GameActionType.START_GAME:
-        return start_game(state)
-    if action.type is GameActionType.END_ROUND:
-        return end_round(state)
-    if action.type is GameActionType.DEAL:
-        return deal(state)
-    if action.type is GameActionType.FLOP:
-        return flop(state)
-    if action.type is GameActionType.TURN:
-        return type(state)
-    if action.type is GameActionType.RIVER:
-        return river(state)
-    if action.type is GameActionType.SHOWDOWN:
-        return showdown(state)
-    if action.type is GameActionType.END_GAME:
-        return end_game(state, action.winners)
-
-
-def start_game(state: State) -> State:
-    board = []
+    return REDUCERS[action.type](state, action)
+
+
+def next_to_act(in_play: Sequence[uuid.UUID],
+        stacks: Dict[uuid.UUID, int],
+        start: int) -> int:
+    """Index of the first player from start on (wrapping around) who still
+    has chips to act with; all-in players are skipped."""
+    for offset in range(len(in_play)):
+        index = (start + offset) % len(in_play)
+        if stacks[in_play[index]] > 0:
+            return index
+    return start % len(in_play)
+
+
+def start_game(state: State, seed: Optional[int] = None) -> State:
+    """Deals a new game. The deck is shuffled from seed, so logged games
+    replay to the same cards."""
+    board = ()
     dealer_position = (state.dealer_position + 1) % len(state.players)
-    deck = Deck()
-    holes = {}
-    winners = []
+    deck = copy.copy(state.deck)
+    deck.reset(seed)
+    holes = FrozenDict()
+    winners = ()
     # Order so dealer is last
     in_play = state.players[dealer_position + 1:] + state.players[:dealer_position + 1]
-    # Bet blinds
-    bets = {
-        in_play[0]: state.blinds.small,
-        in_play[1]: state.blinds.big,
-    }
-    pot = state.blinds.small + state.blinds.big
-    stacks = state.stacks
-    stacks[in_play[0]] -= min(state.blinds.small, stacks[in_play[0]])
-    stacks[in_play[1]] -= min(state.blinds.big, stacks[in_play[1]])
+    # Bet blinds, all-in for short stacks, so the pot only holds chips put in
+    stacks = dict(state.stacks)
+    small = min(state.blinds.small, stacks[in_play[0]])
+    big = min(state.blinds.big, stacks[in_play[1]])
+    stacks[in_play[0]] -= small
+    stacks[in_play[1]] -= big
+    bets = FrozenDict({
+        in_play[0]: small,
+        in_play[1]: big,
+    })
+    pot = small + big
     # Start action from UTG
-    to_act = 2 % len(in_play)
+    to_act = next_to_act(in_play, stacks, 2)
     changes = {
         "bets": bets,
         "board": board,
+        "board_evaluator": BoardEvaluator(),
         "dealer_position": dealer_position,
         "deck": deck,
         "holes": holes,
         "in_play": in_play,
         "pot": pot,
-        "stacks": stacks,
+        "runouts": (),
+        "stacks": FrozenDict(stacks),
         "to_act": to_act,
         "winners": winners,
     }
@@ -76,78 +93,213 @@ def start_game(state: State) -> State:
 
 
 def end_round(state: State) -> State:
-    bets = {}
-    return State.new_state(state, changes={"bets": bets})
+    bets = FrozenDict()
+    changes = {"bets": bets}
+    if state.in_play:
+        # Later streets start from the first player after the dealer
+        changes["to_act"] = next_to_act(state.in_play, state.stacks, 0)
+    return State.new_state(state, changes=changes)
 
 
 def deal(state: State) -> State:
     DEAL_SIZE = 2  # Number of hole cards to deal
 
-    holes: Dict[uuid.UUID, List[Card]] = {}
-    for player_uuid in state.in_play:
-        holes[player_uuid] = state.deck.draw(num=DEAL_SIZE)
-    return State.new_state(state, changes={"holes": holes})
+    deck = copy.copy(state.deck)
+    holes = FrozenDict({player_uuid: tuple(deck.draw(num=DEAL_SIZE))
+                        for player_uuid in state.in_play})
+    return State.new_state(state, changes={"deck": deck, "holes": holes})
 
 
 def flop(state: State) -> State:
     FLOP_SIZE = 3  # Number of flop cards to deal
 
-    board = state.deck.draw(num=FLOP_SIZE)
-    return State.new_state(state, changes={"board": board})
+    deck = copy.copy(state.deck)
+    board = tuple(deck.draw(num=FLOP_SIZE))
+    changes = {
+        "board": board,
+        "board_evaluator": BoardEvaluator(board),
+        "deck": deck,
+    }
+    return State.new_state(state, changes=changes)
 
 
 def turn(state: State) -> State:
     TURN_SIZE = 1  # Number of turn cards to deal
 
-    board = state.board
-    board.extend(state.deck.draw(num=TURN_SIZE))
-    return State.new_state(state, changes={"board": board})
+    deck = copy.copy(state.deck)
+    drawn = tuple(deck.draw(num=TURN_SIZE))
+    changes = {
+        "board": state.board + drawn,
+        "board_evaluator": state.board_evaluator.extend(drawn),
+        "deck": deck,
+    }
+    return State.new_state(state, changes=changes)
 
 
 def river(state: State) -> State:
     RIVER_SIZE = 1  # Number of river cards to deal
 
-    board = state.board
-    board.extend(state.deck.draw(num=RIVER_SIZE))
-    return State.new_state(state, changes={"board": board})
+    deck = copy.copy(state.deck)
+    drawn = tuple(deck.draw(num=RIVER_SIZE))
+    changes = {
+        "board": state.board + drawn,
+        "board_evaluator": state.board_evaluator.extend(drawn),
+        "deck": deck,
+    }
+    return State.new_state(state, changes=changes)
 
 
 def showdown(state: State) -> State:
+    return end_game(state, _winners(state, state.board_evaluator))
+
+
+@traced("game.winners")
+def _winners(state: State,
+        board_evaluator: BoardEvaluator) -> List[uuid.UUID]:
     winners: List[uuid.UUID] = []
-    winning_hand: Optional[Hand] = None
+    winning_strength: int = -1
+    HAND_EVALUATIONS.inc(amount=len(state.in_play))
 
     for player_uuid in state.in_play:
-        hand = determine_hand(state.holes[player_uuid], state.board)
-        if winning_hand is None or hand > winning_hand:
+        strength = board_evaluator.evaluate(state.holes[player_uuid])
+        if strength > winning_strength:
             winners = [player_uuid]
-            winning_hand = hand
-        elif hand == winning_hand:
+            winning_strength = strength
+        elif strength == winning_strength:
             winners.append(player_uuid)
 
-    return end_game(state, winners)
+    return winners
 
 
-def end_game(state: State, winners: List[uuid.UUID]) -> State:
-    stacks: Dict[uuid.UUID, int] = state.stacks
+@traced("game.hands")
+def hands(state: State) -> Dict[uuid.UUID, Hand]:
+    """Current hand of each player in play, for hand-strength display."""
+    HAND_EVALUATIONS.inc(amount=len(state.in_play))
+    return {
+        player_uuid: state.board_evaluator.to_hand(state.holes[player_uuid])
+        for player_uuid in state.in_play
+        if player_uuid in state.holes
+    }
+
+
+@traced("game.equities")
+def equities(state: State) -> Dict[uuid.UUID, Equity]:
+    """Equity of each player in play, e.g. once everyone is all-in. Exact
+    from the flop on, from the preflop table before."""
+    holes = [state.holes[player_uuid] for player_uuid in state.in_play]
+    if len(state.board) < MIN_EXACT_BOARD:
+        return dict(zip(state.in_play, preflop.equities(holes)))
+    return dict(zip(state.in_play, exact_equity(holes, state.board)))
+
+
+def run_it(state: State, times: int) -> State:
+    """Deals the rest of the board `times` times, splitting the pot evenly
+    between the runouts."""
+    needed = BOARD_SIZE - len(state.board)
+    if times < 1:
+        raise ValueError(f"Cannot run it {times} times")
+    if times * needed > len(state.deck):
+        raise ValueError(f"Not enough cards left to run it {times} times")
+    deck = copy.copy(state.deck)
+    runouts = tuple(state.board + tuple(deck.draw(num=needed))
+                    for _ in range(times))
+    stacks: Dict[uuid.UUID, int] = dict(state.stacks)
+    winners: List[uuid.UUID] = []
+    for board, pot in zip(runouts, _divide_pot(state.pot, times)):
+        runout_winners = _winners(state, BoardEvaluator(board))
+        winnings = _divide_pot(pot, len(runout_winners))
+        for winner_uuid, winning in zip(runout_winners, winnings):
+            stacks[winner_uuid] += winning
+        winners.extend(winner_uuid for winner_uuid in runout_winners
+                       if winner_uuid not in winners)
+    changes = {
+        "board": runouts[0],
+        "board_evaluator": BoardEvaluator(runouts[0]),
+        "deck": deck,
+        "runouts": runouts,
+        "stacks": FrozenDict(stacks),
+        "winners": tuple(winners),
+    }
+    return State.new_state(state, changes=changes)
+
+
+def settle_shares(state: State) -> List[int]:
+    """Chips of the pot due to each player in play by exact equity, as
+    agreed in an insurance deal. Preflop too, every runout is enumerated:
+    the preflop table behind equities() is only fit for display. That
+    takes up to a second, so it's done before the action, not in it."""
+    holes = [state.holes[player_uuid] for player_uuid in state.in_play]
+    return _divide_by_equity(
+        state.pot, [result.equity
+                    for result in enumerated_equity(holes, state.board)])
+
+
+def settle_equity(state: State, shares: Sequence[int]) -> State:
+    """Pays out the pot in shares (see settle_shares) instead of dealing
+    the board."""
+    if len(shares) != len(state.in_play) or sum(shares) != state.pot:
+        raise ValueError("Shares must split the pot between the players in play")
+    stacks: Dict[uuid.UUID, int] = dict(state.stacks)
+    for player_uuid, share in zip(state.in_play, shares):
+        stacks[player_uuid] += share
+    winners = tuple(player_uuid
+                    for player_uuid, share in zip(state.in_play, shares)
+                    if share > 0)
+    changes = {
+        "stacks": FrozenDict(stacks),
+        "winners": winners,
+    }
+    return State.new_state(state, changes=changes)
+
+
+def end_game(state: State, winners: Sequence[uuid.UUID]) -> State:
+    stacks: Dict[uuid.UUID, int] = dict(state.stacks)
     winnings = _divide_pot(state.pot, len(winners))
     for winner_uuid, winning in zip(winners, winnings):
         stacks[winner_uuid] += winning
     changes = {
-        "stacks": stacks,
-        "winners": winners,
+        "stacks": FrozenDict(stacks),
+        "winners": tuple(winners),
     }
     return State.new_state(state, changes=changes)
 
 
 def _divide_pot(pot, num_splits):
-    """Randomly selects among winners to provide the additional cent
-    (if necessary)."""
-    split = int(float(pot) / num_splits)
+    """Splits the pot evenly, giving any odd chips to the first winners
+    (the first to act after the dealer), so payouts replay identically."""
+    split, difference = divmod(pot, num_splits)
     winnings = [split] * num_splits
-    difference = pot - sum(winnings)
-    if difference == 0:
-        return winnings
-    random_indices = random.sample(range(num_splits), difference)
-    for index in random_indices:
+    for index in range(difference):
         winnings[index] += 1
     return winnings
+
+
+def _divide_by_equity(pot, fractions):
+    """Rounds down each share, then gives the leftover chips to the largest
+    remainders."""
+    exact = [pot * fraction for fraction in fractions]
+    shares = [int(share) for share in exact]
+    by_remainder = sorted(range(len(exact)),
+                          key=lambda index: exact[index] - shares[index],
+                          reverse=True)
+    for index in by_remainder[:pot - sum(shares)]:
+        shares[index] += 1
+    return shares
+
+
+REDUCERS: Dict[GameActionType, Callable[[State, Action], State]] = {
+    GameActionType.START_GAME: lambda state, action: start_game(
+        state, getattr(action, "seed", None)),
+    GameActionType.END_ROUND: lambda state, action: end_round(state),
+    GameActionType.DEAL: lambda state, action: deal(state),
+    GameActionType.FLOP: lambda state, action: flop(state),
+    GameActionType.TURN: lambda state, action: turn(state),
+    GameActionType.RIVER: lambda state, action: river(state),
+    GameActionType.SHOWDOWN: lambda state, action: showdown(state),
+    GameActionType.END_GAME: lambda state, action: end_game(
+        state, action.winners),
+    GameActionType.RUN_IT: lambda state, action: run_it(state, action.times),
+    # Actions logged before they carried their shares are settled again
+    GameActionType.SETTLE_EQUITY: lambda state, action: settle_equity(
+        state, getattr(action, "shares", None) or settle_shares(state)),
+}
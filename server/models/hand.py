@@ -1,10 +1,11 @@
 import itertools
 import operator
-from typing import Any, Callable, Collection, Dict, List, Optional
+from typing import Any, Callable, Collection, Dict, Iterable, List, Optional
 
 from aenum import Enum
 
-from .card import Card, CardSuit, CardValue
+from .card import Card, CardSuit
+from .tracing import traced
 
 HAND_SIZE = 5  # Number of cards in a valid hand
 
@@ -51,52 +52,43 @@ class Hand(object):
     type: HandType
     type_cards: List[Card]  # Ordered desc (most important card at 0)
     other_cards: List[Card]  # Ordered desc (highest card at 0)
+    key: int  # Totally ordered comparison key, computed once
 
     def __init__(self,
             type: Any, type_cards: List[Card], other_cards: List[Card]):
         self.type = HandType(type)
         self.type_cards = type_cards
         self.other_cards = other_cards
-
-    def _compare_hands(self, other,
-            compare: Callable[[Any, Any], bool]) -> bool:
-        if self.type != other.type:
-            return compare(self.type, other.type)
-
-        # Compare type cards first
-        type_cards_comparison: Optional[bool] = self._compare_cards(
-            self.type_cards, other.type_cards, compare)
-        if type_cards_comparison is not None:
-            return type_cards_comparison
-
-        # Then compare other cards
-        num_eval: int = HAND_SIZE - len(self.type_cards)  # Evaluate only HAND_SIZE # of cards
-        other_cards_comparison: Optional[bool] = self._compare_cards(
-            self.other_cards[:num_eval], other.other_cards[:num_eval], compare)
-        if other_cards_comparison is not None:
-            return other_cards_comparison
-
-        # Both hands are equal, hack - return comparison of equal items
-        return compare(True, True)
-
-    def _compare_cards(self,
-            first: List[Card],
-            second: List[Card],
-            compare: Callable[[Any, Any], bool]) -> Optional[bool]:
-        # Compare card-by-card in descending order
-        for first_card, second_card in zip(first, second):
-            if first_card != second_card:
-                return compare(first_card, second_card)
-        return None
+        self.key = self._compute_key()
+
+    def _compute_key(self) -> int:
+        """Packs the type and the ranks of the HAND_SIZE cards that decide
+        the hand (type cards, then kickers) into an int, 4 bits per rank."""
+        num_eval: int = max(0, HAND_SIZE - len(self.type_cards))
+        cards: List[Card] = self.type_cards + self.other_cards[:num_eval]
+        key: int = self.type.value
+        for index in range(HAND_SIZE):
+            key = (key << 4) | (cards[index].rank if index < len(cards) else 0)
+        return key
 
     def __eq__(self, other):
-        return self._compare_hands(other, operator.eq)
+        return self.key == other.key
 
     def __gt__(self, other):
-        return self._compare_hands(other, operator.gt)
+        return self.key > other.key
 
     def __lt__(self, other):
-        return self._compare_hands(other, operator.lt)
+        return self.key < other.key
+
+    def __ge__(self, other):
+        return self.key >= other.key
+
+    def __le__(self, other):
+        return self.key <= other.key
+
+    def __hash__(self):
+        """Reflects __eq__."""
+        return hash(self.key)
 
     def __repr__(self):
         return f"{self.type}: {(self.type_cards + self.other_cards)[:5]}"
@@ -105,6 +97,19 @@ class Hand(object):
         return f"{self.type}: {(self.type_cards + self.other_cards)[:5]}"
 
 
+def rank_hands(hands: Iterable[Hand]) -> List[List[Hand]]:
+    """Groups hands into ties, best group first."""
+    groups: List[List[Hand]] = []
+    previous_key: Optional[int] = None
+    for hand in sorted(hands, key=operator.attrgetter("key"), reverse=True):
+        if hand.key != previous_key:
+            groups.append([])
+            previous_key = hand.key
+        groups[-1].append(hand)
+    return groups
+
+
+@traced("determine_hand")
 def determine_hand(hole: Collection[Card], board: Collection[Card]) -> Hand:
     """Main entry point to determine the ranking of the hand."""
     ORDERED_FUNCS = [
@@ -127,6 +132,12 @@ def determine_hand(hole: Collection[Card], board: Collection[Card]) -> Hand:
             return hand
 
 
+def evaluate_many(holes, boards):
+    """Batch entry point over card code arrays, see models.batch."""
+    from .batch import evaluate_many
+    return evaluate_many(holes, boards)
+
+
 # All of these functions operate under the assumption that:
 # 1) the functions above them did not return a result
 # 2) the cards are sorted in descending order
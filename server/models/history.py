@@ -0,0 +1,448 @@
+import bisect
+import functools
+import mmap
+import os
+import pickle
+import struct
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import uuid
+import zlib
+
+from .action import Action
+from .blinds import Blinds
+from .card import CARDS, Card
+from .game import GameActionType
+from .player import PlayerActionType
+from .state import State
+
+DATA_NAME = "hands.dat"
+HANDS_INDEX_NAME = "hands.index"
+PLAYERS_INDEX_NAME = "players.index"
+HEADS_NAME = "players.heads"
+DEFAULT_HEADS_INTERVAL = 1000  # Hands between saves of the player heads
+NO_CARD = 0xFF  # Card code of hole cards never dealt and board cards unseen
+NO_SEAT = 0xFF
+BOARD_SIZE = 5
+STREETS = {0: 0, 3: 1, 4: 2, 5: 3}  # Street of each board size
+
+# Record header: body length, CRC32 of the body
+_RECORD = struct.Struct("<II")
+# Hand: id, timestamp (ms), small blind, big blind, pot, dealer position,
+# seat count, board size, action count, winner count
+_HAND = struct.Struct("<QqqqqBBBHB")
+# Seat: player UUID, hole card codes
+_SEAT = struct.Struct("<16sBB")
+_BOARD = struct.Struct(f"<{BOARD_SIZE}B")
+# Action: street, seat, PlayerActionType value, amount
+_ACTION = struct.Struct("<BBBq")
+# Hand index entry: record offset, timestamp (ms)
+_HAND_ENTRY = struct.Struct("<Qq")
+# Player index entry: player UUID, hand id, previous entry of that player + 1
+# (0 for none), chaining each player's hands newest to oldest
+_PLAYER_ENTRY = struct.Struct("<16sQQ")
+# Heads header: player index entries covered
+_HEADS = struct.Struct("<Q")
+
+UUID_CACHE_SIZE = 4096
+_ACTION_TYPES = {type.value: type for type in PlayerActionType}
+
+
+@functools.lru_cache(maxsize=UUID_CACHE_SIZE)
+def _uuid(player_bytes: bytes) -> uuid.UUID:
+    """The same players show up hand after hand, so each is built once."""
+    return uuid.UUID(bytes=player_bytes)
+
+
+class HandRecord(object):
+    """One completed hand as stored in a HandHistory."""
+
+    __slots__ = (
+        "hand_id",
+        "timestamp",
+        "blinds",
+        "dealer_position",
+        "players",
+        "holes",
+        "board",
+        "actions",
+        "pot",
+        "winners",
+    )
+
+    hand_id: int
+    timestamp: float
+    blinds: Blinds
+    dealer_position: int
+    players: Tuple[uuid.UUID, ...]  # In seat order
+    holes: Dict[uuid.UUID, Tuple[Card, ...]]  # Empty tuple if never dealt
+    board: Tuple[Card, ...]
+    # Street (0 preflop to 3 river), player, action type, amount
+    actions: Tuple[Tuple[int, uuid.UUID, PlayerActionType, int], ...]
+    pot: int
+    winners: Tuple[uuid.UUID, ...]
+
+    def __init__(self, **fields):
+        for name in HandRecord.__slots__:
+            setattr(self, name, fields[name])
+
+    @staticmethod
+    def to_dict(record) -> Dict[str, Any]:
+        return {
+            "hand_id": record.hand_id,
+            "timestamp": record.timestamp,
+            "blinds": Blinds.to_dict(record.blinds),
+            "dealer_position": record.dealer_position,
+            "players": [str(id) for id in record.players],
+            "holes": {str(id): [Card.to_dict(card) for card in hole]
+                      for id, hole in record.holes.items()},
+            "board": [Card.to_dict(card) for card in record.board],
+            "actions": [{
+                "street": street,
+                "player_uuid": str(player_uuid),
+                "type": str(type),
+                "amount": amount,
+            } for street, player_uuid, type, amount in record.actions],
+            "pot": record.pot,
+            "winners": [str(id) for id in record.winners],
+        }
+
+
+def encode_hand(hand_id: int,
+        timestamp_ms: int,
+        state: State,
+        holes: Dict[uuid.UUID, Tuple[Card, ...]],
+        actions: List[Tuple[int, uuid.UUID, PlayerActionType, int]]) -> bytes:
+    """Packs a finished hand: fixed-width header, seats, board and actions,
+    then a byte per winner's seat."""
+    seats = {player_uuid: seat for seat, player_uuid in enumerate(state.players)}
+    parts = [_HAND.pack(
+        hand_id, timestamp_ms, state.blinds.small, state.blinds.big,
+        state.pot, state.dealer_position, len(state.players),
+        len(state.board), len(actions), len(state.winners))]
+    for player_uuid in state.players:
+        hole = [card.code for card in holes.get(player_uuid, ())]
+        hole += [NO_CARD] * (2 - len(hole))
+        parts.append(_SEAT.pack(player_uuid.bytes, *hole))
+    board = [card.code for card in state.board]
+    parts.append(_BOARD.pack(*board, *[NO_CARD] * (BOARD_SIZE - len(board))))
+    for street, player_uuid, type, amount in actions:
+        parts.append(_ACTION.pack(
+            street, seats.get(player_uuid, NO_SEAT), type.value, amount))
+    parts.append(bytes(seats[winner_uuid] for winner_uuid in state.winners))
+    return b"".join(parts)
+
+
+def decode_hand(data, offset: int = 0) -> HandRecord:
+    (hand_id, timestamp_ms, small, big, pot, dealer_position, seat_count,
+     board_size, action_count, winner_count) = _HAND.unpack_from(data, offset)
+    offset += _HAND.size
+    players = []
+    holes = {}
+    for _ in range(seat_count):
+        player_bytes, first, second = _SEAT.unpack_from(data, offset)
+        offset += _SEAT.size
+        player_uuid = _uuid(player_bytes)
+        players.append(player_uuid)
+        holes[player_uuid] = tuple(
+            CARDS[code] for code in (first, second) if code != NO_CARD)
+    board = tuple(CARDS[code]
+                  for code in _BOARD.unpack_from(data, offset)[:board_size])
+    offset += _BOARD.size
+    actions = []
+    for _ in range(action_count):
+        street, seat, type, amount = _ACTION.unpack_from(data, offset)
+        offset += _ACTION.size
+        actions.append((street, players[seat] if seat != NO_SEAT else None,
+                        _ACTION_TYPES[type], amount))
+    winners = tuple(players[seat] for seat in data[offset:offset + winner_count])
+    return HandRecord(
+        hand_id=hand_id,
+        timestamp=timestamp_ms / 1000,
+        blinds=Blinds(small, big),
+        dealer_position=dealer_position,
+        players=tuple(players),
+        holes=holes,
+        board=board,
+        actions=tuple(actions),
+        pot=pot,
+        winners=winners)
+
+
+class _Mapped(object):
+    """Read-only memory map of an append-only file, remapped as it grows.
+    Unpacks straight from the map, so reads never load the file."""
+
+    def __init__(self, path: str):
+        self._file = open(path, "rb")
+        self._map: Optional[mmap.mmap] = None
+        self._size = 0
+
+    def get(self, end: int) -> mmap.mmap:
+        """The map, covering at least the first `end` bytes."""
+        if end > self._size:
+            # The previous map stays valid for generators still using it
+            self._size = os.fstat(self._file.fileno()).st_size
+            self._map = mmap.mmap(
+                self._file.fileno(), self._size, access=mmap.ACCESS_READ)
+        return self._map
+
+    def close(self) -> None:
+        self._map = None
+        self._file.close()
+
+
+class _Timestamps(object):
+    """Timestamps of the hand index as a sequence, for bisect."""
+
+    def __init__(self, history: "HandHistory"):
+        self._index = history._hands_index.get(len(history) * _HAND_ENTRY.size)
+        self._length = len(history)
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, hand_id: int) -> int:
+        return _HAND_ENTRY.unpack_from(
+            self._index, hand_id * _HAND_ENTRY.size)[1]
+
+
+class HandHistory(object):
+    """Append-only store of completed hands, indexed by hand id, player and
+    timestamp. Hands are numbered from 0 in the order they finish.
+
+    Hands go to hands.dat as compact binary records (see encode_hand), and
+    each hand's offset and timestamp to the fixed-width hands.index, which is
+    the commit point of a hand. players.index chains each player's hands
+    from newest to oldest; the newest entry of every player is saved to
+    players.heads every `heads_interval` hands and on close, so opening the
+    store only reads the entries after that. All reads go through memory
+    maps and decode one hand at a time.
+    """
+
+    directory: str
+    heads_interval: int
+
+    def __init__(self,
+            directory: str,
+            heads_interval: int = DEFAULT_HEADS_INTERVAL,
+            fsync: bool = False):
+        self.directory = directory
+        self.heads_interval = heads_interval
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        paths = [os.path.join(directory, name) for name in
+                 (DATA_NAME, HANDS_INDEX_NAME, PLAYERS_INDEX_NAME)]
+        self._files = [open(path, "ab") for path in paths]
+        self._data, self._hands_file, self._players_file = self._files
+        self._hands = self._recover()
+        self._last_timestamp = (
+            self._timestamp(self._hands - 1) if self._hands else 0)
+        self._data_map, self._hands_index, self._players_index = (
+            _Mapped(path) for path in paths)
+        self._heads = self._load_heads()
+        # Recorder state of the hand in progress, None between hands
+        self._actions: Optional[List[Tuple[int, uuid.UUID, PlayerActionType, int]]] = None
+        self._holes: Dict[uuid.UUID, Tuple[Card, ...]] = {}
+
+    def record(self, action: Action, state: State) -> Optional[int]:
+        """Follows a table's actions along with the states they produced,
+        storing each hand once it has winners. Returns the id of the hand
+        stored, if any. Hands already under way when recording started are
+        skipped."""
+        if action.type is GameActionType.START_GAME:
+            self._actions = []
+            self._holes = {}
+        elif self._actions is None:
+            return None
+        elif action.type is GameActionType.DEAL:
+            # Folding discards holes, so they are kept from the deal on
+            self._holes = state.holes
+        elif isinstance(action.type, PlayerActionType):
+            self._actions.append((
+                STREETS.get(len(state.board), 0),
+                action.player_uuid,
+                action.type,
+                getattr(action, "amount", 0)))
+        if not state.winners:
+            return None
+        hand_id = self.append(state, self._holes, self._actions)
+        self._actions = None
+        self._holes = {}
+        return hand_id
+
+    def append(self,
+            state: State,
+            holes: Dict[uuid.UUID, Tuple[Card, ...]],
+            actions: List[Tuple[int, uuid.UUID, PlayerActionType, int]],
+            timestamp: Optional[float] = None) -> int:
+        """Stores a finished hand, returning its id."""
+        hand_id = self._hands
+        # Kept non-decreasing, so the hand index is sorted by time too
+        timestamp_ms = max(int((time.time() if timestamp is None
+                                else timestamp) * 1000),
+                           self._last_timestamp)
+        body = encode_hand(hand_id, timestamp_ms, state, holes, actions)
+        offset = self._data.tell()
+        self._data.write(_RECORD.pack(len(body), zlib.crc32(body)))
+        self._data.write(body)
+
+        entry = self._players_file.tell() // _PLAYER_ENTRY.size
+        for player_uuid in state.players:
+            key = player_uuid.bytes
+            self._players_file.write(_PLAYER_ENTRY.pack(
+                key, hand_id, self._heads.get(key, 0)))
+            entry += 1
+            self._heads[key] = entry
+        # Written last: a hand exists once it's in the hand index
+        self._hands_file.write(_HAND_ENTRY.pack(offset, timestamp_ms))
+        for file in self._files:
+            file.flush()
+            if self.fsync:
+                os.fsync(file.fileno())
+
+        self._hands += 1
+        self._last_timestamp = timestamp_ms
+        if self._hands % self.heads_interval == 0:
+            self._save_heads()
+        return hand_id
+
+    def hand(self, hand_id: int) -> HandRecord:
+        if not 0 <= hand_id < self._hands:
+            raise KeyError(f"No hand {hand_id}")
+        offset = self._offset(hand_id)
+        data = self._data_map.get(offset + _RECORD.size + _HAND.size)
+        length, _ = _RECORD.unpack_from(data, offset)
+        return decode_hand(self._data_map.get(offset + _RECORD.size + length),
+                           offset + _RECORD.size)
+
+    def hands(self, start: int = 0, stop: Optional[int] = None) -> Iterator[HandRecord]:
+        """Streams hands start to stop (exclusive) in order, decoding each
+        only when it's reached."""
+        stop = self._hands if stop is None else min(stop, self._hands)
+        if start >= stop:
+            return
+        offset = self._offset(start)
+        end = (self._offset(stop) if stop < self._hands
+               else self._data.tell())
+        data = self._data_map.get(end)
+        while offset < end:
+            length, _ = _RECORD.unpack_from(data, offset)
+            yield decode_hand(data, offset + _RECORD.size)
+            offset += _RECORD.size + length
+
+    def player_hands(self, player_uuid: uuid.UUID) -> Iterator[HandRecord]:
+        """Streams the hands player_uuid was seated for, newest first."""
+        for hand_id in self.player_hand_ids(player_uuid):
+            yield self.hand(hand_id)
+
+    def player_hand_ids(self, player_uuid: uuid.UUID) -> Iterator[int]:
+        entry = self._heads.get(player_uuid.bytes, 0)
+        if not entry:
+            return
+        index = self._players_index.get(entry * _PLAYER_ENTRY.size)
+        while entry:
+            _, hand_id, entry = _PLAYER_ENTRY.unpack_from(
+                index, (entry - 1) * _PLAYER_ENTRY.size)
+            yield hand_id
+
+    def between(self,
+            start: Optional[float] = None,
+            end: Optional[float] = None) -> Iterator[HandRecord]:
+        """Streams the hands finished from start up to end (exclusive),
+        given as seconds since the epoch like time.time()."""
+        timestamps = _Timestamps(self)
+        first = (0 if start is None
+                 else bisect.bisect_left(timestamps, int(start * 1000)))
+        stop = (len(timestamps) if end is None
+                else bisect.bisect_left(timestamps, int(end * 1000)))
+        return self.hands(first, stop)
+
+    def close(self) -> None:
+        self._save_heads()
+        for file in self._files:
+            file.close()
+        for mapped in (self._data_map, self._hands_index, self._players_index):
+            mapped.close()
+
+    def __len__(self):
+        return self._hands
+
+    def _offset(self, hand_id: int) -> int:
+        index = self._hands_index.get((hand_id + 1) * _HAND_ENTRY.size)
+        return _HAND_ENTRY.unpack_from(index, hand_id * _HAND_ENTRY.size)[0]
+
+    def _timestamp(self, hand_id: int) -> int:
+        with open(self._hands_file.name, "rb") as file:
+            file.seek(hand_id * _HAND_ENTRY.size)
+            return _HAND_ENTRY.unpack(file.read(_HAND_ENTRY.size))[1]
+
+    def _recover(self) -> int:
+        """Drops whatever a crash left past the last hand in the hand index,
+        returning the number of hands."""
+        hands = self._hands_file.tell() // _HAND_ENTRY.size
+        self._truncate(self._hands_file, hands * _HAND_ENTRY.size)
+        data_end = 0
+        if hands:
+            with open(self._hands_file.name, "rb") as file:
+                file.seek((hands - 1) * _HAND_ENTRY.size)
+                offset, _ = _HAND_ENTRY.unpack(file.read(_HAND_ENTRY.size))
+            with open(self._data.name, "rb") as file:
+                file.seek(offset)
+                length, _ = _RECORD.unpack(file.read(_RECORD.size))
+            data_end = offset + _RECORD.size + length
+        self._truncate(self._data, data_end)
+
+        # Player entries are written in hand order, so those of unfinished
+        # hands are at the end
+        entries = self._players_file.tell() // _PLAYER_ENTRY.size
+        with open(self._players_file.name, "rb") as file:
+            while entries:
+                file.seek((entries - 1) * _PLAYER_ENTRY.size)
+                _, hand_id, _ = _PLAYER_ENTRY.unpack(file.read(_PLAYER_ENTRY.size))
+                if hand_id < hands:
+                    break
+                entries -= 1
+        self._truncate(self._players_file, entries * _PLAYER_ENTRY.size)
+        return hands
+
+    @staticmethod
+    def _truncate(file, size: int) -> None:
+        if file.tell() != size:
+            file.truncate(size)
+            file.seek(size)
+
+    def _load_heads(self) -> Dict[bytes, int]:
+        """Newest player index entry (+ 1) of every player, from the saved
+        heads plus the entries written after them."""
+        entries = self._players_file.tell() // _PLAYER_ENTRY.size
+        heads: Dict[bytes, int] = {}
+        covered = 0
+        path = os.path.join(self.directory, HEADS_NAME)
+        if os.path.exists(path):
+            with open(path, "rb") as file:
+                (covered,) = _HEADS.unpack(file.read(_HEADS.size))
+                if covered <= entries:
+                    heads = pickle.load(file)
+                else:
+                    # Saved past entries lost in a crash
+                    covered = 0
+        if covered < entries:
+            index = self._players_index.get(entries * _PLAYER_ENTRY.size)
+            for entry in range(covered, entries):
+                key, _, _ = _PLAYER_ENTRY.unpack_from(
+                    index, entry * _PLAYER_ENTRY.size)
+                heads[key] = entry + 1
+        return heads
+
+    def _save_heads(self) -> None:
+        path = os.path.join(self.directory, HEADS_NAME)
+        temporary_path = path + ".tmp"
+        with open(temporary_path, "wb") as file:
+            file.write(_HEADS.pack(
+                self._players_file.tell() // _PLAYER_ENTRY.size))
+            pickle.dump(self._heads, file, protocol=pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            if self.fsync:
+                os.fsync(file.fileno())
+        os.replace(temporary_path, path)
@@ -0,0 +1,242 @@
+import os
+import struct
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import uuid
+import zlib
+
+from aenum import Enum
+
+from .action import Action, ActionType
+from .game import GameActionType
+from .player import PlayerActionType
+from .state import State
+from .table import TableActionType
+
+LEDGER_NAME = "ledger.dat"
+DEFAULT_BATCH_SIZE = 512  # Entries buffered before a flush, hands aside
+# Accounts besides the players': the table's pot, and the cashier that
+# buy-ins come from and cash-outs go back to
+POT = uuid.UUID(int=0)
+CASHIER = uuid.UUID(int=1)
+
+# Batch header: actions covered, entry count, CRC32 of the entries
+_BATCH = struct.Struct("<QII")
+# Entry: version, kind, source, destination, amount
+_ENTRY = struct.Struct("<QB16s16sq")
+
+
+class EntryKind(Enum):
+
+    _init_ = "value display"
+
+    BUY_IN = 0, "Buy In"
+    CASH_OUT = 1, "Cash Out"
+    BLIND = 2, "Blind"
+    BET = 3, "Bet"  # Bets, calls and raises
+    AWARD = 4, "Award"  # A winner's share of the pot
+
+    def __str__(self):
+        return self.display
+
+
+# Kind of the chips a player puts in, by action type
+_SPENT: Dict[ActionType, EntryKind] = {
+    GameActionType.START_GAME: EntryKind.BLIND,
+    PlayerActionType.BET: EntryKind.BET,
+    PlayerActionType.CALL: EntryKind.BET,
+    PlayerActionType.RAISE: EntryKind.BET,
+    TableActionType.CASH_OUT: EntryKind.CASH_OUT,
+}
+
+
+class Entry(object):
+    """Chips moving between two accounts: the source's balance goes down by
+    amount and the destination's up by as much, so the balances of all
+    accounts always add up to zero."""
+
+    __slots__ = ("version", "kind", "source", "destination", "amount")
+
+    version: int  # The action that moved the chips, numbered as in ActionLog
+    kind: EntryKind
+    source: uuid.UUID
+    destination: uuid.UUID
+    amount: int
+
+    def __init__(self,
+            version: int,
+            kind: EntryKind,
+            source: uuid.UUID,
+            destination: uuid.UUID,
+            amount: int):
+        self.version = version
+        self.kind = kind
+        self.source = source
+        self.destination = destination
+        self.amount = amount
+
+    @staticmethod
+    def to_dict(entry) -> Dict[str, Any]:
+        return {
+            "version": entry.version,
+            "kind": str(entry.kind),
+            "source": str(entry.source),
+            "destination": str(entry.destination),
+            "amount": entry.amount,
+        }
+
+
+class ChipLedger(object):
+    """Append-only, double-entry record of every chip one table moves:
+    buy-ins, blinds, bets, each winner's share of a pot (so odd chips show
+    up as the share they went to) and cash-outs.
+
+    Entries are derived from the stack changes an action makes, so the
+    reducers stay pure. They are buffered and written in batches, at the end
+    of every hand and every `batch_size` entries, each batch with the number
+    of actions it covers and a checksum; a batch torn by a crash is dropped
+    on open, and Poker re-posts the actions it missed from the action log.
+    Running balances are kept in memory, buffered entries included.
+
+    Without a directory, only the balances are kept.
+    """
+
+    directory: Optional[str]
+    batch_size: int
+    fsync: bool  # Sync each batch to disk, not just to the OS
+    balances: Dict[uuid.UUID, int]
+    version: int  # Actions recorded so far
+
+    def __init__(self,
+            directory: Optional[str] = None,
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            fsync: bool = False):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.fsync = fsync
+        self.balances = {}
+        self.version = 0
+        self._flushed = 0  # Actions covered by the batches written
+        self._buffer: List[Entry] = []
+        self._file = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self._path = os.path.join(directory, LEDGER_NAME)
+            end = self._recover()
+            self._file = open(self._path, "ab")
+            if self._file.tell() != end:
+                self._file.truncate(end)
+                self._file.seek(end)
+
+    def record(self, action: Action, before: State, after: State) -> None:
+        """Posts the chips moved by an action, given the states before and
+        after it."""
+        self.version += 1
+        if after.stacks is not before.stacks:
+            spent = _SPENT.get(action.type, EntryKind.BET)
+            for player_uuid, stack in after.stacks.items():
+                change = stack - before.stacks.get(player_uuid, 0)
+                if change < 0:
+                    destination = CASHIER if spent is EntryKind.CASH_OUT else POT
+                    self._post(Entry(
+                        self.version, spent, player_uuid, destination, -change))
+                elif change > 0:
+                    if action.type is TableActionType.BUY_IN:
+                        self._post(Entry(self.version, EntryKind.BUY_IN,
+                                         CASHIER, player_uuid, change))
+                    else:
+                        self._post(Entry(self.version, EntryKind.AWARD,
+                                         POT, player_uuid, change))
+        if (after.winners and not before.winners) or len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def balance(self, account: uuid.UUID) -> int:
+        return self.balances.get(account, 0)
+
+    def entries(self) -> Iterator[Entry]:
+        """Every entry written so far, oldest first."""
+        if self._file is None:
+            return
+        self.flush()
+        with open(self._path, "rb") as file:
+            data = file.read()
+        for _, _, entries in _batches(data):
+            for version, kind, source, destination, amount in entries:
+                yield Entry(version, EntryKind(kind), uuid.UUID(bytes=source),
+                            uuid.UUID(bytes=destination), amount)
+
+    def flush(self) -> None:
+        """Writes the buffered entries as one batch."""
+        if self._file is None:
+            self._buffer = []
+            return
+        if self.version == self._flushed:
+            return
+        entries = b"".join(
+            _ENTRY.pack(entry.version, entry.kind.value, entry.source.bytes,
+                        entry.destination.bytes, entry.amount)
+            for entry in self._buffer)
+        self._file.write(_BATCH.pack(
+            self.version, len(self._buffer), zlib.crc32(entries)) + entries)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._buffer = []
+        self._flushed = self.version
+
+    def close(self) -> None:
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+
+    def _post(self, entry: Entry) -> None:
+        self._buffer.append(entry)
+        balances = self.balances
+        balances[entry.source] = balances.get(entry.source, 0) - entry.amount
+        balances[entry.destination] = (
+            balances.get(entry.destination, 0) + entry.amount)
+
+    def _recover(self) -> int:
+        """Rebuilds the balances from every intact batch, returning where
+        the last one ends."""
+        if not os.path.exists(self._path):
+            return 0
+        with open(self._path, "rb") as file:
+            data = file.read()
+        end = 0
+        balances = self.balances
+        for end, self.version, entries in _batches(data):
+            for _, _, source, destination, amount in entries:
+                source = uuid.UUID(bytes=source)
+                destination = uuid.UUID(bytes=destination)
+                balances[source] = balances.get(source, 0) - amount
+                balances[destination] = balances.get(destination, 0) + amount
+        self._flushed = self.version
+        return end
+
+
+def _batches(data: bytes) -> Iterator[Tuple[int, int, Iterator[tuple]]]:
+    """Intact batches in data: where each ends, the actions it covers and
+    its unpacked entries."""
+    position = 0
+    while position + _BATCH.size <= len(data):
+        version, count, checksum = _BATCH.unpack_from(data, position)
+        start = position + _BATCH.size
+        entries = data[start:start + count * _ENTRY.size]
+        if len(entries) != count * _ENTRY.size or zlib.crc32(entries) != checksum:
+            return
+        position = start + len(entries)
+        yield position, version, _ENTRY.iter_unpack(entries)
+
+
+def reconcile(ledger: ChipLedger, state: State) -> Dict[uuid.UUID, Tuple[int, int]]:
+    """Accounts whose balance disagrees with the table's state, with their
+    (balance, expected) chips; empty when the books match. The pot holds
+    the chips of the hand under way, none once it's won."""
+    expected = dict(state.stacks)
+    expected[POT] = 0 if state.winners else state.pot
+    mismatches = {}
+    for account, chips in expected.items():
+        balance = ledger.balances.get(account, 0)
+        if balance != chips:
+            mismatches[account] = (balance, chips)
+    return mismatches
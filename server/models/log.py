@@ -0,0 +1,248 @@
+import glob
+import os
+import pickle
+import struct
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import uuid
+import zlib
+
+from .action import Action, ActionType
+from .blinds import Blinds
+from .game import GameActionType
+from .player import PlayerActionType
+from .state import State
+from .table import TableActionType
+
+DEFAULT_SNAPSHOT_INTERVAL = 100  # Actions between snapshots
+SNAPSHOTS_KEPT = 3
+LOG_NAME = "actions.log"
+SNAPSHOT_PATTERN = "snapshot-*.pickle"
+
+# Record header: payload length, CRC32 of the payload
+_RECORD = struct.Struct("<HI")
+# Snapshot header: version, log offset right after that version
+_SNAPSHOT = struct.Struct("<QQ")
+# Payload header: action type kind, action type value
+_TYPE = struct.Struct("<BB")
+_INT = struct.Struct("<q")
+_SEED = struct.Struct("<Q")
+_BLINDS = struct.Struct("<qq")
+_COUNT = struct.Struct("<B")
+_UUID_SIZE = 16
+
+_KINDS: List[type] = [GameActionType, PlayerActionType, TableActionType]
+
+
+def _pack_uuid(value: uuid.UUID) -> bytes:
+    return value.bytes
+
+
+def _unpack_uuid(data: bytes, offset: int) -> Tuple[uuid.UUID, int]:
+    return uuid.UUID(bytes=data[offset:offset + _UUID_SIZE]), offset + _UUID_SIZE
+
+
+def _packer(codec: struct.Struct) -> Callable[[int], bytes]:
+    return codec.pack
+
+
+def _unpacker(codec: struct.Struct):
+    def unpack(data: bytes, offset: int):
+        return codec.unpack_from(data, offset)[0], offset + codec.size
+    return unpack
+
+
+def _pack_blinds(blinds: Blinds) -> bytes:
+    return _BLINDS.pack(blinds.small, blinds.big)
+
+
+def _unpack_blinds(data: bytes, offset: int) -> Tuple[Blinds, int]:
+    return Blinds(*_BLINDS.unpack_from(data, offset)), offset + _BLINDS.size
+
+
+def _pack_uuids(values) -> bytes:
+    return _COUNT.pack(len(values)) + b"".join(value.bytes for value in values)
+
+
+def _unpack_uuids(data: bytes, offset: int) -> Tuple[List[uuid.UUID], int]:
+    count = data[offset]
+    offset += _COUNT.size
+    values = []
+    for _ in range(count):
+        value, offset = _unpack_uuid(data, offset)
+        values.append(value)
+    return values, offset
+
+
+def _pack_ints(values) -> bytes:
+    return _COUNT.pack(len(values)) + b"".join(_INT.pack(value) for value in values)
+
+
+def _unpack_ints(data: bytes, offset: int) -> Tuple[List[int], int]:
+    count = data[offset]
+    offset += _COUNT.size
+    values = list(struct.unpack_from(f"<{count}q", data, offset))
+    return values, offset + count * _INT.size
+
+
+# Action kwargs by tag: name, packer, unpacker. Tags are stored, so new
+# fields go at the end
+_FIELDS = [
+    ("player_uuid", _pack_uuid, _unpack_uuid),
+    ("amount", _packer(_INT), _unpacker(_INT)),
+    ("blinds", _pack_blinds, _unpack_blinds),
+    ("times", _packer(_INT), _unpacker(_INT)),
+    ("winners", _pack_uuids, _unpack_uuids),
+    ("seed", _packer(_SEED), _unpacker(_SEED)),
+    ("shares", _pack_ints, _unpack_ints),
+]
+_TAGS: Dict[str, int] = {name: tag for tag, (name, _, _) in enumerate(_FIELDS)}
+
+
+def encode_action(action: Action) -> bytes:
+    """Packs an action into a few bytes: its type, then each kwarg as a tag
+    byte and a fixed binary encoding (UUIDs take 16 bytes)."""
+    kind = _KINDS.index(type(action.type))
+    parts = [_TYPE.pack(kind, action.type.value)]
+    for name, value in vars(action).items():
+        if name == "type":
+            continue
+        tag = _TAGS.get(name)
+        if tag is None:
+            raise ValueError(f"Cannot encode action field {name!r}")
+        parts.append(bytes((tag,)))
+        parts.append(_FIELDS[tag][1](value))
+    return b"".join(parts)
+
+
+def decode_action(data: bytes) -> Action:
+    kind, value = _TYPE.unpack_from(data)
+    kwargs = {}
+    offset = _TYPE.size
+    while offset < len(data):
+        name, _, unpack = _FIELDS[data[offset]]
+        kwargs[name], offset = unpack(data, offset + 1)
+    action_type: ActionType = _KINDS[kind](value)
+    return Action(action_type, **kwargs)
+
+
+class ActionLog(object):
+    """Append-only log of the actions applied to one table, plus a pickled
+    state snapshot every `snapshot_interval` actions.
+
+    The version is the number of actions logged so far. A table is recovered
+    by loading the latest snapshot and re-applying only the actions after it.
+    """
+
+    directory: str
+    snapshot_interval: int
+    version: int
+
+    def __init__(self,
+            directory: str,
+            snapshot_interval: int = DEFAULT_SNAPSHOT_INTERVAL,
+            fsync: bool = False):
+        self.directory = directory
+        self.snapshot_interval = snapshot_interval
+        # Flushing survives a process crash, fsync also survives a power loss
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        self._path = os.path.join(directory, LOG_NAME)
+        self._snapshots = self._find_snapshots()
+        # Only the tail after the latest snapshot is read on startup
+        self._indexed_from, offset = (
+            self._snapshots[-1][:2] if self._snapshots else (0, 0))
+        # Byte offset of every record from version _indexed_from on
+        self._offsets: List[int] = []
+        end = self._scan(offset)
+        self.version = self._indexed_from + len(self._offsets)
+        self._file = open(self._path, "ab")
+        # Drops a record torn by a crash mid-write
+        if self._file.tell() != end:
+            self._file.truncate(end)
+            self._file.seek(end)
+
+    def append(self, action: Action, state: State) -> int:
+        """Logs an action along with the state it produced, snapshotting
+        that state when due. Returns the new version."""
+        payload = encode_action(action)
+        self._offsets.append(self._file.tell())
+        self._file.write(_RECORD.pack(len(payload), zlib.crc32(payload)))
+        self._file.write(payload)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.version += 1
+        if self.version % self.snapshot_interval == 0:
+            self._snapshot(state)
+        return self.version
+
+    def actions(self, from_version: int = 0) -> Iterator[Action]:
+        """Logged actions after from_version, in order."""
+        if from_version < self._indexed_from:
+            # Audits of old versions index the whole log once
+            self._indexed_from, self._offsets = 0, []
+            self._scan(0)
+        with open(self._path, "rb") as file:
+            for offset in self._offsets[from_version - self._indexed_from:]:
+                file.seek(offset)
+                length, _ = _RECORD.unpack(file.read(_RECORD.size))
+                yield decode_action(file.read(length))
+
+    def _snapshot(self, state: State) -> None:
+        version = self.version
+        path = os.path.join(self.directory, f"snapshot-{version:010d}.pickle")
+        temporary_path = path + ".tmp"
+        offset = self._file.tell()
+        with open(temporary_path, "wb") as file:
+            file.write(_SNAPSHOT.pack(version, offset))
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            if self.fsync:
+                os.fsync(file.fileno())
+        # Readers only ever see complete snapshots
+        os.replace(temporary_path, path)
+        self._snapshots.append((version, offset, path))
+        for _, _, old_path in self._snapshots[:-SNAPSHOTS_KEPT]:
+            os.remove(old_path)
+        del self._snapshots[:-SNAPSHOTS_KEPT]
+
+    def latest_snapshot(self, at_most: Optional[int] = None) -> Tuple[int, State]:
+        """The newest snapshot at or before version at_most, falling back to
+        a new table at version 0."""
+        for version, _, path in reversed(self._snapshots):
+            if at_most is None or version <= at_most:
+                with open(path, "rb") as file:
+                    file.seek(_SNAPSHOT.size)
+                    return version, pickle.load(file)
+        return 0, State()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def _find_snapshots(self) -> List[Tuple[int, int, str]]:
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, SNAPSHOT_PATTERN)):
+            with open(path, "rb") as file:
+                version, offset = _SNAPSHOT.unpack(file.read(_SNAPSHOT.size))
+            snapshots.append((version, offset, path))
+        return sorted(snapshots)
+
+    def _scan(self, offset: int) -> int:
+        """Indexes every intact record from offset on, returning where the
+        last one ends."""
+        if not os.path.exists(self._path):
+            return 0
+        with open(self._path, "rb") as file:
+            file.seek(offset)
+            data = file.read()
+        start = offset
+        position = 0
+        while position + _RECORD.size <= len(data):
+            length, checksum = _RECORD.unpack_from(data, position)
+            payload = data[position + _RECORD.size:
+                           position + _RECORD.size + length]
+            if len(payload) != length or zlib.crc32(payload) != checksum:
+                break
+            self._offsets.append(start + position)
+            position += _RECORD.size + length
+        return start + position
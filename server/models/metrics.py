@@ -0,0 +1,239 @@
+import bisect
+import functools
+import threading
+import time
+import types
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds, from a cached state read to a slow showdown
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+# Sample name, labels, value
+Sample = Tuple[str, Tuple[Tuple[str, str], ...], float]
+# Name, type, help, samples: what a registry collects, picklable so worker
+# processes can send theirs over
+Family = Tuple[str, str, str, List[Sample]]
+
+
+class Counter(object):
+    """Counts per label value. Every value is given up front, so counting
+    is an index lookup and an increment (under a lock, as actions of
+    different tables count at once)."""
+
+    def __init__(self, name: str, help: str,
+            label: Optional[str] = None,
+            values: Iterable[Any] = (None,)):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._values = list(values)
+        self._index = {value: index for index, value in enumerate(self._values)}
+        self._counts = [0] * len(self._values)
+        self._lock = threading.Lock()
+
+    def inc(self, value: Any = None, amount: int = 1) -> None:
+        index = self._index[value]
+        with self._lock:
+            self._counts[index] += amount
+
+    def collect(self) -> Family:
+        with self._lock:
+            counts = self._counts[:]
+        samples = [(self.name, _labels(self.label, value), count)
+                   for value, count in zip(self._values, counts)]
+        return self.name, "counter", self.help, samples
+
+
+class Gauge(object):
+    """A value read from a function whenever metrics are collected."""
+
+    def __init__(self, name: str, help: str, function: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.function = function
+
+    def collect(self) -> Family:
+        return self.name, "gauge", self.help, [(self.name, (), self.function())]
+
+
+class _Buckets(object):
+    """Observations of one label value: a count per bucket (not cumulative,
+    so observing touches one slot) and their sum."""
+
+    __slots__ = ("bounds", "counts", "sum", "lock")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(object):
+    """Distribution of values per label value, in fixed buckets allocated
+    when the label value is first seen (see child)."""
+
+    def __init__(self, name: str, help: str,
+            label: Optional[str] = None,
+            buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._children: Dict[Any, _Buckets] = {}
+        self._lock = threading.Lock()
+
+    def child(self, value: Any = None) -> _Buckets:
+        """The buckets of a label value; hot paths keep this and call its
+        observe directly."""
+        child = self._children.get(value)
+        if child is None:
+            with self._lock:
+                child = self._children.get(value)
+                if child is None:
+                    child = self._children[value] = _Buckets(self.buckets)
+        return child
+
+    def observe(self, value: float, label_value: Any = None) -> None:
+        self.child(label_value).observe(value)
+
+    def collect(self) -> Family:
+        samples: List[Sample] = []
+        bounds = [_format(bound) for bound in self.buckets] + ["+Inf"]
+        with self._lock:
+            children = list(self._children.items())
+        for value, child in children:
+            with child.lock:
+                counts, child_sum = child.counts[:], child.sum
+            labels = _labels(self.label, value)
+            total = 0
+            for bound, count in zip(bounds, counts):
+                total += count
+                samples.append((f"{self.name}_bucket",
+                                labels + (("le", bound),), total))
+            if total == 0:
+                # Never observed: left out rather than a screen of zeros
+                del samples[-len(bounds):]
+                continue
+            samples.append((f"{self.name}_sum", labels, child_sum))
+            samples.append((f"{self.name}_count", labels, total))
+        return self.name, "histogram", self.help, samples
+
+
+class Registry(object):
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def register(self, metric):
+        """Adds a metric (replacing any of the same name) and returns it."""
+        self._metrics[metric.name] = metric
+        return metric
+
+    def collect(self) -> List[Family]:
+        return [metric.collect() for metric in self._metrics.values()]
+
+
+def render(collections: Iterable[List[Family]]) -> str:
+    """Prometheus text format of the collections of one or more registries
+    (e.g. one per worker process), adding up samples they share."""
+    families: Dict[str, Tuple[str, str, Dict[Tuple[str, tuple], float]]] = {}
+    for families_of_one in collections:
+        for name, type, help, samples in families_of_one:
+            _, _, values = families.setdefault(name, (type, help, {}))
+            for sample_name, labels, value in samples:
+                key = (sample_name, labels)
+                values[key] = values.get(key, 0) + value
+    lines = []
+    for name, (type, help, values) in families.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {type}")
+        for (sample_name, labels), value in values.items():
+            if labels:
+                text = ",".join(f'{label}="{_escape(label_value)}"'
+                                for label, label_value in labels)
+                sample_name = f"{sample_name}{{{text}}}"
+            lines.append(f"{sample_name} {_format(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def timed(histogram: Histogram, label_value: Any, func: Callable) -> Callable:
+    """Wraps func to observe how long each call takes. Generators it
+    returns (e.g. Poker.replay) do their work as they're iterated, so that
+    is timed too, observed once they're exhausted or closed."""
+    observe = histogram.child(label_value).observe
+    clock = time.perf_counter
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = clock()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException:
+            observe(clock() - start)
+            raise
+        elapsed = clock() - start
+        if isinstance(result, types.GeneratorType):
+            return _timed_iteration(result, observe, elapsed)
+        observe(elapsed)
+        return result
+    return wrapper
+
+
+def _timed_iteration(generator,
+        observe: Callable[[float], None],
+        elapsed: float):
+    """Yields from generator, adding up the time spent in it, but not in
+    the consumer between items."""
+    clock = time.perf_counter
+    try:
+        while True:
+            start = clock()
+            try:
+                item = next(generator)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                elapsed += clock() - start
+            yield item
+    finally:
+        generator.close()
+        observe(elapsed)
+
+
+def instrument(cls: type, names: Iterable[str], histogram: Histogram) -> None:
+    """Times the methods of cls, labelled by method name."""
+    for name in names:
+        setattr(cls, name, timed(histogram, name, getattr(cls, name)))
+
+
+def _labels(label: Optional[str], value: Any) -> Tuple[Tuple[str, str], ...]:
+    """Label pairs of a sample; enums (e.g. action types) go by name."""
+    return () if label is None else ((label, str(getattr(value, "name", value))),)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format(value: float) -> str:
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+REGISTRY = Registry()
+# Shared by the Flask and ASGI servers
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "http_request_seconds", "Time to handle a request, by endpoint",
+    "endpoint"))
@@ -1,3 +1,4 @@
+from typing import Any, Callable, Dict, FrozenSet, Optional
 import uuid
 
 from .action import Action, ActionType
@@ -16,14 +17,6 @@ class PlayerActionType(ActionType):
     CALL = 3, "Call"
     RAISE = 4, "Raise"
 
-    @staticmethod
-    def is_valid_action(max_type, type) -> bool:
-        if type is PlayerActionType.FOLD:
-            return True
-        elif type in (PlayerActionType.CHECK, PlayerActionType.BET):
-            return max_type < PlayerActionType.BET
-        return max_type > PlayerActionType.CHECK
-
     def __lt__(self, other):
         return self.value < other.value
 
@@ -31,28 +24,117 @@ class PlayerActionType(ActionType):
         return self.value > other.value
 
 
+class IllegalAction(ValueError):
+    pass
+
+
+class LegalActions(object):
+    """What a player may do in a state. Amounts are chips put in by the
+    action itself, as passed to Poker.bet, call and raise_bet."""
+
+    player_uuid: Optional[uuid.UUID]
+    types: FrozenSet[PlayerActionType]
+    to_call: int  # Chips to call, capped to the stack
+    min_amount: int  # Smallest bet or raise (including the call), or all-in
+    max_amount: int  # Largest bet or raise: the whole stack
+
+    def __init__(self,
+            player_uuid: Optional[uuid.UUID],
+            types: FrozenSet[PlayerActionType] = frozenset(),
+            to_call: int = 0,
+            min_amount: int = 0,
+            max_amount: int = 0):
+        self.player_uuid = player_uuid
+        self.types = types
+        self.to_call = to_call
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+
+    @staticmethod
+    def to_dict(legal) -> Dict[str, Any]:
+        return {
+            "player_uuid": None if legal.player_uuid is None else str(legal.player_uuid),
+            "types": sorted(str(type) for type in legal.types),
+            "to_call": legal.to_call,
+            "min_amount": legal.min_amount,
+            "max_amount": legal.max_amount,
+        }
+
+
+def legal_actions(state: State,
+        player_uuid: Optional[uuid.UUID] = None) -> LegalActions:
+    """Actions player_uuid (by default the player to act) may take. Players
+    may fold whenever they're in the hand, everything else waits for their
+    turn. See Poker.legal_actions for a cached version."""
+    if player_uuid is None:
+        if not state.in_play:
+            return LegalActions(None)
+        player_uuid = state.in_play[state.to_act % len(state.in_play)]
+    # No hand under way: nothing dealt yet, or already won
+    if (state.winners or len(state.in_play) < 2 or not state.holes
+            or player_uuid not in state.in_play):
+        return LegalActions(player_uuid)
+    fold = frozenset((PlayerActionType.FOLD,))
+    stack = state.stacks[player_uuid]
+    if (player_uuid != state.in_play[state.to_act % len(state.in_play)]
+            or stack == 0):
+        return LegalActions(player_uuid, fold)
+
+    bets = state.bets
+    max_bet = max(bets.values(), default=0)
+    to_call = min(max_bet - bets.get(player_uuid, 0), stack)
+    # The last raise, as the gap between the two highest bets; players
+    # calling it in between don't change either
+    below = max((bet for bet in bets.values() if bet < max_bet), default=0)
+    min_raise = max(max_bet - below, state.blinds.big)
+    types = set(fold)
+    if to_call == 0:
+        types.add(PlayerActionType.CHECK)
+    else:
+        types.add(PlayerActionType.CALL)
+    if stack > to_call:
+        types.add(PlayerActionType.RAISE if max_bet else PlayerActionType.BET)
+    return LegalActions(player_uuid, frozenset(types), to_call,
+                        min(to_call + min_raise, stack), stack)
+
+
+def validate(state: State,
+        action: Action,
+        legal: Optional[LegalActions] = None) -> None:
+    """Raises IllegalAction unless the action is legal in state, given the
+    acting player's legal actions there if already known."""
+    if legal is None:
+        legal = legal_actions(state, action.player_uuid)
+    if action.type not in legal.types:
+        raise IllegalAction(f"{action.type} is not allowed for player "
+                            f"{action.player_uuid}")
+    amount = getattr(action, "amount", None)
+    if action.type is PlayerActionType.CALL and amount != legal.to_call:
+        raise IllegalAction(f"Calling takes {legal.to_call}, not {amount}")
+    if (action.type in (PlayerActionType.BET, PlayerActionType.RAISE)
+            and not legal.min_amount <= amount <= legal.max_amount):
+        raise IllegalAction(f"{action.type} must be between "
+                            f"{legal.min_amount} and {legal.max_amount}")
+
+
 def next(state: State, action: Action) -> State:
-    if action.type is PlayerActionType.FOLD:
-        return fold(state, action.player_uuid)
-    if action.type is PlayerActionType.CHECK:
-        return check(state, action.player_uuid)
-    if action.type is PlayerActionType.BET:
-        return bet(state, action.player_uuid, action.amount)
-    if action.type is PlayerActionType.CALL:
-        return call(state, action.player_uuid, action.amount)
-    if action.type is PlayerActionType.RAISE:
-        return raise_bet(state, action.player_uuid, action.amount)
+    return REDUCERS[action.type](state, action)
 
 
 def fold(state: State, player_uuid: uuid.UUID) -> State:
-    holes = state.holes
-    holes.pop(player_uuid)
-    in_play = state.in_play
-    in_play.remove(player_uuid)
+    holes = state.holes.remove(player_uuid)
+    index = state.in_play.index(player_uuid)
+    in_play = state.in_play[:index] + state.in_play[index + 1:]
     changes = {
         "holes": holes,
         "in_play": in_play,
     }
+    if len(in_play) > 1:
+        # The players after the folder move up a seat
+        to_act = state.to_act - (index < state.to_act)
+        if index == state.to_act:
+            to_act = game.next_to_act(in_play, state.stacks, index)
+        changes["to_act"] = to_act
     new_state = State.new_state(state, changes=changes)
     if len(in_play) == 1:
         # Last fold -> end game
@@ -61,17 +143,15 @@ def fold(state: State, player_uuid: uuid.UUID) -> State:
 
 
 def check(state: State, player_uuid: uuid.UUID) -> State:
-    to_act = (state.to_act + 1) % len(state.in_play)
+    to_act = game.next_to_act(state.in_play, state.stacks, state.to_act + 1)
     return State.new_state(state, changes={"to_act": to_act})
 
 
 def bet(state: State, player_uuid: uuid.UUID, amount: int) -> State:
-    bets = state.bets
-    bets[player_uuid] = amount
+    bets = state.bets.set(player_uuid, amount)
     pot = state.pot + amount
-    stacks = state.stacks
-    stacks[player_uuid] -= amount
-    to_act = (state.to_act + 1) % len(state.in_play)
+    stacks = state.stacks.set(player_uuid, state.stacks[player_uuid] - amount)
+    to_act = game.next_to_act(state.in_play, stacks, state.to_act + 1)
     changes = {
         "bets": bets,
         "pot": pot,
@@ -82,13 +162,10 @@ def bet(state: State, player_uuid: uuid.UUID, amount: int) -> State:
 
 
 def call(state: State, player_uuid: uuid.UUID, amount: int) -> State:
-    bets = state.bets
-    bets[player_uuid] = bets.setdefault(player_uuid, 0)
-    bets[player_uuid] += amount
+    bets = state.bets.set(player_uuid, state.bets.get(player_uuid, 0) + amount)
     pot = state.pot + amount
-    stacks = state.stacks
-    stacks[player_uuid] -= amount
-    to_act = (state.to_act + 1) % len(state.in_play)
+    stacks = state.stacks.set(player_uuid, state.stacks[player_uuid] - amount)
+    to_act = game.next_to_act(state.in_play, stacks, state.to_act + 1)
     changes = {
         "bets": bets,
         "pot": pot,
@@ -99,13 +176,10 @@ def call(state: State, player_uuid: uuid.UUID, amount: int) -> State:
 
 
 def raise_bet(state: State, player_uuid: uuid.UUID, amount: int) -> State:
-    bets = state.bets
-    bets[player_uuid] = bets.setdefault(player_uuid, 0)
-    bets[player_uuid] += amount
+    bets = state.bets.set(player_uuid, state.bets.get(player_uuid, 0) + amount)
     pot = state.pot + amount
-    stacks = state.stacks
-    stacks[player_uuid] -= amount
-    to_act = (state.to_act + 1) % len(state.in_play)
+    stacks = state.stacks.set(player_uuid, state.stacks[player_uuid] - amount)
+    to_act = game.next_to_act(state.in_play, stacks, state.to_act + 1)
     changes = {
         "bets": bets,
         "pot": pot,
@@ -113,3 +187,17 @@ def raise_bet(state: State, player_uuid: uuid.UUID, amount: int) -> State:
         "to_act": to_act,
     }
     return State.new_state(state, changes=changes)
+
+
+REDUCERS: Dict[PlayerActionType, Callable[[State, Action], State]] = {
+    PlayerActionType.FOLD: lambda state, action: fold(
+        state, action.player_uuid),
+    PlayerActionType.CHECK: lambda state, action: check(
+        state, action.player_uuid),
+    PlayerActionType.BET: lambda state, action: bet(
+        state, action.player_uuid, action.amount),
+    PlayerActionType.CALL: lambda state, action: call(
+        state, action.player_uuid, action.amount),
+    PlayerActionType.RAISE: lambda state, action: raise_bet(
+        state, action.player_uuid, action.amount),
+}
@@ -1,112 +1,271 @@
-from typing import Dict, List
+import random
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 import uuid
 
 from . import game
+from . import metrics
 from . import player
 from . import table
-from .action import Action
+from . import tracing
+from .action import Action, ActionType
 from .blinds import Blinds
+from .equity import Equity
+from .hand import Hand
+from .history import HandHistory
+from .ledger import ChipLedger, reconcile
+from .log import ActionLog
 from .state import State
+from .store import TableStore
+# The hook registry, re-exported for tracing the engine
+from .tracing import Hook, Span, add_hook, remove_hook
 
 
 class Poker(object):
 
     state: State
+    log: Optional[ActionLog]
+    history: Optional[HandHistory]
+    table_id: Optional[str]
+    store: Optional[TableStore]
+    ledger: Optional[ChipLedger]
 
-    def __init__(self):
-        self.state = State()
+    def __init__(self,
+            log: Optional[ActionLog] = None,
+            history: Optional[HandHistory] = None,
+            table_id: Optional[str] = None,
+            store: Optional[TableStore] = None,
+            ledger: Optional[ChipLedger] = None):
+        """Recovers the table from log, if given, and logs every action
+        applied from then on. Completed hands are stored in history.
+        table_id labels traces and, with a store, keys the table's saved
+        state, which it is loaded from when there's no log. Chips moved are
+        posted to ledger, which first catches up on logged actions it
+        missed."""
+        self.log = log
+        self.history = history
+        self.table_id = table_id
+        self.store = store
+        self.ledger = ledger
+        # Legal actions in one state (by version), by player
+        self._legal: Tuple[int, Dict[Optional[uuid.UUID], player.LegalActions]] = (
+            -1, {})
+        if log is not None:
+            self.state = recover(log)
+            if ledger is not None and ledger.version < log.version:
+                post_logged(ledger, log)
+        else:
+            saved = None if store is None else store.load(table_id)
+            self.state = State() if saved is None else saved
+
+    def _apply(self, action: Action) -> None:
+        ACTIONS.inc(action.type)
+        if isinstance(action.type, player.PlayerActionType):
+            player.validate(self.state, action,
+                            self._legal_actions(self.state, action.player_uuid))
+        before = self.state
+        self.state = next(before, action, self.table_id)
+        if self.log is not None:
+            self.log.append(action, self.state)
+        if self.history is not None:
+            self.history.record(action, self.state)
+        if self.store is not None:
+            self.store.save(self.table_id, self.state)
+        if self.ledger is not None:
+            self.ledger.record(action, before, self.state)
+
+    def replay(self, from_version: int = 0) -> Iterator[Tuple[int, Action, State]]:
+        return replay(self.log, from_version)
 
     def add_player(self, name: str) -> uuid.UUID:
         player_uuid = uuid.uuid4()
-        self.state = next(
-            self.state,
+        self._apply(
             Action(table.TableActionType.ADD_PLAYER, player_uuid=player_uuid))
         return player_uuid
 
     def buy_in(self, player_uuid: uuid.UUID, amount: int) -> None:
-        self.state = next(
-            self.state,
+        self._apply(
             Action(table.TableActionType.BUY_IN,
                    player_uuid=player_uuid,
                    amount=amount))
 
     def cash_out(self, player_uuid: uuid.UUID) -> int:
         amount = self.state.stacks[player_uuid]
-        self.state = next(
-            self.state,
+        self._apply(
             Action(table.TableActionType.CASH_OUT, player_uuid=player_uuid))
         return amount
 
     def fold(self, player_uuid: uuid.UUID) -> None:
-        self.state = next(
-            self.state,
+        self._apply(
             Action(player.PlayerActionType.FOLD, player_uuid=player_uuid))
 
     def check(self, player_uuid: uuid.UUID) -> None:
-        self.state = next(
-            self.state,
+        self._apply(
             Action(player.PlayerActionType.CHECK, player_uuid=player_uuid))
 
     def bet(self, player_uuid: uuid.UUID, amount: int) -> None:
-        self.state = next(
-            self.state,
+        self._apply(
             Action(player.PlayerActionType.BET,
                    player_uuid=player_uuid,
                    amount=amount))
 
     def call(self, player_uuid: uuid.UUID, amount: int) -> None:
-        self.state = next(
-            self.state,
+        self._apply(
             Action(player.PlayerActionType.CALL,
                    player_uuid=player_uuid,
                    amount=amount))
 
     def raise_bet(self, player_uuid: uuid.UUID, amount: int) -> None:
-        self.state = next(
-            self.state,
+        self._apply(
             Action(player.PlayerActionType.RAISE,
                    player_uuid=player_uuid,
                    amount=amount))
 
-    def start_game(self, blinds: Blinds = Blinds(5, 10)) -> None:
-        self.state = next(
-            self.state, Action(game.GameActionType.START_GAME, blinds=blinds))
+    def start_game(self,
+            blinds: Blinds = Blinds(5, 10),
+            seed: Optional[int] = None) -> None:
+        if seed is None:
+            seed = random.getrandbits(64)
+        self._apply(Action(game.GameActionType.START_GAME,
+                           blinds=blinds,
+                           seed=seed))
 
     def deal(self) -> None:
-        self.state = next(
-            self.state, Action(game.GameActionType.DEAL))
+        self._apply(Action(game.GameActionType.DEAL))
 
     def end_round(self) -> None:
-        self.state = next(
-            self.state, Action(game.GameActionType.END_ROUND))
+        self._apply(Action(game.GameActionType.END_ROUND))
 
     def flop(self) -> None:
-        self.state = next(
-            self.state, Action(game.GameActionType.FLOP))
+        self._apply(Action(game.GameActionType.FLOP))
 
     def turn(self) -> None:
-        self.state = next(
-            self.state, Action(game.GameActionType.TURN))
+        self._apply(Action(game.GameActionType.TURN))
 
     def river(self) -> None:
-        self.state = next(
-            self.state, Action(game.GameActionType.RIVER))
+        self._apply(Action(game.GameActionType.RIVER))
 
     def showdown(self) -> List[uuid.UUID]:
-        self.state = next(
-            self.state, Action(game.GameActionType.SHOWDOWN))
+        self._apply(Action(game.GameActionType.SHOWDOWN))
+        return self.state.winners
+
+    def hands(self) -> Dict[uuid.UUID, Hand]:
+        return game.hands(self.state)
+
+    def equities(self) -> Dict[uuid.UUID, Equity]:
+        return game.equities(self.state)
+
+    def run_it(self, times: int = 2) -> List[uuid.UUID]:
+        self._apply(Action(game.GameActionType.RUN_IT, times=times))
         return self.state.winners
 
-    def end_game(self) -> List[uuid.UUID]:
-        self.state = next(
-            self.state, Action(game.GameActionType.END))
+    def settle_equity(self,
+            shares: Optional[Sequence[int]] = None) -> List[uuid.UUID]:
+        """Pays out the pot by equity. Shares are worked out from the
+        current state unless given, e.g. computed off the table's thread
+        with game.settle_shares; either way the action logs them, so
+        replaying it is cheap."""
+        if shares is None:
+            shares = game.settle_shares(self.state)
+        self._apply(Action(game.GameActionType.SETTLE_EQUITY, shares=list(shares)))
         return self.state.winners
 
+    def end_game(self, winners: Sequence[uuid.UUID]) -> List[uuid.UUID]:
+        """Awards the pot to winners decided outside the engine."""
+        self._apply(Action(game.GameActionType.END_GAME, winners=list(winners)))
+        return self.state.winners
+
+    def reconcile(self) -> Dict[uuid.UUID, Tuple[int, int]]:
+        """Accounts whose ledger balance disagrees with the state, see
+        ledger.reconcile; none without a ledger."""
+        if self.ledger is None:
+            return {}
+        return reconcile(self.ledger, self.state)
+
+    def legal_actions(self,
+            player_uuid: Optional[uuid.UUID] = None,
+            state: Optional[State] = None) -> player.LegalActions:
+        """See player.legal_actions, in state if given (e.g. a snapshot of
+        the latest state taken off the table's thread). Cached for one
+        state only, the latest one, which bots, clients and validation all
+        ask about."""
+        return self._legal_actions(state or self.state, player_uuid)
+
+    def _legal_actions(self,
+            state: State,
+            player_uuid: Optional[uuid.UUID]) -> player.LegalActions:
+        version, cache = self._legal
+        if version != state.version:
+            # Swapped out whole, so readers of an older state can't mix
+            # their answers in
+            cache = {}
+            self._legal = (state.version, cache)
+        legal = cache.get(player_uuid)
+        if legal is None:
+            legal = cache[player_uuid] = player.legal_actions(state, player_uuid)
+        return legal
+
+
+METHOD_SECONDS = metrics.REGISTRY.register(metrics.Histogram(
+    "poker_method_seconds", "Time spent in each Poker method", "method"))
+metrics.instrument(
+    Poker,
+    [name for name, value in vars(Poker).items()
+     if callable(value) and not name.startswith("_")],
+    METHOD_SECONDS)
+
+
+# Reducer of every action type
+REDUCERS: Dict[ActionType, Callable[[State, Action], State]] = {
+    **game.REDUCERS,
+    **player.REDUCERS,
+    **table.REDUCERS,
+}
+
+
+ACTIONS = metrics.REGISTRY.register(metrics.Counter(
+    "poker_actions_total", "Actions applied, by type", "type", REDUCERS))
+
+
+def next(state: State,
+        action: Action,
+        table_id: Optional[str] = None) -> State:
+    if not tracing.hooks:
+        return REDUCERS[action.type](state, action)
+    with tracing.span("next", type=action.type.name, table_id=table_id,
+                      version=state.version):
+        return REDUCERS[action.type](state, action)
+
+
+def recover(log: ActionLog) -> State:
+    """Latest state of a logged table: its newest snapshot with the actions
+    logged after it re-applied."""
+    version, state = log.latest_snapshot()
+    for action in log.actions(version):
+        state = next(state, action)
+    return state
+
+
+def post_logged(ledger: ChipLedger, log: ActionLog) -> None:
+    """Posts to ledger the logged actions after the ones it has recorded,
+    e.g. those still buffered when the process died."""
+    version, state = log.latest_snapshot(at_most=ledger.version)
+    for action in log.actions(version):
+        after = next(state, action)
+        version += 1
+        if version > ledger.version:
+            ledger.record(action, state, after)
+        state = after
+    ledger.flush()
+
 
-def next(state: State, action: Action) -> State:
-    if isinstance(action.type, game.GameActionType):
-        return game.next(state, action)
-    if isinstance(action.type, player.PlayerActionType):
-        return player.next(state, action)
-    if isinstance(action.type, table.TableActionType):
-        return table.next(state, action)
+def replay(log: ActionLog,
+        from_version: int = 0) -> Iterator[Tuple[int, Action, State]]:
+    """Re-applies logged actions, e.g. for audits, yielding each version
+    after from_version with the action that produced it and the resulting
+    state. Starts from the newest snapshot at or before from_version."""
+    version, state = log.latest_snapshot(at_most=from_version)
+    for action in log.actions(version):
+        state = next(state, action)
+        version += 1
+        if version > from_version:
+            yield version, action, state
@@ -0,0 +1,256 @@
+import argparse
+from array import array
+import os
+import struct
+import sys
+from typing import List, Optional, Sequence, Tuple
+
+from .card import Card, CardSuit, CardValue
+from .equity import Equity
+
+NUM_CLASSES = 169  # Distinct starting hands: 13 pairs, 78 suited, 78 offsuit
+NUM_RANKS = 13
+MAX_OPPONENTS = 9
+DEFAULT_SAMPLES = 4000  # Runouts per table entry when generating
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "data", "preflop.bin")
+
+# Header: magic, format version, samples per entry
+_HEADER = struct.Struct("<4sHI")
+_MAGIC = b"PFEQ"
+_VERSION = 1
+_SCALE = 10000  # Equities are stored as basis points in uint16s
+
+# Ranks in the order of the 13x13 starting hand grid (A first)
+_GRID_RANKS: List[CardValue] = sorted(CardValue, reverse=True)
+_RANK_CHARS = {value: ("T" if value is CardValue.TEN else value.display)
+               for value in CardValue}
+
+
+def hand_class(hole: Sequence[Card]) -> int:
+    """Index of the canonical starting hand of two hole cards.
+
+    Classes form the usual 13x13 grid with aces first: pairs on the
+    diagonal, suited hands above it and offsuit hands below it.
+    """
+    first, second = hole
+    high, low = (first, second) if first.rank >= second.rank else (second, first)
+    row, column = 14 - high.rank, 14 - low.rank
+    if high.suit_index == low.suit_index:
+        return row * NUM_RANKS + column
+    return column * NUM_RANKS + row
+
+
+def class_name(index: int) -> str:
+    row, column = divmod(index, NUM_RANKS)
+    if row == column:
+        return _RANK_CHARS[_GRID_RANKS[row]] * 2
+    high, low = sorted((row, column))
+    suffix = "s" if row < column else "o"
+    return (_RANK_CHARS[_GRID_RANKS[high]]
+            + _RANK_CHARS[_GRID_RANKS[low]] + suffix)
+
+
+CLASS_NAMES: Tuple[str, ...] = tuple(
+    class_name(index) for index in range(NUM_CLASSES))
+_CLASS_INDICES = {name: index for index, name in enumerate(CLASS_NAMES)}
+
+
+def class_index(name: str) -> int:
+    """Index of a canonical starting hand name such as "AKs", "72o" or "TT"."""
+    return _CLASS_INDICES[name]
+
+
+def class_combos(index: int) -> List[Tuple[Card, Card]]:
+    """Every concrete pair of hole cards in a starting hand class."""
+    row, column = divmod(index, NUM_RANKS)
+    high = _GRID_RANKS[min(row, column)]
+    low = _GRID_RANKS[max(row, column)]
+    suits = list(CardSuit)
+    if row == column:
+        return [(Card(high, first), Card(low, second))
+                for i, first in enumerate(suits) for second in suits[i + 1:]]
+    if row < column:
+        return [(Card(high, suit), Card(low, suit)) for suit in suits]
+    return [(Card(high, first), Card(low, second))
+            for first in suits for second in suits if first is not second]
+
+
+class PreflopTable(object):
+
+    samples: int
+    heads_up: List[List[float]]  # [hero class][villain class] -> hero equity
+    vs_random: List[List[float]]  # [class][opponents - 1] -> equity
+
+    def __init__(self,
+            samples: int,
+            heads_up: List[List[float]],
+            vs_random: List[List[float]]):
+        self.samples = samples
+        self.heads_up = heads_up
+        self.vs_random = vs_random
+
+    def equity(self, hole: Sequence[Card], other: Sequence[Card]) -> float:
+        """Heads-up preflop equity of hole against other."""
+        return self.heads_up[hand_class(hole)][hand_class(other)]
+
+    def equity_vs_random(self, hole: Sequence[Card], opponents: int = 1) -> float:
+        """Equity of hole against `opponents` unknown hands."""
+        return self.vs_random[hand_class(hole)][opponents - 1]
+
+    def multiway(self, holes: Sequence[Sequence[Card]]) -> List[float]:
+        """Approximates multiway equity: each hand's equity against as many
+        random hands, scaled by how much better it does against the actual
+        hands than against a random one (geometric mean over opponents),
+        then normalized to sum to one."""
+        classes = [hand_class(hole) for hole in holes]
+        opponents = len(classes) - 1
+        weights = []
+        for index, hero in enumerate(classes):
+            vs_one = self.vs_random[hero][0]
+            scale = 1.0
+            for other_index, villain in enumerate(classes):
+                if other_index != index:
+                    scale *= self.heads_up[hero][villain] / vs_one
+            weights.append(self.vs_random[hero][opponents - 1]
+                           * scale ** (1.0 / opponents))
+        total = sum(weights)
+        return [weight / total for weight in weights]
+
+    @staticmethod
+    def load(path: str = DEFAULT_PATH):
+        with open(path, "rb") as file:
+            magic, version, samples = _HEADER.unpack(file.read(_HEADER.size))
+            if magic != _MAGIC or version != _VERSION:
+                raise ValueError(f"{path} is not a preflop equity table")
+            values = array("H")
+            values.frombytes(file.read())
+        if sys.byteorder == "big":
+            values.byteswap()
+
+        heads_up = [[0.5] * NUM_CLASSES for _ in range(NUM_CLASSES)]
+        position = 0
+        for hero in range(NUM_CLASSES):
+            for villain in range(hero + 1, NUM_CLASSES):
+                equity = values[position] / _SCALE
+                heads_up[hero][villain] = equity
+                heads_up[villain][hero] = 1.0 - equity
+                position += 1
+        vs_random = [
+            [value / _SCALE for value in
+             values[position + hero * MAX_OPPONENTS:
+                    position + (hero + 1) * MAX_OPPONENTS]]
+            for hero in range(NUM_CLASSES)]
+        return PreflopTable(samples, heads_up, vs_random)
+
+    @staticmethod
+    def save(table, path: str = DEFAULT_PATH) -> None:
+        values = array("H")
+        for hero in range(NUM_CLASSES):
+            for villain in range(hero + 1, NUM_CLASSES):
+                values.append(round(table.heads_up[hero][villain] * _SCALE))
+        for row in table.vs_random:
+            values.extend(round(equity * _SCALE) for equity in row)
+        if sys.byteorder == "big":
+            values.byteswap()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(_HEADER.pack(_MAGIC, _VERSION, table.samples))
+            file.write(values.tobytes())
+
+
+_table: Optional[PreflopTable] = None
+
+
+def table() -> PreflopTable:
+    """The shipped table, loaded once on first use."""
+    global _table
+    if _table is None:
+        _table = PreflopTable.load()
+    return _table
+
+
+def equities(holes: Sequence[Sequence[Card]]) -> List[Equity]:
+    """Preflop equity of each hole from the shipped table. The table only
+    keeps pot shares, so ties are folded into win."""
+    preflop = table()
+    if len(holes) == 2:
+        first = preflop.equity(holes[0], holes[1])
+        shares = [first, 1.0 - first]
+    else:
+        shares = preflop.multiway(holes)
+    return [Equity(share, 0.0, share, 0.0, preflop.samples)
+            for share in shares]
+
+
+def generate(samples: int = DEFAULT_SAMPLES,
+        seed: Optional[int] = None) -> PreflopTable:
+    """Estimates every table entry from `samples` random runouts."""
+    # Only generating needs numpy, so the engine imports without it
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    combos = [np.array([[card.code for card in combo]
+                        for combo in class_combos(index)])
+              for index in range(NUM_CLASSES)]
+
+    heads_up = [[0.5] * NUM_CLASSES for _ in range(NUM_CLASSES)]
+    for hero in range(NUM_CLASSES):
+        for villain in range(hero + 1, NUM_CLASSES):
+            holes = _deal_holes(rng, [combos[hero], combos[villain]], samples)
+            shares = _shares(rng, holes)
+            heads_up[hero][villain] = float(shares[0].mean())
+            heads_up[villain][hero] = 1.0 - heads_up[hero][villain]
+
+    vs_random = []
+    for hero in range(NUM_CLASSES):
+        row = []
+        for opponents in range(1, MAX_OPPONENTS + 1):
+            holes = _deal_holes(
+                rng, [combos[hero]] + [None] * opponents, samples)
+            row.append(float(_shares(rng, holes)[0].mean()))
+        vs_random.append(row)
+
+    return PreflopTable(samples, heads_up, vs_random)
+
+
+def _deal_holes(rng, combos, samples: int):
+    """Deals (samples, players, 2) hole codes, drawing a random combo of
+    each class (or a random hand for None) without overlapping cards."""
+    import numpy as np
+    holes = np.empty((samples, len(combos), 2), dtype=np.intp)
+    rows = np.arange(samples)
+    while rows.size:
+        for player, player_combos in enumerate(combos):
+            if player_combos is None:
+                holes[rows, player] = rng.integers(0, 52, (rows.size, 2))
+            else:
+                holes[rows, player] = player_combos[
+                    rng.integers(0, len(player_combos), rows.size)]
+        dealt = np.sort(holes[rows].reshape(rows.size, -1), axis=1)
+        rows = rows[(dealt[:, 1:] == dealt[:, :-1]).any(axis=1)]
+    return holes
+
+
+def _shares(rng, holes):
+    """Deals a board per sample and returns each player's pot share."""
+    import numpy as np
+    from .batch import evaluate_many
+    samples, players, _ = holes.shape
+    keys = rng.random((samples, 52))
+    np.put_along_axis(keys, holes.reshape(samples, -1), 2.0, axis=1)
+    boards = np.argpartition(keys, 5, axis=1)[:, :5]
+
+    strengths = np.stack([evaluate_many(holes[:, player], boards)[0]
+                          for player in range(players)], axis=1)
+    winners = strengths == strengths.max(axis=1, keepdims=True)
+    return (winners / winners.sum(axis=1, keepdims=True)).T
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Generates the preflop equity table.")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", default=DEFAULT_PATH)
+    args = parser.parse_args()
+    PreflopTable.save(generate(args.samples, args.seed), args.output)
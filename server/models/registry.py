@@ -0,0 +1,506 @@
+import bisect
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+import functools
+import hashlib
+import itertools
+import multiprocessing
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import uuid
+
+from . import game
+from . import metrics
+from . import tracing
+from .actor import TableActor
+from .history import HandHistory
+from .ledger import ChipLedger
+from .log import ActionLog
+from .poker import METHOD_SECONDS, Poker
+from .serializer import JSON, Serializer
+from .store import TableStore
+
+DEFAULT_REPLICAS = 64  # Points per worker on the hash ring
+DEFAULT_ACTOR_THREADS = 4  # Threads per worker running table actors
+
+# Poker methods a worker runs on behalf of the server
+TABLE_METHODS = frozenset((
+    "add_player",
+    "buy_in",
+    "cash_out",
+    "fold",
+    "check",
+    "bet",
+    "call",
+    "raise_bet",
+    "start_game",
+    "deal",
+    "end_round",
+    "flop",
+    "turn",
+    "river",
+    "showdown",
+    "hands",
+    "equities",
+    "run_it",
+    "settle_equity",
+    "end_game",
+    "legal_actions",
+))
+# Table methods that only read the state: served from a snapshot of it
+# right away, rather than queueing behind the table's actions. Called
+# with the table and the snapshot, and timed as the Poker methods they
+# stand in for
+READS: Dict[str, Callable[..., Any]] = {
+    "hands": metrics.timed(
+        METHOD_SECONDS, "hands",
+        lambda poker, state, *args: game.hands(state, *args)),
+    "equities": metrics.timed(
+        METHOD_SECONDS, "equities",
+        lambda poker, state, *args: game.equities(state, *args)),
+    # Through the table's cache, which also times it
+    "legal_actions": lambda poker, state, *args: poker.legal_actions(
+        *args, state=state),
+}
+
+
+class TableNotFound(KeyError):
+    pass
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(
+        hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing(object):
+    """Consistent hashing of keys onto nodes. Each node owns `replicas`
+    points on the ring, so adding or removing a node only moves the keys
+    next to its points (about 1/n of them)."""
+
+    replicas: int
+
+    def __init__(self, nodes: Iterable[int] = (), replicas: int = DEFAULT_REPLICAS):
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._nodes: List[int] = []
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: int) -> None:
+        for replica in range(self.replicas):
+            point = _hash(f"{node}:{replica}")
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._nodes.insert(index, node)
+
+    def remove(self, node: int) -> None:
+        kept = [(point, owner) for point, owner in zip(self._points, self._nodes)
+                if owner != node]
+        self._points = [point for point, _ in kept]
+        self._nodes = [owner for _, owner in kept]
+
+    def node(self, key: str) -> int:
+        if not self._points:
+            raise LookupError("Hash ring has no nodes")
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._nodes[index]
+
+
+class TableManager(object):
+    """Tables of one process by id. With a log root, each table logs to its
+    own directory and is recovered from it on first lookup; with a store,
+    each table saves its state there and is loaded from it on first lookup
+    (see TableStore). With an executor, tables also get actors (see actor)
+    to run their actions."""
+
+    log_root: Optional[str]
+    store: Optional[TableStore]
+
+    def __init__(self,
+            log_root: Optional[str] = None,
+            executor: Optional[Executor] = None,
+            store: Optional[TableStore] = None):
+        self.log_root = log_root
+        self.executor = executor
+        self.store = store
+        self._tables: Dict[str, Poker] = {}
+        self._serializers: Dict[str, Serializer] = {}
+        self._actors: Dict[str, TableActor] = {}
+
+    def create(self, table_id: Optional[str] = None) -> str:
+        table_id = _table_id(table_id or uuid.uuid4().hex)
+        if table_id in self._tables:
+            raise ValueError(f"Table {table_id} already exists")
+        poker = self._tables[table_id] = self._open(table_id)
+        self._serializers[table_id] = Serializer()
+        if self.store is not None:
+            self.store.save(table_id, poker.state)
+        return table_id
+
+    def get(self, table_id: str) -> Poker:
+        table_id = _table_id(table_id)
+        poker = self._tables.get(table_id)
+        if poker is None:
+            logged = self.log_root is not None and os.path.isdir(
+                os.path.join(self.log_root, table_id))
+            if not logged and (self.store is None or table_id not in self.store):
+                raise TableNotFound(f"No table {table_id}")
+            poker = self._tables[table_id] = self._open(table_id)
+            self._serializers[table_id] = Serializer()
+        return poker
+
+    def serializer(self, table_id: str) -> Serializer:
+        self.get(table_id)
+        return self._serializers[_table_id(table_id)]
+
+    def actor(self, table_id: str) -> TableActor:
+        """The table's actor; once it has one, actions must go through it."""
+        poker = self.get(table_id)
+        table_id = _table_id(table_id)
+        actor = self._actors.get(table_id)
+        if actor is None:
+            if self.executor is None:
+                raise ValueError("Tables need an executor to have actors")
+            actor = self._actors[table_id] = TableActor(poker, self.executor)
+        return actor
+
+    def remove(self, table_id: str) -> None:
+        poker = self._tables.pop(_table_id(table_id))
+        self._serializers.pop(_table_id(table_id))
+        self._actors.pop(_table_id(table_id), None)
+        if poker.log is not None:
+            poker.log.close()
+        if poker.history is not None:
+            poker.history.close()
+        if poker.ledger is not None:
+            poker.ledger.close()
+
+    def reconcile(self) -> Dict[str, Dict[uuid.UUID, Tuple[int, int]]]:
+        """Accounts of each table whose chip ledger disagrees with its state
+        (see ledger.reconcile), only listing tables with any. Tables with
+        actors are checked on their actor, between two actions."""
+        results = {}
+        for table_id, poker in list(self._tables.items()):
+            actor = self._actors.get(table_id)
+            results[table_id] = (
+                poker.reconcile() if actor is None else actor.ask("reconcile"))
+        mismatches = {}
+        for table_id, result in results.items():
+            if isinstance(result, Future):
+                result = result.result()
+            if result:
+                mismatches[table_id] = result
+        return mismatches
+
+    def _open(self, table_id: str) -> Poker:
+        """A table with its action log, hand history and chip ledger kept
+        in its directory, if there's a log root."""
+        if self.log_root is None:
+            return Poker(table_id=table_id, store=self.store)
+        directory = os.path.join(self.log_root, table_id)
+        return Poker(ActionLog(directory), HandHistory(directory), table_id,
+                     self.store, ChipLedger(directory))
+
+    def __contains__(self, table_id: str) -> bool:
+        try:
+            return _table_id(table_id) in self._tables
+        except TableNotFound:
+            return False
+
+    def __len__(self):
+        return len(self._tables)
+
+    def players(self) -> int:
+        """Players seated across all tables."""
+        return sum(len(poker.state.players) for poker in self._tables.values())
+
+
+def _table_id(table_id: str) -> str:
+    """Canonical table id; ids name log directories, so only UUIDs pass."""
+    try:
+        return uuid.UUID(table_id).hex
+    except ValueError:
+        raise TableNotFound(f"No table {table_id}") from None
+
+
+class WorkerPool(object):
+    """Shards tables across worker processes by consistent hashing of the
+    table id, so tables run in parallel instead of sharing one GIL.
+
+    Each worker owns a TableManager. Calls for a table are sent to its
+    worker over a pipe, tagged with an id so that any number of server
+    threads can wait on one worker at once. There, each table's actions
+    run in order through its TableActor, while reads are answered from
+    the latest state straight away. With a profiler, each worker profiles
+    its share of requests (see tracing.Profiler). With a store path,
+    workers share one TableStore database.
+    """
+
+    def __init__(self,
+            workers: Optional[int] = None,
+            log_root: Optional[str] = None,
+            replicas: int = DEFAULT_REPLICAS,
+            profiler: Optional[tracing.Profiler] = None,
+            actor_threads: int = DEFAULT_ACTOR_THREADS,
+            store_path: Optional[str] = None):
+        workers = workers or os.cpu_count() or 1
+        # Spawned, as the server may already run threads
+        context = multiprocessing.get_context("spawn")
+        self._connections = []
+        self._locks = []
+        self._processes = []
+        # Futures of the requests sent to each worker, by request id, and
+        # whether its receiver still takes any (see _receive); both under
+        # the worker's lock
+        self._pending: List[Dict[int, Future]] = []
+        self._receiving: List[bool] = []
+        self._receivers = []
+        self._ids = itertools.count()
+        for worker in range(workers):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(
+                target=_serve,
+                args=(worker_connection, log_root, profiler, actor_threads,
+                      store_path),
+                daemon=True)
+            process.start()
+            worker_connection.close()
+            self._connections.append(connection)
+            self._locks.append(threading.Lock())
+            self._processes.append(process)
+            self._pending.append({})
+            self._receiving.append(True)
+            receiver = threading.Thread(
+                target=self._receive, args=(worker,), daemon=True)
+            receiver.start()
+            self._receivers.append(receiver)
+        self.ring = HashRing(range(workers), replicas)
+
+    def create_table(self, table_id: Optional[str] = None) -> str:
+        table_id = _table_id(table_id or uuid.uuid4().hex)
+        return self._request(table_id, "create", (), ())[0]
+
+    def call(self,
+            table_id: str,
+            method: Optional[str] = None,
+            *args,
+            viewer: Optional[uuid.UUID] = None,
+            since_version: Optional[int] = None,
+            format: str = JSON) -> Tuple[Any, bytes]:
+        """Runs a Poker method on a table, returning its result and the
+        table's resulting state encoded for viewer (see
+        Serializer.encode). No method only reads the state."""
+        if method is not None and method not in TABLE_METHODS:
+            raise ValueError(f"Unknown table method {method}")
+        result, _, views = self._request(_table_id(table_id), method, args,
+                                         ((viewer, since_version, format),))
+        return result, views[0]
+
+    def views(self,
+            table_id: str,
+            views: Sequence[Tuple[Optional[uuid.UUID], Optional[int], str]]
+            ) -> Tuple[int, List[bytes]]:
+        """Encodes the table's state once per (viewer, since_version,
+        format), e.g. for pushing it to every client at the table. Returns
+        the state's version along with the encodings."""
+        _, version, encoded = self._request(
+            _table_id(table_id), None, (), tuple(views))
+        return version, encoded
+
+    def metrics(self) -> List[List[metrics.Family]]:
+        """Metrics collected in each worker, see metrics.render."""
+        return [self._send(worker, (None, "metrics", (), ()))[1]
+                for worker in range(len(self._connections))]
+
+    def reconcile(self) -> Dict[str, Dict[uuid.UUID, Tuple[int, int]]]:
+        """Open tables of every worker whose chip ledger disagrees with
+        their state, see TableManager.reconcile."""
+        mismatches = {}
+        for worker in range(len(self._connections)):
+            mismatches.update(self._send(worker, (None, "reconcile", (), ()))[1])
+        return mismatches
+
+    def close(self) -> None:
+        """Stops the workers once they have run every action sent."""
+        for connection, lock in zip(self._connections, self._locks):
+            with lock:
+                try:
+                    connection.send(None)
+                except OSError:
+                    # Exited already
+                    pass
+        for process, receiver in zip(self._processes, self._receivers):
+            process.join()
+            receiver.join()
+        for connection in self._connections:
+            connection.close()
+
+    def _request(self,
+            table_id: str,
+            method: Optional[str],
+            args: tuple,
+            views: tuple):
+        _, result, version, encoded = self._send(
+            self.ring.node(table_id), (table_id, method, args, views))
+        return result, version, encoded
+
+    def _send(self, worker: int, request: tuple) -> tuple:
+        future = Future()
+        with self._locks[worker]:
+            if not self._receiving[worker]:
+                raise ConnectionError(f"Worker {worker} exited")
+            request_id = next(self._ids)
+            pending = self._pending[worker]
+            pending[request_id] = future
+            try:
+                self._connections[worker].send((request_id, *request))
+            except BaseException:
+                del pending[request_id]
+                raise
+        response = future.result()
+        if not response[0]:
+            raise response[1]
+        return response
+
+    def _receive(self, worker: int) -> None:
+        """Hands each response from a worker to the thread awaiting it."""
+        connection = self._connections[worker]
+        pending = self._pending[worker]
+        while True:
+            try:
+                request_id, response = connection.recv()
+            except (EOFError, OSError):
+                break
+            pending.pop(request_id).set_result(response)
+        with self._locks[worker]:
+            # No request can be registered after this
+            self._receiving[worker] = False
+            futures = list(pending.values())
+            pending.clear()
+        for future in futures:
+            future.set_exception(ConnectionError(f"Worker {worker} exited"))
+
+
+def _serve(connection,
+        log_root: Optional[str],
+        profiler: Optional[tracing.Profiler] = None,
+        actor_threads: int = DEFAULT_ACTOR_THREADS,
+        store_path: Optional[str] = None) -> None:
+    """A worker's loop: receives requests, answering reads itself and
+    telling table actors to run actions, which answer once done."""
+    executor = ThreadPoolExecutor(actor_threads)
+    # Works out equity shares, which can take a second, off the actors
+    settler = ThreadPoolExecutor(1)
+    store = None if store_path is None else TableStore(store_path)
+    manager = TableManager(log_root, executor, store)
+    profiler = profiler or tracing.Profiler()
+    metrics.REGISTRY.register(metrics.Gauge(
+        "poker_tables", "Tables open", lambda: len(manager)))
+    metrics.REGISTRY.register(metrics.Gauge(
+        "poker_players", "Players seated at open tables", manager.players))
+    lock = threading.Lock()
+
+    def reply(request_id: int, response: tuple) -> None:
+        with lock:
+            connection.send((request_id, response))
+
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        request_id, table_id, method, args, views = request
+        if method in TABLE_METHODS and method not in READS:
+            try:
+                actor = manager.actor(table_id)
+            except Exception as error:
+                reply(request_id, (False, error, None, None))
+                continue
+            if method == "settle_equity" and not args:
+                settler.submit(
+                    _settle, reply, request_id, profiler,
+                    manager.serializer(table_id), actor, views)
+                continue
+            actor.tell(functools.partial(
+                _act, reply, request_id, profiler,
+                manager.serializer(table_id), method, args, views))
+            continue
+        with profiler.request(method or "views"):
+            response = _handle(manager, table_id, method, args, views)
+        reply(request_id, response)
+    # Runs the actions already queued, so that they are answered and logged
+    settler.shutdown()
+    executor.shutdown()
+    if store is not None:
+        store.close()
+
+
+def _handle(manager: TableManager,
+        table_id: str,
+        method: Optional[str],
+        args: tuple,
+        views: tuple) -> tuple:
+    """Runs one request other than an action in a worker: (ok, result or
+    error, state version, encoded views)."""
+    try:
+        if method == "create":
+            return True, manager.create(table_id), None, None
+        if method == "metrics":
+            return True, metrics.REGISTRY.collect(), None, None
+        if method == "reconcile":
+            return True, manager.reconcile(), None, None
+        # One snapshot for the result and the views, however many actions
+        # the table's actor applies meanwhile
+        poker = manager.get(table_id)
+        state = poker.state
+        result = None
+        if method is not None:
+            result = READS[method](poker, state, *args)
+        serializer = manager.serializer(table_id)
+        return True, result, state.version, [
+            serializer.encode(state, *view) for view in views]
+    except Exception as error:
+        return False, error, None, None
+
+
+def _settle(reply: Callable[[int, tuple], None],
+        request_id: int,
+        profiler: tracing.Profiler,
+        serializer: Serializer,
+        actor: TableActor,
+        views: tuple) -> None:
+    """Works out the shares of a settle_equity off the table's actor, then
+    tells it to pay them out. Should an action land in between, the actor
+    works them out again for the new state."""
+    state = actor.state
+    try:
+        shares = game.settle_shares(state)
+    except Exception as error:
+        reply(request_id, (False, error, None, None))
+        return
+
+    def settle(poker: Poker) -> None:
+        args = (shares,) if poker.state.version == state.version else ()
+        _act(reply, request_id, profiler, serializer,
+             "settle_equity", args, views, poker)
+    actor.tell(settle)
+
+
+def _act(reply: Callable[[int, tuple], None],
+        request_id: int,
+        profiler: tracing.Profiler,
+        serializer: Serializer,
+        method: str,
+        args: tuple,
+        views: tuple,
+        poker: Poker) -> None:
+    """Runs an action on a table's actor and replies with the result."""
+    with profiler.request(method):
+        try:
+            result = getattr(poker, method)(*args)
+            state = poker.state
+            response = True, result, state.version, [
+                serializer.encode(state, *view) for view in views]
+        except Exception as error:
+            response = False, error, None, None
+    reply(request_id, response)
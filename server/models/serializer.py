@@ -0,0 +1,171 @@
+import functools
+import json
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import uuid
+
+from .blinds import Blinds
+from .card import Card
+from .state import State
+from .tracing import traced
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "json"
+MSGPACK = "msgpack"
+ID_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=ID_CACHE_SIZE)
+def _id(player_uuid: uuid.UUID) -> str:
+    """Players show up in every view, so each UUID is stringified once."""
+    return str(player_uuid)
+
+
+def _ids(ids: Iterable[uuid.UUID]) -> List[str]:
+    return [_id(id) for id in ids]
+
+
+def _codes(cards: Iterable[Card]) -> List[int]:
+    return [card.code for card in cards]
+
+
+def _revealed(state: State) -> bool:
+    """Hands in play are shown once a showdown (or run-out) has winners;
+    a pot won by everyone else folding shows nothing."""
+    return bool(state.winners) and len(state.in_play) > 1
+
+
+def _hole(state: State,
+        viewer: Optional[uuid.UUID],
+        player_uuid: uuid.UUID) -> Optional[List[int]]:
+    if player_uuid == viewer or (
+            _revealed(state) and player_uuid in state.in_play):
+        return _codes(state.holes[player_uuid])
+    return None
+
+
+# Compact encoders of the State.to_dict fields: cards as codes (see
+# Card.code) and other players' holes as null until revealed
+_ENCODERS: Dict[str, Callable[[State, Optional[uuid.UUID]], Any]] = {
+    "bets": lambda state, viewer: {
+        _id(id): bet for id, bet in state.bets.items()},
+    "blinds": lambda state, viewer: Blinds.to_dict(state.blinds),
+    "board": lambda state, viewer: _codes(state.board),
+    "dealer_position": lambda state, viewer: state.dealer_position,
+    "holes": lambda state, viewer: {
+        _id(id): _hole(state, viewer, id) for id in state.holes},
+    "in_play": lambda state, viewer: _ids(state.in_play),
+    "players": lambda state, viewer: _ids(state.players),
+    "pot": lambda state, viewer: state.pot,
+    "runouts": lambda state, viewer: [
+        _codes(runout) for runout in state.runouts],
+    "stacks": lambda state, viewer: {
+        _id(id): stack for id, stack in state.stacks.items()},
+    "to_act": lambda state, viewer: state.to_act,
+    "version": lambda state, viewer: state.version,
+    "winners": lambda state, viewer: _ids(state.winners),
+}
+
+_ITEM_ENCODERS: Dict[str, Callable[[State, Optional[uuid.UUID], uuid.UUID], Any]] = {
+    "bets": lambda state, viewer, id: state.bets[id],
+    "holes": _hole,
+    "stacks": lambda state, viewer, id: state.stacks[id],
+}
+
+
+def view(state: State, viewer: Optional[uuid.UUID] = None) -> Dict[str, Any]:
+    """State.to_dict as seen by viewer (None for spectators)."""
+    return {name: encode(state, viewer) for name, encode in _ENCODERS.items()}
+
+
+def diff(state: State,
+        viewer: Optional[uuid.UUID],
+        since_version: int) -> Optional[List[Dict[str, Any]]]:
+    """State.diff between views of viewer, or None if too far behind."""
+    changed = State.changes(state, since_version)
+    if changed is None:
+        return None
+    if "winners" in changed:
+        # Showdowns reveal holes without changing them
+        changed["holes"] = None
+
+    patch = [{"op": "replace", "path": "/version", "value": state.version}]
+    for name in sorted(changed):
+        value = getattr(state, name)
+        keys = changed[name]
+        if keys is None or len(keys) >= len(value):
+            patch.append({"op": "replace", "path": f"/{name}",
+                          "value": _ENCODERS[name](state, viewer)})
+            continue
+        encode = _ITEM_ENCODERS[name]
+        for key in sorted(keys, key=str):
+            path = f"/{name}/{_id(key)}"
+            if key in value:
+                patch.append({"op": "add", "path": path,
+                              "value": encode(state, viewer, key)})
+            else:
+                patch.append({"op": "remove", "path": path})
+    return patch
+
+
+def dumps(document: Any, format: str = JSON) -> bytes:
+    if format == MSGPACK:
+        if msgpack is None:
+            raise ValueError("MessagePack needs the msgpack package")
+        return msgpack.packb(document)
+    if format != JSON:
+        raise ValueError(f"Unknown format {format}")
+    if orjson is not None:
+        return orjson.dumps(document)
+    return json.dumps(document, separators=(",", ":")).encode()
+
+
+class Serializer(object):
+    """Encodes one table's state for its clients. Each view (viewer, the
+    version it patches from, format) is encoded once per state change and
+    then served from the cache until the state changes again.
+
+    Safe to share between threads: the cache is swapped out whole with
+    the state it belongs to, so an encoding never lands in another
+    state's cache."""
+
+    def __init__(self):
+        self._cached: Tuple[Optional[State], Dict[
+            Tuple[Optional[uuid.UUID], Optional[int], str], bytes]] = (None, {})
+
+    @traced("Serializer.encode")
+    def encode(self,
+            state: State,
+            viewer: Optional[uuid.UUID] = None,
+            since_version: Optional[int] = None,
+            format: str = JSON) -> bytes:
+        """The view of viewer: a patch since since_version when possible,
+        {"version", "since_version", "patch"}, otherwise the full view."""
+        cached_state, cache = self._cached
+        if state is not cached_state:
+            cache = {}
+            self._cached = (state, cache)
+        key = (viewer, since_version, format)
+        encoded = cache.get(key)
+        if encoded is None:
+            document = None
+            if since_version is not None:
+                patch = diff(state, viewer, since_version)
+                if patch is not None:
+                    document = {
+                        "version": state.version,
+                        "since_version": since_version,
+                        "patch": patch,
+                    }
+            if document is None:
+                document = view(state, viewer)
+            encoded = cache[key] = dumps(document, format)
+        return encoded
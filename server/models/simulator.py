@@ -0,0 +1,315 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import os
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+import uuid
+
+from . import preflop
+from .evaluator import hand_type
+from .hand import HandType
+from . import player
+from .player import LegalActions, PlayerActionType
+from .poker import Poker
+from .state import State
+
+DEFAULT_STACK = 1000
+DEFAULT_SAMPLE_INTERVAL = 100  # Hands between stack trajectory points
+STREETS = ("flop", "turn", "river")
+
+
+class Observation(object):
+    """What a policy sees when it is its turn to act."""
+
+    state: State
+    player_uuid: uuid.UUID
+    seat: int
+    legal: LegalActions
+    to_call: int  # Chips needed to call, 0 if checking is allowed
+    min_raise: int  # Smallest raise (or bet) on top of to_call
+    stack: int
+    rng: random.Random
+
+    def __init__(self,
+            state: State,
+            player_uuid: uuid.UUID,
+            seat: int,
+            legal: LegalActions,
+            rng: random.Random):
+        self.state = state
+        self.player_uuid = player_uuid
+        self.seat = seat
+        self.legal = legal
+        self.to_call = legal.to_call
+        self.min_raise = legal.min_amount - legal.to_call
+        self.stack = state.stacks[player_uuid]
+        self.rng = rng
+
+
+# Returns the action to take and, for bets and raises, the chips to put in
+# (including the call); amounts beyond the stack are capped to all-in
+Policy = Callable[[Observation], Tuple[PlayerActionType, int]]
+
+
+def call_station(observation: Observation) -> Tuple[PlayerActionType, int]:
+    """Never folds, never raises."""
+    if observation.to_call == 0:
+        return PlayerActionType.CHECK, 0
+    return PlayerActionType.CALL, observation.to_call
+
+
+def random_policy(observation: Observation) -> Tuple[PlayerActionType, int]:
+    """Folds, calls or raises the minimum uniformly at random."""
+    choice = observation.rng.randrange(3)
+    if choice == 0 and observation.to_call > 0:
+        return PlayerActionType.FOLD, 0
+    if choice == 2:
+        amount = observation.to_call + observation.min_raise
+        if observation.to_call == 0:
+            return PlayerActionType.BET, amount
+        return PlayerActionType.RAISE, amount
+    return call_station(observation)
+
+
+def tight_policy(observation: Observation) -> Tuple[PlayerActionType, int]:
+    """Raises strong starting hands (by preflop equity against as many
+    random hands) and made hands of a pair or better, folds the rest."""
+    state = observation.state
+    hole = state.holes[observation.player_uuid]
+    if len(state.board) == 0:
+        opponents = len(state.in_play) - 1
+        strong = (preflop.table().equity_vs_random(hole, opponents)
+                  > 1.5 / len(state.in_play))
+    else:
+        strong = (hand_type(state.board_evaluator.evaluate(hole))
+                  > HandType.PAIR)
+    if not strong:
+        if observation.to_call == 0:
+            return PlayerActionType.CHECK, 0
+        return PlayerActionType.FOLD, 0
+    amount = observation.to_call + max(observation.min_raise, state.pot // 2)
+    if observation.to_call == 0:
+        return PlayerActionType.BET, amount
+    return PlayerActionType.RAISE, amount
+
+
+POLICIES: Dict[str, Policy] = {
+    "call_station": call_station,
+    "random": random_policy,
+    "tight": tight_policy,
+}
+
+
+class Result(object):
+    """Outcome of simulated hands, per seat."""
+
+    hands: int
+    seconds: float
+    wins: List[float]  # Pots won, split pots counting fractionally
+    net: List[int]  # Chips won minus chips bought in
+    buy_ins: List[int]
+    trajectories: List[List[int]]  # Net chips every sample_interval hands
+
+    def __init__(self,
+            hands: int,
+            seconds: float,
+            wins: List[float],
+            net: List[int],
+            buy_ins: List[int],
+            trajectories: List[List[int]]):
+        self.hands = hands
+        self.seconds = seconds
+        self.wins = wins
+        self.net = net
+        self.buy_ins = buy_ins
+        self.trajectories = trajectories
+
+    @property
+    def hands_per_second(self) -> float:
+        return self.hands / self.seconds if self.seconds else 0.0
+
+    @property
+    def win_rates(self) -> List[float]:
+        return [wins / self.hands for wins in self.wins]
+
+    @staticmethod
+    def to_dict(result) -> Dict[str, Any]:
+        return {
+            "hands": result.hands,
+            "seconds": result.seconds,
+            "hands_per_second": result.hands_per_second,
+            "win_rates": result.win_rates,
+            "net": result.net,
+            "buy_ins": result.buy_ins,
+            "trajectories": result.trajectories,
+        }
+
+
+def simulate(policies: Sequence[Union[str, Policy]],
+        hands: int,
+        workers: Optional[int] = None,
+        stack: int = DEFAULT_STACK,
+        seed: Optional[int] = None,
+        sample_interval: int = DEFAULT_SAMPLE_INTERVAL) -> Result:
+    """Main entry point to play `hands` hands between policies, one per
+    seat, split across a process pool.
+
+    Each worker plays its share at its own table. Policies are names from
+    POLICIES or picklable (module-level) callables. Players are topped back
+    up to `stack` when they can't post the big blind.
+    """
+    workers = workers or os.cpu_count() or 1
+    rng = random.Random(seed) if seed is not None else random.SystemRandom()
+    jobs = []
+    for index in range(workers):
+        worker_hands = hands // workers + (index < hands % workers)
+        if worker_hands:
+            jobs.append((list(policies), worker_hands, stack,
+                         rng.getrandbits(64), sample_interval))
+
+    start = time.perf_counter()
+    if len(jobs) == 1:
+        results = [play(*jobs[0])]
+    else:
+        with ProcessPoolExecutor(len(jobs)) as executor:
+            results = list(executor.map(play, *zip(*jobs)))
+    return _combine(results, time.perf_counter() - start)
+
+
+def play(policies: Sequence[Union[str, Policy]],
+        hands: int,
+        stack: int = DEFAULT_STACK,
+        seed: Optional[int] = None,
+        sample_interval: int = DEFAULT_SAMPLE_INTERVAL) -> Result:
+    """Plays hands at one table in this process."""
+    policies = [POLICIES[policy] if isinstance(policy, str) else policy
+                for policy in policies]
+    rng = random.Random(seed)
+    poker = Poker()
+    players = [poker.add_player(f"Seat {seat}")
+               for seat in range(len(policies))]
+    seats = {player_uuid: seat for seat, player_uuid in enumerate(players)}
+    wins = [0.0] * len(players)
+    buy_ins = [0] * len(players)
+    trajectories: List[List[int]] = [[] for _ in players]
+
+    start = time.perf_counter()
+    for hand in range(hands):
+        for seat, player_uuid in enumerate(players):
+            if poker.state.stacks[player_uuid] < poker.state.blinds.big:
+                top_up = stack - poker.state.stacks[player_uuid]
+                poker.buy_in(player_uuid, top_up)
+                buy_ins[seat] += top_up
+        play_hand(poker, policies, seats, rng)
+        winners = poker.state.winners
+        for winner_uuid in winners:
+            wins[seats[winner_uuid]] += 1 / len(winners)
+        if (hand + 1) % sample_interval == 0:
+            for seat, player_uuid in enumerate(players):
+                trajectories[seat].append(
+                    poker.state.stacks[player_uuid] - buy_ins[seat])
+    seconds = time.perf_counter() - start
+
+    net = [poker.state.stacks[player_uuid] - buy_ins[seat]
+           for seat, player_uuid in enumerate(players)]
+    return Result(hands, seconds, wins, net, buy_ins, trajectories)
+
+
+def play_hand(poker: Poker,
+        policies: List[Policy],
+        seats: Dict[uuid.UUID, int],
+        rng: random.Random) -> None:
+    """Plays one hand at a table whose players are seated and bought in,
+    each acting by the policy of their seat."""
+    poker.start_game(seed=rng.getrandbits(64))
+    poker.deal()
+    _betting_round(poker, policies, seats, rng)
+    for street in STREETS:
+        if len(poker.state.in_play) == 1:
+            return
+        poker.end_round()
+        getattr(poker, street)()
+        _betting_round(poker, policies, seats, rng)
+    if len(poker.state.in_play) > 1:
+        poker.showdown()
+
+
+def _betting_round(poker: Poker,
+        policies: List[Policy],
+        seats: Dict[uuid.UUID, int],
+        rng: random.Random) -> None:
+    """Asks the player to act, in the engine's order, until every player
+    still holding chips has acted since the last bet or raise."""
+    pending = set(poker.state.in_play)
+
+    while len(poker.state.in_play) > 1:
+        state = poker.state
+        pending = {player_uuid for player_uuid in pending
+                   if player_uuid in state.in_play and state.stacks[player_uuid]}
+        if not pending:
+            return
+        legal = player.legal_actions(state)
+        player_uuid = legal.player_uuid
+        observation = Observation(
+            state, player_uuid, seats[player_uuid], legal, rng)
+        type, amount = policies[seats[player_uuid]](observation)
+        pending.discard(player_uuid)
+
+        if type is PlayerActionType.FOLD:
+            poker.fold(player_uuid)
+        elif type is PlayerActionType.CHECK:
+            poker.check(player_uuid)
+        elif (type is PlayerActionType.CALL or amount <= legal.to_call
+                or legal.max_amount == legal.to_call):
+            poker.call(player_uuid, legal.to_call)
+        else:
+            amount = min(amount, legal.max_amount)
+            if PlayerActionType.BET in legal.types:
+                poker.bet(player_uuid, amount)
+            else:
+                poker.raise_bet(player_uuid, amount)
+            # Everyone else gets to respond to the raise
+            pending = set(poker.state.in_play) - {player_uuid}
+
+
+def _combine(results: List[Result], seconds: float) -> Result:
+    seats = len(results[0].wins)
+    trajectories: List[List[int]] = [[] for _ in range(seats)]
+    offsets = [0] * seats
+    for result in results:
+        for seat in range(seats):
+            # Chains each table's trajectory onto the previous one's
+            trajectories[seat].extend(
+                offsets[seat] + net for net in result.trajectories[seat])
+            offsets[seat] += result.net[seat]
+    return Result(
+        sum(result.hands for result in results),
+        seconds,
+        [sum(result.wins[seat] for result in results) for seat in range(seats)],
+        offsets,
+        [sum(result.buy_ins[seat] for result in results)
+         for seat in range(seats)],
+        trajectories)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="python -m models.simulator",
+        description="Plays hands between policies without the server.")
+    parser.add_argument("policies", nargs="+", choices=sorted(POLICIES),
+                        help="policy of each seat")
+    parser.add_argument("--hands", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--stack", type=int, default=DEFAULT_STACK)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    result = simulate(args.policies, args.hands, args.workers,
+                      args.stack, args.seed)
+    print(f"{result.hands:,} hands in {result.seconds:.2f}s "
+          f"({result.hands_per_second:,.0f} hands/s)")
+    for seat, policy in enumerate(args.policies):
+        print(f"Seat {seat} {policy:>12}: win rate "
+              f"{result.win_rates[seat]:6.2%}, net {result.net[seat]:+,} "
+              f"(bought in {result.buy_ins[seat]:,})")
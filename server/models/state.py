@@ -1,84 +1,342 @@
 from json import JSONEncoder
-from typing import Any, Dict, List, Optional
+import operator
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
 import uuid
 
 from .action import Action
 from .blinds import Blinds
 from .card import Card
 from .deck import Deck
+from .evaluator import BoardEvaluator
+from .tracing import traced
+
+HISTORY_SIZE = 64  # Versions a client may lag behind and still get a diff
+
+
+class FrozenDict(dict):
+    """Read-only dict. Updates return a new FrozenDict, leaving this one (and
+    every state sharing it) untouched."""
+
+    __slots__ = ()
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError(f"{type(self).__name__} is immutable")
+
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = __ior__ = _immutable
+
+    def set(self, key, value):
+        copy = FrozenDict(self)
+        dict.__setitem__(copy, key, value)
+        return copy
+
+    def remove(self, key):
+        copy = FrozenDict(self)
+        dict.__delitem__(copy, key)
+        return copy
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class Change(object):
+    """One transition in a state's changelog: (version, {field: changed
+    keys, or None if replaced}), linked to the transition before it. States
+    share the links, so a transition adds to the changelog without copying
+    it."""
+
+    __slots__ = ("version", "fields", "previous", "length")
+
+    version: int
+    fields: Dict[str, Optional[FrozenSet]]
+    previous: Optional["Change"]
+    length: int  # Links up to the oldest one kept
+
+    def __init__(self,
+            version: int,
+            fields: Dict[str, Optional[FrozenSet]],
+            previous: Optional["Change"] = None):
+        self.version = version
+        self.fields = fields
+        self.previous = previous
+        self.length = 1 if previous is None else previous.length + 1
+
+    def __iter__(self):
+        """This transition and the ones before it, newest first."""
+        change: Optional[Change] = self
+        while change is not None:
+            yield change
+            change = change.previous
+
+    def __reduce__(self):
+        # Oldest first, rather than recursing once per link
+        return _relink, ([(change.version, change.fields)
+                          for change in reversed(list(self))],)
 
 
 class State(object):
+    """Immutable game state. Transitions go through new_state, which shares
+    every unchanged field with the previous state, so old states stay valid
+    and cheap to keep (history, undo, search)."""
 
-    bets: Dict[uuid.UUID, int]
+    __slots__ = (
+        "bets",
+        "blinds",
+        "board",
+        "board_evaluator",
+        "changelog",
+        "dealer_position",
+        "deck",
+        "holes",
+        "in_play",
+        "players",
+        "pot",
+        "runouts",
+        "stacks",
+        "to_act",
+        "version",
+        "winners",
+    )
+
+    bets: FrozenDict  # Dict[uuid.UUID, int]
     blinds: Blinds
-    board: List[Card]
+    board: Tuple[Card, ...]
+    board_evaluator: BoardEvaluator
+    # The last transition, linked to at least HISTORY_SIZE - 1 before it
+    # (fewer at the start) and trimmed every HISTORY_SIZE transitions
+    changelog: Optional[Change]
     dealer_position: int
-    deck: Deck
-    holes: Dict[uuid.UUID, List[Card]]
-    in_play: List[uuid.UUID]
-    players: List[uuid.UUID]
+    deck: Deck  # Drawing copies the deck first, see Deck.__copy__
+    holes: FrozenDict  # Dict[uuid.UUID, Tuple[Card, ...]]
+    in_play: Tuple[uuid.UUID, ...]
+    players: Tuple[uuid.UUID, ...]
     pot: int
-    stacks: Dict[uuid.UUID, int]
+    runouts: Tuple[Tuple[Card, ...], ...]
+    stacks: FrozenDict  # Dict[uuid.UUID, int]
     to_act: int
-    winners: List[uuid.UUID]
+    version: int  # Number of transitions that led to this state
+    winners: Tuple[uuid.UUID, ...]
 
     def __init__(self,
             bets: Optional[Dict[uuid.UUID, int]] = None,
             blinds: Optional[Blinds] = None,
-            board: Optional[List[Card]] = None,
+            board: Optional[Iterable[Card]] = None,
+            board_evaluator: Optional[BoardEvaluator] = None,
             dealer_position: Optional[int] = None,
             deck: Optional[Deck] = None,
-            holes: Optional[Dict[uuid.UUID, List[Card]]] = None,
-            in_play: Optional[List[uuid.UUID]] = None,
-            players: Optional[List[uuid.UUID]] = None,
+            holes: Optional[Dict[uuid.UUID, Iterable[Card]]] = None,
+            in_play: Optional[Iterable[uuid.UUID]] = None,
+            players: Optional[Iterable[uuid.UUID]] = None,
             pot: Optional[int] = None,
+            runouts: Optional[Iterable[Iterable[Card]]] = None,
             stacks: Optional[Dict[uuid.UUID, int]] = None,
             to_act: Optional[int] = None,
-            winners: Optional[List[uuid.UUID] ]= None):
-        self.bets = bets or {}
-        self.blinds = blinds or Blinds(5, 10)
-        self.board = board or []
-        self.dealer_position = dealer_position or -1
-        self.deck = deck or Deck()
-        self.holes = holes or {}
-        self.in_play = in_play or []
-        self.players = players or []
-        self.pot = pot or 0
-        self.stacks = stacks or {}
-        self.to_act = to_act or 0
-        self.winners = winners or []
+            winners: Optional[Iterable[uuid.UUID]] = None):
+        board = tuple(board or ())
+        members = {
+            "bets": FrozenDict(bets or {}),
+            "blinds": blinds or Blinds(5, 10),
+            "board": board,
+            "board_evaluator": board_evaluator or BoardEvaluator(board),
+            "changelog": None,
+            "dealer_position": -1 if dealer_position is None else dealer_position,
+            "deck": deck or Deck(),
+            "holes": FrozenDict({player_uuid: tuple(hole)
+                                 for player_uuid, hole in (holes or {}).items()}),
+            "in_play": tuple(in_play or ()),
+            "players": tuple(players or ()),
+            "pot": pot or 0,
+            "runouts": tuple(tuple(runout) for runout in runouts or ()),
+            "stacks": FrozenDict(stacks or {}),
+            "to_act": to_act or 0,
+            "version": 0,
+            "winners": tuple(winners or ()),
+        }
+        for name, value in members.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return _restore, ({name: getattr(self, name)
+                           for name in State.__slots__},)
 
     @staticmethod
+    @traced("State.to_dict")
     def to_dict(state) -> Dict[str, Any]:
-        return {
-            "bets": {
-                str(id): state.bets[id]
-                for id in state.bets.keys()
-            },
-            "blinds": Blinds.to_dict(state.blinds),
-            "board": state.board,
-            "dealer_position": state.dealer_position,
-            "holes": {
-                str(id): [Card.to_dict(card) for card in state.holes[id]]
-                for id in state.holes.keys()
-            },
-            "in_play": [str(id) for id in state.in_play],
-            "players": [str(id) for id in state.players],
-            "pot": state.pot,
-            "stacks": {
-                str(id): state.stacks[id]
-                for id in state.stacks.keys()
-            },
-            "to_act": state.to_act,
-            "winners": [str(id) for id in state.winners],
-        }
+        return {name: encode(getattr(state, name))
+                for name, encode in _ENCODERS.items()}
 
     @staticmethod
+    def changes(state, since_version: int) -> Optional[Dict[str, Optional[set]]]:
+        """Fields of to_dict changed since since_version, each with the set
+        of changed keys for bets, holes and stacks, or None if replaced.
+
+        Returns None when since_version is more than HISTORY_SIZE versions
+        behind (or ahead), as those changes are no longer known.
+        """
+        changelog = state.changelog
+        known = 0 if changelog is None else min(changelog.length, HISTORY_SIZE)
+        if not state.version - known <= since_version <= state.version:
+            return None
+
+        changed: Dict[str, Optional[set]] = {}
+        for change in changelog or ():
+            if change.version <= since_version:
+                break
+            for name, keys in change.fields.items():
+                if name not in _ENCODERS or name in changed and changed[name] is None:
+                    continue
+                if keys is None:
+                    changed[name] = None
+                else:
+                    changed.setdefault(name, set()).update(keys)
+        return changed
+
+    @staticmethod
+    def diff(state, since_version: int) -> Optional[List[Dict[str, Any]]]:
+        """JSON patch (RFC 6902) taking the to_dict of the state at
+        since_version to this state's. Dict fields are patched per player.
+        None if the client needs a full to_dict instead, see changes.
+        """
+        changed = State.changes(state, since_version)
+        if changed is None:
+            return None
+
+        patch = [{"op": "replace", "path": "/version", "value": state.version}]
+        for name in sorted(changed):
+            value = getattr(state, name)
+            keys = changed[name]
+            # Whole field when that's no bigger, e.g. bets cleared each round
+            if keys is None or len(keys) >= len(value):
+                patch.append({"op": "replace", "path": f"/{name}",
+                              "value": _ENCODERS[name](value)})
+                continue
+            encode = _ITEM_ENCODERS[name]
+            for key in sorted(keys, key=str):
+                path = f"/{name}/{key}"
+                if key in value:
+                    patch.append({"op": "add", "path": path,
+                                  "value": encode(value[key])})
+                else:
+                    patch.append({"op": "remove", "path": path})
+        return patch
+
+    @staticmethod
+    @traced("State.new_state")
     def new_state(
             state,
             changes: Optional[Dict[str, Any]] = None):
-        members = vars(state)
+        """Returns a state with the changed fields replaced and every other
+        field shared by reference. Changed containers must be new objects
+        (e.g. from FrozenDict.set), never the previous state's."""
+        new = object.__new__(State)
+        for setter, value in zip(_SETTERS, _get_slots(state)):
+            setter(new, value)
+        fields: Dict[str, Optional[FrozenSet]] = {}
         if changes:
-            members.update(changes)
-        return State(**members)
+            for name, value in changes.items():
+                previous = getattr(state, name)
+                if value is previous:
+                    continue
+                object.__setattr__(new, name, value)
+                if name in _ITEM_ENCODERS:
+                    keys = _changed_keys(previous, value)
+                    if keys:
+                        fields[name] = keys
+                else:
+                    fields[name] = None
+        version = state.version + 1
+        object.__setattr__(new, "version", version)
+        changelog = Change(version, fields, state.changelog)
+        if changelog.length == 2 * HISTORY_SIZE:
+            changelog = _relink([(change.version, change.fields)
+                                 for change in reversed(
+                                     list(changelog)[:HISTORY_SIZE])])
+        object.__setattr__(new, "changelog", changelog)
+        return new
+
+
+_get_slots = operator.attrgetter(*State.__slots__)
+_SETTERS = [getattr(State, name).__set__ for name in State.__slots__]
+
+
+def _changed_keys(previous: Dict, value: Dict) -> FrozenSet:
+    """Keys added, removed or changed. Compared by identity, not equality,
+    as cards compare by rank only."""
+    keys = []
+    kept = 0
+    for key, item in value.items():
+        previous_item = previous.get(key, _MISSING)
+        if previous_item is not _MISSING:
+            kept += 1
+        if previous_item is not item:
+            keys.append(key)
+    if kept < len(previous):
+        keys.extend(key for key in previous if key not in value)
+    return frozenset(keys)
+
+
+def _relink(changes: Iterable[tuple]) -> Optional[Change]:
+    """Changelog of (version, fields) transitions, oldest first."""
+    changelog = None
+    for version, fields in changes:
+        changelog = Change(version, fields, changelog)
+    return changelog
+
+
+def _restore(members: Dict[str, Any]) -> State:
+    state = object.__new__(State)
+    if isinstance(members.get("changelog"), tuple):
+        # Pickled when the changelog was a tuple of (version, fields)
+        members = dict(members, changelog=_relink(members["changelog"]))
+    for name, value in members.items():
+        object.__setattr__(state, name, value)
+    return state
+
+
+_MISSING = object()
+
+
+def _encode_ids(ids: Iterable[uuid.UUID]) -> List[str]:
+    return [str(id) for id in ids]
+
+
+def _encode_cards(cards: Iterable[Card]) -> List[Dict[str, Any]]:
+    return [Card.to_dict(card) for card in cards]
+
+
+# Dict fields patched per key by State.diff, with their value encoders
+_ITEM_ENCODERS: Dict[str, Callable[[Any], Any]] = {
+    "bets": int,
+    "holes": _encode_cards,
+    "stacks": int,
+}
+
+# Encoders of the fields in State.to_dict
+_ENCODERS: Dict[str, Callable[[Any], Any]] = {
+    "bets": lambda bets: {str(id): bet for id, bet in bets.items()},
+    "blinds": Blinds.to_dict,
+    "board": _encode_cards,
+    "dealer_position": int,
+    "holes": lambda holes: {str(id): _encode_cards(hole)
+                            for id, hole in holes.items()},
+    "in_play": _encode_ids,
+    "players": _encode_ids,
+    "pot": int,
+    "runouts": lambda runouts: [_encode_cards(runout) for runout in runouts],
+    "stacks": lambda stacks: {str(id): stack for id, stack in stacks.items()},
+    "to_act": int,
+    "version": int,
+    "winners": _encode_ids,
+}
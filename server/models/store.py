@@ -0,0 +1,178 @@
+import logging
+import pickle
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .state import State
+
+DEFAULT_FLUSH_INTERVAL = 0.005  # Seconds a saved state may wait to commit
+BUSY_TIMEOUT = 5.0  # Seconds to wait on another process's write
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tables (
+    table_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    small_blind INTEGER,
+    big_blind INTEGER,
+    state BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS players (
+    table_id TEXT NOT NULL,
+    player_uuid TEXT NOT NULL,
+    seat INTEGER NOT NULL,
+    stack INTEGER NOT NULL,
+    PRIMARY KEY (table_id, player_uuid)
+) WITHOUT ROWID;
+"""
+# Statements are kept as constants: sqlite3 caches each prepared statement
+# by its text, so every batch reuses them
+_UPSERT_TABLE = """
+INSERT INTO tables (table_id, version, small_blind, big_blind, state)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (table_id) DO UPDATE SET
+    version = excluded.version,
+    small_blind = excluded.small_blind,
+    big_blind = excluded.big_blind,
+    state = excluded.state
+"""
+_DELETE_PLAYERS = "DELETE FROM players WHERE table_id = ?"
+_INSERT_PLAYER = """
+INSERT INTO players (table_id, player_uuid, seat, stack) VALUES (?, ?, ?, ?)
+"""
+_SELECT_STATE = "SELECT state FROM tables WHERE table_id = ?"
+_SELECT_EXISTS = "SELECT 1 FROM tables WHERE table_id = ?"
+_SELECT_STACKS = "SELECT player_uuid, stack FROM players WHERE table_id = ? ORDER BY seat"
+
+
+class TableStore(object):
+    """Latest state of every table in a SQLite database, in WAL mode so
+    readers never block the writer.
+
+    Saving only swaps the table's state into a pending batch: a background
+    thread commits everything pending in one transaction every
+    `flush_interval` seconds, or as soon as a hand ends. Tables saved
+    several times in between are written once, and no request waits on the
+    disk. A crash loses at most the last interval; the action log, when
+    kept, still has every action.
+
+    Besides the pickled State, each table's blinds and each seat's stack
+    get columns of their own, so they can be queried without the engine.
+    """
+
+    path: str
+    flush_interval: float
+
+    def __init__(self, path: str, flush_interval: float = DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        # Shared by the flusher and loads, under _connection_lock
+        self._connection = sqlite3.connect(
+            path, timeout=BUSY_TIMEOUT, isolation_level=None,
+            check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # With WAL, commits only sync at checkpoints: still consistent after
+        # a power loss, though the last commits may be gone
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+        self._connection_lock = threading.Lock()
+        self._pending: Dict[str, State] = {}
+        # The batch being committed, still read by load meanwhile
+        self._flushing: Dict[str, State] = {}
+        self._pending_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
+    def save(self, table_id: str, state: State) -> None:
+        """Queues the table's latest state for the next batch."""
+        with self._pending_lock:
+            self._pending[table_id] = state
+        if state.winners:
+            # Hand over: commit it now rather than at the next interval
+            self._wake.set()
+
+    def load(self, table_id: str) -> Optional[State]:
+        """The table's latest saved state, None if it was never saved."""
+        with self._pending_lock:
+            state = self._pending.get(table_id) or self._flushing.get(table_id)
+        if state is not None:
+            return state
+        with self._connection_lock:
+            row = self._connection.execute(_SELECT_STATE, (table_id,)).fetchone()
+        return None if row is None else pickle.loads(row[0])
+
+    def stacks(self, table_id: str) -> List[Tuple[str, int]]:
+        """Committed (player uuid, stack) of each seat at the table."""
+        with self._connection_lock:
+            return self._connection.execute(_SELECT_STACKS, (table_id,)).fetchall()
+
+    def __contains__(self, table_id: str) -> bool:
+        with self._pending_lock:
+            if table_id in self._pending or table_id in self._flushing:
+                return True
+        with self._connection_lock:
+            return self._connection.execute(
+                _SELECT_EXISTS, (table_id,)).fetchone() is not None
+
+    def flush(self) -> None:
+        """Commits every pending state in one transaction."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            self._flushing = pending
+        if not pending:
+            return
+        tables = []
+        players = []
+        for table_id, state in pending.items():
+            tables.append((
+                table_id,
+                state.version,
+                state.blinds.small,
+                state.blinds.big,
+                pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)))
+            players.extend(
+                (table_id, str(player_uuid), seat, state.stacks[player_uuid])
+                for seat, player_uuid in enumerate(state.players))
+        with self._connection_lock:
+            connection = self._connection
+            try:
+                connection.execute("BEGIN IMMEDIATE")
+                connection.executemany(_UPSERT_TABLE, tables)
+                connection.executemany(
+                    _DELETE_PLAYERS, [(table_id,) for table_id in pending])
+                connection.executemany(_INSERT_PLAYER, players)
+                connection.execute("COMMIT")
+            except BaseException:
+                if connection.in_transaction:
+                    connection.execute("ROLLBACK")
+                with self._pending_lock:
+                    # Retried with the next batch, unless saved again since
+                    for table_id, state in pending.items():
+                        self._pending.setdefault(table_id, state)
+                raise
+            finally:
+                with self._pending_lock:
+                    self._flushing = {}
+
+    def close(self) -> None:
+        """Commits what is pending and closes the database."""
+        self._closed = True
+        self._wake.set()
+        self._flusher.join()
+        self.flush()
+        self._connection.close()
+
+    def _flush_loop(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # E.g. locked out by another process for too long. The batch
+                # is kept for the next interval, and the flusher keeps going
+                logger.exception("Could not commit tables to %s", self.path)
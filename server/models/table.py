@@ -1,3 +1,4 @@
+from typing import Callable, Dict
 import uuid
 
 from .action import Action, ActionType
@@ -18,21 +19,12 @@ class TableActionType(ActionType):
 
 
 def next(state: State, action: Action) -> State:
-    if action.type is TableActionType.ADD_PLAYER:
-        return add_player(state, action.player_uuid)
-    if action.type is TableActionType.BUY_IN:
-        return buy_in(state, action.player_uuid, action.amount)
-    if action.type is TableActionType.CASH_OUT:
-        return buy_in(state, action.player_uuid)
-    if action.type is TableActionType.SET_BLINDS:
-        return set_blinds(state, action.blinds)
+    return REDUCERS[action.type](state, action)
 
 
 def add_player(state: State, player_uuid: uuid.UUID) -> State:
-    players = state.players
-    players.append(player_uuid)
-    stacks = state.stacks
-    stacks[player_uuid] = 0
+    players = state.players + (player_uuid,)
+    stacks = state.stacks.set(player_uuid, 0)
     changes = {
         "players": players,
         "stacks": stacks,
@@ -41,16 +33,14 @@ def add_player(state: State, player_uuid: uuid.UUID) -> State:
 
 
 def buy_in(state: State, player_uuid: uuid.UUID, amount: int) -> State:
-    stacks = state.stacks
-    stacks[player_uuid] += amount
+    stacks = state.stacks.set(player_uuid, state.stacks[player_uuid] + amount)
     return State.new_state(state, changes={"stacks": stacks})
 
 
 def cash_out(state: State, player_uuid: uuid.UUID) -> State:
-    players = state.players
-    players.remove(player_uuid)
-    stacks = state.stacks
-    stacks[player_uuid] = 0
+    players = tuple(seated_uuid for seated_uuid in state.players
+                    if seated_uuid != player_uuid)
+    stacks = state.stacks.set(player_uuid, 0)
     changes = {
         "players": players,
         "stacks": stacks,
@@ -60,3 +50,15 @@ def cash_out(state: State, player_uuid: uuid.UUID) -> State:
 
 def set_blinds(state: State, blinds: Blinds) -> State:
     return State.new_state(state, changes={"blinds": blinds})
+
+
+REDUCERS: Dict[TableActionType, Callable[[State, Action], State]] = {
+    TableActionType.ADD_PLAYER: lambda state, action: add_player(
+        state, action.player_uuid),
+    TableActionType.BUY_IN: lambda state, action: buy_in(
+        state, action.player_uuid, action.amount),
+    TableActionType.CASH_OUT: lambda state, action: cash_out(
+        state, action.player_uuid),
+    TableActionType.SET_BLINDS: lambda state, action: set_blinds(
+        state, action.blinds),
+}
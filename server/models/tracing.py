@@ -0,0 +1,184 @@
+import contextlib
+import functools
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+DEFAULT_PROFILE_DIRECTORY = "profiles"
+
+
+class Span(object):
+    """A timed operation, e.g. one reducer call, nested in its parent."""
+
+    __slots__ = ("name", "attributes", "parent", "start", "end")
+
+    name: str
+    attributes: Dict[str, Any]
+    parent: Optional["Span"]
+    start: float  # time.perf_counter() seconds
+    end: Optional[float]
+
+    def __init__(self, name: str, attributes: Dict[str, Any], parent: Optional["Span"]):
+        self.name = name
+        self.attributes = attributes
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.end = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        return None if self.end is None else self.end - self.start
+
+
+class Hook(object):
+    """Receives every span as it begins and ends. Subclasses override
+    either; both run inline, so they should be quick."""
+
+    def begin(self, span: Span) -> None:
+        pass
+
+    def end(self, span: Span) -> None:
+        pass
+
+
+class SpanRecorder(Hook):
+    """Keeps finished spans, e.g. to inspect a few slow requests."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def end(self, span: Span) -> None:
+        self.spans.append(span)
+
+
+# Checked before doing any tracing work, so spans cost nothing without hooks
+hooks: List[Hook] = []
+_local = threading.local()
+
+
+def add_hook(hook: Hook) -> None:
+    hooks.append(hook)
+
+
+def remove_hook(hook: Hook) -> None:
+    hooks.remove(hook)
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """Reports the enclosed block to the hooks as a span (None without
+    hooks), a child of the span it runs in."""
+    if not hooks:
+        yield None
+        return
+    current = Span(name, attributes, getattr(_local, "span", None))
+    _local.span = current
+    for hook in hooks:
+        hook.begin(current)
+    try:
+        yield current
+    finally:
+        current.end = time.perf_counter()
+        _local.span = current.parent
+        for hook in hooks:
+            hook.end(current)
+
+
+def traced(name: str) -> Callable[[Callable], Callable]:
+    """Decorates a function to run in a span of its own when there are
+    hooks."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not hooks:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Profiler(object):
+    """Profiles 1 in `every` requests (0 never) and appends each profile to
+    <directory>/<request name>.folded, in the folded stack format that
+    flamegraph.pl, speedscope and inferno read: one line per call stack
+    with the microseconds spent in its innermost frame.
+
+    Profiled requests run under sys.setprofile and are several times
+    slower; the others pay a counter increment.
+    """
+
+    every: int
+    directory: str
+
+    def __init__(self, every: int = 0, directory: str = DEFAULT_PROFILE_DIRECTORY):
+        self.every = every
+        self.directory = directory
+        self._count = 0
+        self._lock = threading.Lock()  # Requests come from several threads
+
+    def __getstate__(self):
+        # Sent to worker processes without the lock, see __setstate__
+        state = dict(self.__dict__)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def request(self, name: str) -> Iterator[None]:
+        with self._lock:
+            self._count += 1
+            count = self._count
+        if self.every <= 0 or count % self.every:
+            yield
+            return
+        stacks: Dict[str, float] = {}
+        # Start and time spent in children of each frame on the stack
+        frames: List[List[Any]] = []
+        names = [name]
+        clock = time.perf_counter
+
+        def profile(frame, event, arg):
+            if event == "call" or event == "c_call":
+                names.append(_frame_name(frame, event, arg))
+                frames.append([clock(), 0.0])
+            elif frames:
+                start, children = frames.pop()
+                total = clock() - start
+                stack = ";".join(names)
+                names.pop()
+                stacks[stack] = stacks.get(stack, 0.0) + total - children
+                if frames:
+                    frames[-1][1] += total
+
+        start = clock()
+        sys.setprofile(profile)
+        try:
+            yield
+        finally:
+            sys.setprofile(None)
+            # Whatever ran outside any profiled call, e.g. in this block
+            stacks[name] = (clock() - start) - sum(stacks.values())
+            self._dump(name, stacks)
+
+    def _dump(self, name: str, stacks: Dict[str, float]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        microseconds = {stack: round(seconds * 1e6)
+                        for stack, seconds in stacks.items()}
+        lines = [f"{stack} {weight}\n"
+                 for stack, weight in microseconds.items() if weight > 0]
+        with open(os.path.join(self.directory, f"{name}.folded"), "a") as file:
+            # One write, so workers appending at once don't interleave
+            file.write("".join(lines))
+
+
+def _frame_name(frame, event: str, arg) -> str:
+    if event == "c_call":
+        return getattr(arg, "__qualname__", repr(arg))
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
@@ -1,71 +1,239 @@
-from flask import Flask, request
-import json
+from flask import Flask, Response, jsonify, request
+import os
+import threading
+from typing import Any, Dict
 import uuid
 
-from models.poker import Poker
-from models.state import State
+from models import auth
+from models import metrics
+from models.player import LegalActions
+from models.registry import TableNotFound, WorkerPool, _table_id
+from models.serializer import JSON, MSGPACK
+from models.tracing import DEFAULT_PROFILE_DIRECTORY, Profiler
 
 app = Flask(__name__)
-poker = Poker()
+# Actions are logged here so tables survive a restart
+LOG_DIRECTORY = os.environ.get("POKER_LOG_DIRECTORY", "logs")
+# Tables are sharded across this many worker processes
+WORKERS = int(os.environ.get("POKER_WORKERS", os.cpu_count() or 1))
+# Workers profile 1 in this many requests (0 for none) into folded stacks
+PROFILE_EVERY = int(os.environ.get("POKER_PROFILE_EVERY", 0))
+PROFILE_DIRECTORY = os.environ.get(
+    "POKER_PROFILE_DIRECTORY", DEFAULT_PROFILE_DIRECTORY)
+# Tables also save their state to this SQLite database, if set
+STORE_PATH = os.environ.get("POKER_STORE")
+tables = None
+_tables_lock = threading.Lock()
 
+MIMETYPES = {JSON: "application/json", MSGPACK: "application/msgpack"}
 
-@app.route("/state", methods=["GET"])
-def state():
-    return json.dumps(State.to_dict(poker.state))
 
+def get_tables() -> WorkerPool:
+    """Starts the worker pool on first use, so that the spawned workers
+    importing this module don't start pools of their own."""
+    global tables
+    if tables is None:
+        # Concurrent first requests would otherwise each start a pool
+        with _tables_lock:
+            if tables is None:
+                tables = WorkerPool(
+                    WORKERS, LOG_DIRECTORY,
+                    profiler=Profiler(PROFILE_EVERY, PROFILE_DIRECTORY),
+                    store_path=STORE_PATH)
+    return tables
 
-@app.route("/add-player", methods=["POST"])
-def add_player():
+
+def _view(table_id: str) -> Dict[str, Any]:
+    """Whose view of the state to send back (the player whose token is in
+    the Authorization header, see auth; a spectator's without one), as a
+    patch since ?since_version= if given, in ?format= (json or msgpack).
+    See Serializer.encode."""
+    since_version = request.args.get("since_version")
+    return {
+        "viewer": auth.player(
+            _table_id(table_id), request.headers.get("Authorization")),
+        "since_version": None if since_version is None else int(since_version),
+        "format": request.args.get("format", JSON),
+    }
+
+
+def _respond(encoded: bytes) -> Response:
+    return Response(encoded, mimetype=MIMETYPES[request.args.get("format", JSON)])
+
+
+@app.errorhandler(TableNotFound)
+def table_not_found(error):
+    return str(error), 404
+
+
+@app.errorhandler(PermissionError)
+def forbidden(error):
+    return str(error), 403
+
+
+@app.errorhandler(ValueError)
+def bad_request(error):
+    return str(error), 400
+
+
+@app.route("/tables", methods=["POST"])
+def create_table():
+    return get_tables().create_table()
+
+
+@app.route("/tables/<table_id>/state", methods=["GET"])
+def state(table_id):
+    _, table_state = get_tables().call(table_id, **_view(table_id))
+    return _respond(table_state)
+
+
+@app.route("/tables/<table_id>/legal-actions", methods=["GET"])
+def legal_actions(table_id):
+    player_uuid = request.args.get("player_uuid")
+    legal, _ = get_tables().call(
+        table_id, "legal_actions",
+        None if player_uuid is None else uuid.UUID(player_uuid))
+    return jsonify(LegalActions.to_dict(legal))
+
+
+@app.route("/tables/<table_id>/add-player", methods=["POST"])
+def add_player(table_id):
     request_json = request.get_json(force=True)
     name = request_json["name"]
-    return str(poker.add_player(name))
+    player_uuid, _ = get_tables().call(table_id, "add_player", name)
+    return jsonify({
+        "player_uuid": str(player_uuid),
+        "token": auth.issue(_table_id(table_id), player_uuid),
+    })
 
 
-@app.route("/buy-in", methods=["POST"])
-def buy_in():
+@app.route("/tables/<table_id>/buy-in", methods=["POST"])
+def buy_in(table_id):
     request_json = request.get_json(force=True)
     player_uuid = uuid.UUID(request_json["player_uuid"])
     amount = int(request_json["amount"])
-    poker.buy_in(player_uuid, amount)
-    return json.dumps(State.to_dict(poker.state))
+    _, table_state = get_tables().call(
+        table_id, "buy_in", player_uuid, amount, **_view(table_id))
+    return _respond(table_state)
+
+
+@app.route("/tables/<table_id>/start-game", methods=["POST"])
+def start_game(table_id):
+    _, table_state = get_tables().call(table_id, "start_game", **_view(table_id))
+    return _respond(table_state)
+
+
+@app.route("/tables/<table_id>/deal", methods=["POST"])
+def deal(table_id):
+    _, table_state = get_tables().call(table_id, "deal", **_view(table_id))
+    return _respond(table_state)
+
+
+@app.route("/tables/<table_id>/end-round", methods=["POST"])
+def end_round(table_id):
+    _, table_state = get_tables().call(table_id, "end_round", **_view(table_id))
+    return _respond(table_state)
 
 
-@app.route("/start-game", methods=["POST"])
-def start_game():
-    poker.start_game()
-    return json.dumps(State.to_dict(poker.state))
+@app.route("/tables/<table_id>/flop", methods=["POST"])
+def flop(table_id):
+    _, table_state = get_tables().call(table_id, "flop", **_view(table_id))
+    return _respond(table_state)
 
 
-@app.route("/check", methods=["POST"])
-def check():
+@app.route("/tables/<table_id>/turn", methods=["POST"])
+def turn(table_id):
+    _, table_state = get_tables().call(table_id, "turn", **_view(table_id))
+    return _respond(table_state)
+
+
+@app.route("/tables/<table_id>/river", methods=["POST"])
+def river(table_id):
+    _, table_state = get_tables().call(table_id, "river", **_view(table_id))
+    return _respond(table_state)
+
+
+@app.route("/tables/<table_id>/showdown", methods=["POST"])
+def showdown(table_id):
+    _, table_state = get_tables().call(table_id, "showdown", **_view(table_id))
+    return _respond(table_state)
+
+
+@app.route("/tables/<table_id>/check", methods=["POST"])
+def check(table_id):
+    request_json = request.get_json(force=True)
+    player_uuid = uuid.UUID(request_json["player_uuid"])
+    _, table_state = get_tables().call(
+        table_id, "check", player_uuid, **_view(table_id))
+    return _respond(table_state)
+
+
+@app.route("/tables/<table_id>/bet", methods=["POST"])
+def bet(table_id):
+    request_json = request.get_json(force=True)
+    player_uuid = uuid.UUID(request_json["player_uuid"])
+    amount = int(request_json["amount"])
+    _, table_state = get_tables().call(
+        table_id, "bet", player_uuid, amount, **_view(table_id))
+    return _respond(table_state)
+
+
+@app.route("/tables/<table_id>/call", methods=["POST"])
+def call(table_id):
     request_json = request.get_json(force=True)
     player_uuid = uuid.UUID(request_json["player_uuid"])
-    poker.check(player_uuid)
-    return json.dumps(State.to_dict(poker.state))
+    amount = int(request_json["amount"])
+    _, table_state = get_tables().call(
+        table_id, "call", player_uuid, amount, **_view(table_id))
+    return _respond(table_state)
 
 
-@app.route("/bet", methods=["POST"])
-def bet():
+@app.route("/tables/<table_id>/raise", methods=["POST"])
+def raise_bet(table_id):
     request_json = request.get_json(force=True)
     player_uuid = uuid.UUID(request_json["player_uuid"])
     amount = int(request_json["amount"])
-    poker.bet(player_uuid, amount)
-    return json.dumps(State.to_dict(poker.state))
+    _, table_state = get_tables().call(
+        table_id, "raise_bet", player_uuid, amount, **_view(table_id))
+    return _respond(table_state)
 
 
-@app.route("/fold", methods=["POST"])
-def fold():
+@app.route("/tables/<table_id>/fold", methods=["POST"])
+def fold(table_id):
     request_json = request.get_json(force=True)
     player_uuid = uuid.UUID(request_json["player_uuid"])
-    poker.fold(player_uuid)
-    return json.dumps(State.to_dict(poker.state))
+    _, table_state = get_tables().call(
+        table_id, "fold", player_uuid, **_view(table_id))
+    return _respond(table_state)
 
 
-@app.route("/cash-out", methods=["POST"])
-def cash_out():
+@app.route("/tables/<table_id>/cash-out", methods=["POST"])
+def cash_out(table_id):
     request_json = request.get_json(force=True)
     player_uuid = uuid.UUID(request_json["player_uuid"])
-    return poker.cash_out(player_uuid)
+    amount, _ = get_tables().call(table_id, "cash_out", player_uuid)
+    return str(amount)
+
+
+@app.route("/reconcile", methods=["GET"])
+def reconcile():
+    """Open tables whose chip ledger disagrees with their state: (balance,
+    expected chips) of each account that does, see ledger.reconcile."""
+    return jsonify({
+        table_id: {str(account): chips for account, chips in accounts.items()}
+        for table_id, accounts in get_tables().reconcile().items()})
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus metrics of this process and every table worker."""
+    collections = get_tables().metrics() + [metrics.REGISTRY.collect()]
+    return Response(metrics.render(collections), content_type=metrics.CONTENT_TYPE)
+
+
+for endpoint, view in list(app.view_functions.items()):
+    app.view_functions[endpoint] = metrics.timed(
+        metrics.REQUEST_SECONDS, endpoint, view)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,29 @@
+from concurrent.futures import ThreadPoolExecutor
+import uuid
+
+import pytest
+
+from models.actor import TableActor
+from models.player import IllegalAction
+from models.poker import Poker
+
+
+def test_actor_serializes_actions():
+    with ThreadPoolExecutor(4) as executor:
+        actor = TableActor(Poker(), executor)
+
+        def seat(name):
+            player_uuid = actor.ask("add_player", name).result()
+            actor.ask("buy_in", player_uuid, 100).result()
+            # Whatever else ran meanwhile, a snapshot is a whole state
+            state = actor.state
+            bought_in = sum(1 for chips in state.stacks.values() if chips)
+            assert state.version == len(state.players) + bought_in
+        with ThreadPoolExecutor(8) as clients:
+            list(clients.map(seat, [f"player {i}" for i in range(40)]))
+
+        with pytest.raises(IllegalAction):
+            actor.ask("check", uuid.uuid4()).result()
+
+    assert actor.state.version == 80
+    assert sorted(actor.state.stacks.values()) == [100] * 40
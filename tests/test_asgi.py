@@ -0,0 +1,142 @@
+import asyncio
+import json
+import uuid
+
+import pytest
+
+from asgi import App
+from models import metrics
+from models.registry import WorkerPool
+
+
+@pytest.fixture(scope="module")
+def tables():
+    pool = WorkerPool(1)
+    yield pool
+    pool.close()
+
+
+async def _request(app, method, path, body=None, token=None):
+    messages = [{"type": "http.request",
+                 "body": b"" if body is None else json.dumps(body).encode()}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    path, _, query = path.partition("?")
+    headers = [] if token is None else [(b"authorization", f"Bearer {token}".encode())]
+    await app({"type": "http", "method": method, "path": path,
+               "query_string": query.encode(), "headers": headers}, receive, send)
+    return sent[0]["status"], sent[1]["body"]
+
+
+def test_http(tables):
+    async def run():
+        app = App(tables)
+        status, table_id = await _request(app, "POST", "/tables")
+        assert status == 200
+        table_id = table_id.decode()
+        status, seated = await _request(
+            app, "POST", f"/tables/{table_id}/add-player", {"name": "first"})
+        assert status == 200
+        status, state = await _request(app, "GET", f"/tables/{table_id}/state")
+        assert status == 200
+        assert json.loads(state)["players"] == [json.loads(seated)["player_uuid"]]
+
+        assert (await _request(app, "GET", "/tables/nope/state"))[0] == 404
+        assert (await _request(app, "POST", f"/tables/{table_id}/buy-in",
+                               {"amount": 100}))[0] == 400
+        assert (await _request(app, "POST", f"/tables/{table_id}/add-player",
+                               ["first"]))[0] == 400
+    asyncio.run(run())
+
+
+def test_metrics(tables):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(App(tables)({"type": "http", "method": "GET", "path": "/metrics",
+                             "query_string": b""}, receive, send))
+    assert sent[0]["headers"] == [(b"content-type", metrics.CONTENT_TYPE.encode())]
+    assert b"# TYPE http_request_seconds histogram" in sent[1]["body"]
+
+
+def test_websocket_push(tables):
+    async def run():
+        app = App(tables)
+        _, table_id = await _request(app, "POST", "/tables")
+        # Another spelling of the same id still gets the pushes
+        spelled = str(uuid.UUID(table_id.decode())).upper()
+        incoming = asyncio.Queue()
+        frames = asyncio.Queue()
+        await incoming.put({"type": "websocket.connect"})
+        socket = asyncio.create_task(app(
+            {"type": "websocket", "path": f"/tables/{spelled}/ws",
+             "query_string": b""}, incoming.get, frames.put))
+        assert (await frames.get())["type"] == "websocket.accept"
+        assert json.loads((await frames.get())["text"])["players"] == []
+
+        await _request(app, "POST", f"/tables/{table_id.decode()}/add-player",
+                       {"name": "first"})
+        pushed = json.loads((await asyncio.wait_for(frames.get(), 5))["text"])
+        assert pushed["since_version"] == 0
+        assert any(operation["path"] == "/players" for operation in pushed["patch"])
+
+        await incoming.put({"type": "websocket.disconnect"})
+        await socket
+        assert not app.sockets
+
+        # A push that fails doesn't fail the action that went through
+        async def unreachable(message):
+            raise AssertionError("Nothing can be sent in this format")
+        app.sockets[table_id.decode()][unreachable] = (None, 0, "unknown")
+        status, _ = await _request(
+            app, "POST", f"/tables/{table_id.decode()}/add-player", {"name": "second"})
+        assert status == 200
+    asyncio.run(run())
+
+
+def test_only_players_see_their_holes(tables):
+    async def run():
+        app = App(tables)
+        _, table_id = await _request(app, "POST", "/tables")
+        table = f"/tables/{table_id.decode()}"
+        first, second = [json.loads((await _request(
+            app, "POST", f"{table}/add-player", {"name": name}))[1])
+            for name in ("first", "second")]
+        for seated in (first, second):
+            await _request(app, "POST", f"{table}/buy-in",
+                           {"player_uuid": seated["player_uuid"], "amount": 100})
+        await _request(app, "POST", f"{table}/start-game")
+        await _request(app, "POST", f"{table}/deal")
+
+        async def holes(path, token=None):
+            status, state = await _request(app, "GET", path, token=token)
+            return json.loads(state)["holes"] if status == 200 else status
+
+        # Naming a player isn't enough to see their cards
+        outsider = await holes(f"{table}/state?player_uuid={first['player_uuid']}")
+        assert set(outsider) == {first["player_uuid"], second["player_uuid"]}
+        assert all(hole is None for hole in outsider.values())
+        own = await holes(f"{table}/state", first["token"])
+        assert len(own[first["player_uuid"]]) == 2
+        assert own[second["player_uuid"]] is None
+
+        forged = first["player_uuid"] + "." + second["token"].partition(".")[2]
+        assert await holes(f"{table}/state", forged) == 403
+        _, other = await _request(app, "POST", "/tables")
+        _, elsewhere = await _request(
+            app, "POST", f"/tables/{other.decode()}/add-player", {"name": "first"})
+        assert await holes(f"{table}/state", json.loads(elsewhere)["token"]) == 403
+        assert (await _request(app, "POST", f"{table}/check",
+                               {"player_uuid": first["player_uuid"]}, forged))[0] == 403
+    asyncio.run(run())
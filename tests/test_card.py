@@ -0,0 +1,28 @@
+import pickle
+
+from models.card import CARDS, Card, CardSuit, CardValue, NUM_CARDS, encode
+
+
+def test_codes():
+    assert NUM_CARDS == 52
+    for code in range(NUM_CARDS):
+        card = Card.from_code(code)
+        assert card.code == code
+        assert card.rank == code // 4 + 2
+        assert card.suit_index == code % 4
+        assert encode(card.value, card.suit) == code
+    assert Card(CardValue.TWO, CardSuit.CLUBS).code == 0
+    assert Card(CardValue.ACE, CardSuit.SPADES).code == 51
+
+
+def test_interned():
+    for spelling in ((CardValue.ACE, CardSuit.HEARTS), (14, "h"),
+                     ("A", "hearts"), (CardValue.ACE, "h")):
+        assert Card(*spelling) is Card.from_code(encode(CardValue.ACE, CardSuit.HEARTS))
+    assert all(Card.from_code(card.code) is card for card in CARDS)
+
+
+def test_pickle_round_trip():
+    assert pickle.loads(pickle.dumps(CARDS)) == CARDS
+    for card in CARDS:
+        assert pickle.loads(pickle.dumps(card)) is card
@@ -0,0 +1,25 @@
+from benchmarks.corpus import random_hands, stratified_hands
+from models.evaluator import evaluate_cards, hand_type
+from models.hand import HandType, determine_hand
+
+
+def test_random_hands_are_seeded():
+    def codes(hands):
+        # Cards compare by rank alone, so the suits need their codes
+        return [[card.code for card in hand] for hand in hands]
+
+    hands = random_hands(50, 7)
+    assert codes(hands) == codes(random_hands(50, 7))
+    assert codes(hands) != codes(random_hands(50, 7, seed=1))
+    assert all(len({card.code for card in hand}) == 7 for hand in hands)
+
+
+def test_stratified_hands_agree_across_evaluators():
+    hands = stratified_hands(40)
+    assert set(hands) == set(HandType) - {HandType.UNSET}
+    for type, type_hands in hands.items():
+        assert len(type_hands) == 40
+        for cards in type_hands:
+            assert len({card.code for card in cards}) == 7
+            assert hand_type(evaluate_cards(cards)) is type
+            assert determine_hand(cards[:2], cards[2:]).type is type
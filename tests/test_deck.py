@@ -0,0 +1,90 @@
+import copy
+import timeit
+
+import pytest
+
+from models.card import CARDS, NUM_CARDS
+from models.deck import Deck
+
+
+def _codes(cards):
+    # Cards compare by rank alone, so the suits need their codes
+    return [card.code for card in cards]
+
+
+def test_draw_stops_at_end():
+    deck = Deck(seed=1)
+    deck.remove(deck.cards[-2:])
+    assert len(deck.draw(45)) == 45
+    assert len(deck.draw(10)) == 5
+    assert deck.draw() == []
+    assert len(deck) == 0
+
+
+def test_remove():
+    deck = Deck(seed=1)
+    drawn = deck.draw(2)
+    dead = deck.cards[10:13]
+    deck.remove(dead)
+    assert len(deck) == NUM_CARDS - 5
+    assert not set(_codes(dead)) & set(_codes(deck))
+    with pytest.raises(ValueError):
+        deck.remove(dead[:1])
+    with pytest.raises(ValueError):
+        deck.remove(drawn[:1])
+
+    deck.reset()
+    assert sorted(_codes(deck)) == _codes(CARDS)
+
+
+def test_reset_is_seeded():
+    deck = Deck()
+    deck.draw(5)
+    deck.reset(7)
+    order = _codes(deck)
+    deck.remove(deck.cards[:3])
+    deck.reset(7)
+    assert _codes(deck) == order == _codes(Deck(seed=7))
+    deck.reset(8)
+    assert _codes(deck) != order
+
+
+def test_reset_refills_owned_cards_in_place():
+    deck = Deck(seed=1)
+    cards = deck.cards
+    deck.reset(2)
+    assert deck.cards is cards
+
+    shared = copy.copy(deck)
+    deck.reset(2)
+    assert deck.cards is not cards
+    assert shared.cards is cards
+    assert _codes(shared) == _codes(deck)
+
+
+def test_copies_are_independent():
+    deck = Deck(seed=1)
+    deck.draw(3)
+    other = copy.copy(deck)
+    assert other.cards is deck.cards
+    order = _codes(deck)
+
+    other.shuffle()
+    assert _codes(deck) == order
+    assert len(other) == NUM_CARDS
+    other.draw(4)
+    assert len(deck) == NUM_CARDS - 3
+
+    # Both shuffle the same way, whichever shuffles first
+    again = copy.copy(deck)
+    deck.shuffle()
+    again.shuffle()
+    assert _codes(again) == _codes(deck)
+
+
+def test_copying_is_cheaper_than_shuffling():
+    # A copy per state transition: it mustn't set up a generator of its own
+    deck = Deck(seed=1)
+    copying = min(timeit.repeat(lambda: copy.copy(deck), number=1000, repeat=5))
+    shuffling = min(timeit.repeat(deck.shuffle, number=1000, repeat=5))
+    assert copying < shuffling / 2
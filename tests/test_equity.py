@@ -0,0 +1,45 @@
+import pytest
+
+from models.card import *
+from models.equity import *
+
+aces = [Card("A", "s"), Card("A", "h")]
+kings = [Card("K", "s"), Card("K", "h")]
+suited = [Card("Q", "d"), Card("J", "d")]
+flop = [Card(2, "d"), Card(7, "d"), Card("K", "c")]
+
+
+def test_equity_sums_to_one():
+    results = equity([aces, kings, suited], flop, samples=5000, workers=1, seed=1)
+    assert sum(result.equity for result in results) == pytest.approx(1.0)
+    assert results[1].equity > results[2].equity > results[0].equity
+
+
+def test_equity_is_seeded():
+    first = equity([aces, kings], samples=2000, workers=1, seed=7)
+    second = equity([aces, kings], samples=2000, workers=1, seed=7)
+    assert [result.equity for result in first] == [result.equity for result in second]
+    low, high = first[0].interval
+    assert low < 0.82 < high
+
+
+def test_equity_rejects_duplicates():
+    with pytest.raises(ValueError):
+        equity([aces, aces])
+
+
+def test_exact_equity():
+    results = exact_equity([aces, kings, suited], flop)
+    assert sum(result.equity for result in results) == pytest.approx(1.0)
+    assert all(result.samples == 903 and result.error == 0 for result in results)
+    # Memoized regardless of card order
+    reordered = exact_equity([aces[::-1], kings, suited], flop[::-1])
+    assert [result.equity for result in reordered] == [result.equity for result in results]
+    # Each call gets its own results, so changing one leaves the cache alone
+    results[0].equity = 2.0
+    assert exact_equity([aces, kings, suited], flop)[0].equity < 1.0
+
+
+def test_exact_equity_needs_flop():
+    with pytest.raises(ValueError):
+        exact_equity([aces, kings], flop[:2])
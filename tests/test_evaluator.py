@@ -0,0 +1,81 @@
+from models.card import *
+from models.evaluator import *
+from models.hand import *
+
+s2 = Card(2, "s")
+s3 = Card(3, "s")
+d3 = Card(3, "d")
+s4 = Card(4, "s")
+d4 = Card(4, "d")
+s5 = Card(5, "s")
+s6 = Card(6, "s")
+d6 = Card(6, "d")
+h6 = Card(6, "h")
+s7 = Card(7, "s")
+s8 = Card(8, "s")
+d9 = Card(9, "d")
+sa = Card("A", "s")
+da = Card("A", "d")
+
+
+def test_hand_types():
+    assert hand_type(evaluate_cards([d9, s5, d4, s3, s2])) is HandType.HIGH_CARD
+    assert hand_type(evaluate_cards([s3, d3, s5, d4, s2])) is HandType.PAIR
+    assert hand_type(evaluate_cards([s6, d6, s3, d3, s2])) is HandType.TWO_PAIR
+    assert hand_type(evaluate_cards([s6, d6, h6, d3, s2])) is HandType.THREE_OF_A_KIND
+    assert hand_type(evaluate_cards([s6, s5, d4, s3, s2])) is HandType.STRAIGHT
+    assert hand_type(evaluate_cards([s8, s7, s6, s5, s3])) is HandType.FLUSH
+    assert hand_type(evaluate_cards([s6, d6, h6, d3, s3])) is HandType.FULL_HOUSE
+    assert hand_type(evaluate_cards([s6, s5, s4, s3, s2])) is HandType.STRAIGHT_FLUSH
+
+
+def test_ordering():
+    low_pair_low_kicker = evaluate_cards([s3, d3, s5, d4, s2])
+    low_pair_high_kicker = evaluate_cards([s3, d3, s7, d4, s2])
+    high_pair = evaluate_cards([s6, d6, s7, d4, s2])
+    assert low_pair_low_kicker < low_pair_high_kicker < high_pair
+
+    wheel = evaluate_cards([sa, s2, d3, s4, s5])
+    six_high = evaluate_cards([s6, s5, d4, s3, s2])
+    assert hand_type(wheel) is HandType.STRAIGHT
+    assert wheel < six_high
+
+
+def test_best_five_of_seven():
+    strength = evaluate_cards([d9, s8, s6, d6, s5, d4, s4])
+    assert strength == evaluate_cards([s6, d6, s4, d4, d9])
+    assert strength > evaluate_cards([s6, d6, s4, d4, s8])
+
+
+def test_to_hand():
+    hand = to_hand([d9, s8, s6, d6, s5, d4, s4])
+    assert hand.type is HandType.TWO_PAIR
+    assert [card.rank for card in hand.type_cards] == [6, 6, 4, 4]
+    assert hand.other_cards[0] is d9
+
+    hand = to_hand([da, s2, d3, s4, s5, s7, d9])
+    assert hand.type is HandType.STRAIGHT
+    assert [card.rank for card in hand.type_cards] == [5, 4, 3, 2, 14]
+
+
+def test_evaluate_many():
+    hands = [
+        [d9, s8, s6, d6, s5, d4, s4],
+        [s6, s5, s4, s3, s2, d9, da],
+        [sa, s2, d3, s4, s5, s7, d9],
+    ]
+    holes = [[card.code for card in hand[:2]] for hand in hands]
+    boards = [[card.code for card in hand[2:]] for hand in hands]
+    strengths, types = evaluate_many(holes, boards)
+    assert list(strengths) == [evaluate_cards(hand) for hand in hands]
+    assert [HandType(type) for type in types] == [
+        HandType.TWO_PAIR, HandType.STRAIGHT_FLUSH, HandType.FLUSH]
+
+
+def test_board_evaluator():
+    flop = BoardEvaluator([s8, s6, d6])
+    river = flop.extend([s5]).extend([d4])
+    assert river.codes == BoardEvaluator([s8, s6, d6, s5, d4]).codes
+    assert river.evaluate([d9, s4]) == evaluate_cards([d9, s4, s8, s6, d6, s5, d4])
+    assert hand_type(river.evaluate([s7, s4])) is HandType.STRAIGHT_FLUSH
+    assert river.to_hand([d9, s4]).type is HandType.TWO_PAIR
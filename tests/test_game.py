@@ -0,0 +1,74 @@
+import pytest
+
+from models.equity import enumerated_equity
+from models.poker import Poker
+
+
+def _all_in_preflop(players=2):
+    poker = Poker()
+    seats = [poker.add_player(f"player {seat}") for seat in range(players)]
+    for player_uuid in seats:
+        poker.buy_in(player_uuid, 100)
+    poker.start_game(seed=1)
+    poker.deal()
+    return poker
+
+
+def test_run_it_validates_times():
+    poker = _all_in_preflop()
+    with pytest.raises(ValueError):
+        poker.run_it(0)
+    # 48 cards left: nine runouts of five take 45, ten would take 50
+    with pytest.raises(ValueError):
+        poker.run_it(10)
+    poker.run_it(9)
+    assert len(poker.state.runouts) == 9
+
+
+def test_run_it_updates_board_evaluator():
+    poker = _all_in_preflop()
+    poker.run_it(2)
+    state = poker.state
+    assert len(state.board) == 5
+    assert list(state.board_evaluator.codes) == [card.code for card in state.board]
+
+
+def test_settle_equity_preflop_is_exact():
+    poker = _all_in_preflop()
+    state = poker.state
+    holes = [state.holes[player_uuid] for player_uuid in state.in_play]
+    exact = enumerated_equity(holes)
+    assert exact[0].samples == 1712304
+    poker.settle_equity()
+    won = [poker.state.stacks[player_uuid] - state.stacks[player_uuid]
+           for player_uuid in state.in_play]
+    assert sum(won) == state.pot
+    for chips, result in zip(won, exact):
+        assert abs(chips - state.pot * result.equity) < 1
+
+
+def test_settle_equity_pays_given_shares():
+    poker = _all_in_preflop()
+    state = poker.state
+    with pytest.raises(ValueError):
+        poker.settle_equity([state.pot, 1])
+    small, big = state.in_play
+    assert list(poker.settle_equity([state.pot, 0])) == [small]
+    assert poker.state.stacks[small] == state.stacks[small] + state.pot
+
+
+def test_short_stacks_post_blinds_all_in():
+    poker = Poker()
+    seats = [poker.add_player(f"player {seat}") for seat in range(2)]
+    # Both short of the big blind, one of the small blind too
+    for player_uuid, chips in zip(seats, (3, 7)):
+        poker.buy_in(player_uuid, chips)
+    before = poker.state.stacks
+    poker.start_game(seed=1)
+    state = poker.state
+    small, big = state.in_play
+    assert state.bets == {small: min(state.blinds.small, before[small]),
+                          big: before[big]}
+    assert state.pot == sum(state.bets.values())
+    assert {player_uuid: before[player_uuid] - state.bets[player_uuid]
+            for player_uuid in seats} == state.stacks
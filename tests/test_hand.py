@@ -56,3 +56,17 @@ poker.fold(austin)
 poker.state.stacks
 poker.state.bets
 poker.state.pot
+
+
+def test_compare():
+    assert high_card < low_pair_low_kicker < low_pair_high_kicker < high_pair_high_kicker
+    assert two_pair > high_pair_high_kicker
+    assert low_straight < high_straight < flush
+    assert hand == Hand(HandType.TWO_PAIR, [s6, d6, s4, d4], [d9, s8, s5])
+    assert hash(hand) == hash(Hand(HandType.TWO_PAIR, [s6, d6, s4, d4], [d9]))
+
+
+def test_rank_hands():
+    tied = Hand(HandType.PAIR, [s3, d3], [s7, d4, s2])
+    groups = rank_hands([low_pair_high_kicker, flush, high_card, tied])
+    assert groups == [[flush], [low_pair_high_kicker, tied], [high_card]]
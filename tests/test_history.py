@@ -0,0 +1,54 @@
+import random
+
+from models.history import HandHistory
+from models.player import PlayerActionType
+from models.poker import Poker
+from models.simulator import POLICIES, play_hand
+
+
+def _play(poker, hands):
+    players = [poker.add_player(name) for name in ("first", "second", "third")]
+    for player_uuid in players:
+        poker.buy_in(player_uuid, 100000)
+    rng = random.Random(1)
+    seats = {player_uuid: seat for seat, player_uuid in enumerate(players)}
+    policies = [POLICIES["tight"], POLICIES["random"], POLICIES["call_station"]]
+    states = []
+    for _ in range(hands):
+        play_hand(poker, policies, seats, rng)
+        states.append(poker.state)
+    return players, states
+
+
+def test_record_and_query(tmp_path):
+    history = HandHistory(str(tmp_path), heads_interval=7)
+    poker = Poker(history=history)
+    players, states = _play(poker, 20)
+    assert len(history) == 20
+
+    records = list(history.hands())
+    assert [record.hand_id for record in records] == list(range(20))
+    for record, state in zip(records, states):
+        assert record.players == state.players
+        assert record.winners == state.winners
+        assert record.pot == state.pot
+        assert [card.code for card in record.board] == [
+            card.code for card in state.board]
+        assert all(len(hole) == 2 for hole in record.holes.values())
+        assert all(type(type_) is PlayerActionType
+                   for _, _, type_, _ in record.actions)
+    assert history.hand(5).actions == records[5].actions
+    assert list(history.player_hand_ids(players[1])) == list(range(19, -1, -1))
+    later = [record.hand_id for record in history.between(records[10].timestamp)]
+    assert later[0] <= 10 and later[-1] == 19
+    assert list(history.between(end=records[0].timestamp)) == []
+    history.close()
+
+    # Reopened, with a hand torn mid-write and stale heads
+    with open(tmp_path / "hands.dat", "ab") as file:
+        file.write(b"\x10\x00")
+    reopened = HandHistory(str(tmp_path))
+    assert len(reopened) == 20
+    assert list(reopened.player_hand_ids(players[0]))[0] == 19
+    assert reopened.hand(19).winners == states[-1].winners
+    reopened.close()
@@ -0,0 +1,57 @@
+import random
+
+from models.ledger import CASHIER, POT, ChipLedger, EntryKind, reconcile
+from models.log import ActionLog
+from models.poker import Poker
+from models.registry import WorkerPool
+from models.simulator import POLICIES, play_hand
+
+
+def _open(directory):
+    return Poker(ActionLog(directory), ledger=ChipLedger(directory, batch_size=8))
+
+
+def test_ledger_balances(tmp_path):
+    poker = _open(str(tmp_path))
+    players = [poker.add_player(name) for name in ("first", "second", "third")]
+    for player_uuid in players:
+        poker.buy_in(player_uuid, 1000)
+    rng = random.Random(2)
+    seats = {player_uuid: seat for seat, player_uuid in enumerate(players)}
+    policies = [POLICIES["random"], POLICIES["call_station"], POLICIES["tight"]]
+    for _ in range(30):
+        play_hand(poker, policies, seats, rng)
+        assert reconcile(poker.ledger, poker.state) == {}
+    # A split of the 15 chips of blinds: the first winner gets the odd chip
+    poker.start_game()
+    poker.end_game(players[:2])
+    awards = [entry.amount for entry in poker.ledger.entries()
+              if entry.kind is EntryKind.AWARD][-2:]
+    assert awards == [8, 7]
+    poker.cash_out(players[0])
+
+    ledger = poker.ledger
+    assert sum(ledger.balances.values()) == 0
+    assert ledger.balance(CASHIER) == -sum(poker.state.stacks.values())
+    assert ledger.balance(POT) == 0
+    assert reconcile(ledger, poker.state) == {}
+
+    # The cash-out's entries are still buffered, as if the process had died
+    # here: they are posted again from the action log
+    written = ChipLedger(str(tmp_path))
+    assert written.version < poker.log.version
+    written.close()
+    recovered = _open(str(tmp_path))
+    assert recovered.ledger.version == poker.log.version
+    assert recovered.ledger.balances == ledger.balances
+
+
+def test_worker_pool_reconciles(tmp_path):
+    pool = WorkerPool(1, str(tmp_path))
+    try:
+        table_id = pool.create_table()
+        player_uuid, _ = pool.call(table_id, "add_player", "first")
+        pool.call(table_id, "buy_in", player_uuid, 100)
+        assert pool.reconcile() == {}
+    finally:
+        pool.close()
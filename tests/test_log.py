@@ -0,0 +1,49 @@
+import uuid
+
+from models.blinds import Blinds
+from models.game import GameActionType
+from models.log import ActionLog, decode_action, encode_action
+from models.action import Action
+from models.poker import Poker
+from models.state import State
+
+
+def test_encode_action():
+    winners = [uuid.uuid4(), uuid.uuid4()]
+    action = decode_action(encode_action(Action(
+        GameActionType.END_GAME, winners=winners)))
+    assert action.type is GameActionType.END_GAME
+    assert action.winners == winners
+
+    action = decode_action(encode_action(Action(
+        GameActionType.START_GAME, blinds=Blinds(1, 2), seed=2 ** 64 - 1)))
+    assert Blinds.to_dict(action.blinds) == {"small": 1, "big": 2}
+    assert action.seed == 2 ** 64 - 1
+
+    action = decode_action(encode_action(Action(
+        GameActionType.SETTLE_EQUITY, shares=[0, 17, 2 ** 40])))
+    assert action.shares == [0, 17, 2 ** 40]
+
+
+def test_recover_and_replay(tmp_path):
+    poker = Poker(ActionLog(str(tmp_path), snapshot_interval=4))
+    players = [poker.add_player(name) for name in ("first", "second")]
+    for player_uuid in players:
+        poker.buy_in(player_uuid, 100)
+    states = [poker.state]
+    for _ in range(3):
+        poker.start_game()
+        poker.deal()
+        poker.flop()
+        poker.river()
+        poker.showdown()
+        states.append(poker.state)
+    poker.log.close()
+
+    recovered = Poker(ActionLog(str(tmp_path), snapshot_interval=4))
+    assert recovered.log.version == 19
+    assert State.to_dict(recovered.state) == State.to_dict(poker.state)
+    replayed = [state for version, _, state in recovered.replay(4)
+                if (version - 4) % 5 == 0]
+    assert ([State.to_dict(state) for state in replayed]
+            == [State.to_dict(state) for state in states[1:]])
@@ -0,0 +1,61 @@
+import time
+
+from models import metrics
+from models.poker import ACTIONS, METHOD_SECONDS, Poker
+from models.registry import READS
+
+
+def test_render_merges_collections():
+    histogram = metrics.Histogram("latency", "Latency", "method", (0.1, 1.0))
+    histogram.observe(0.05, "bet")
+    histogram.observe(0.5, "bet")
+    histogram.child("fold")
+    counter = metrics.Counter("calls", "Calls", "kind", ("a", "b"))
+    counter.inc("b")
+    collection = [histogram.collect(), counter.collect()]
+
+    assert metrics.render([collection, collection]).splitlines() == [
+        "# HELP latency Latency",
+        "# TYPE latency histogram",
+        'latency_bucket{method="bet",le="0.1"} 2',
+        'latency_bucket{method="bet",le="1"} 4',
+        'latency_bucket{method="bet",le="+Inf"} 4',
+        'latency_sum{method="bet"} 1.1',
+        'latency_count{method="bet"} 4',
+        "# HELP calls Calls",
+        "# TYPE calls counter",
+        'calls{kind="a"} 0',
+        'calls{kind="b"} 2',
+    ]
+
+
+def test_generators_are_timed_as_iterated():
+    histogram = metrics.Histogram("latency", "Latency", "method")
+
+    def slow(items):
+        for item in range(items):
+            time.sleep(0.01)
+            yield item
+
+    timed = metrics.timed(histogram, "slow", slow)
+    assert list(timed(3)) == [0, 1, 2]
+    child = histogram.child("slow")
+    assert sum(child.counts) == 1 and child.sum >= 0.03
+    # Time spent by the consumer doesn't count
+    for _ in timed(1):
+        time.sleep(0.05)
+    assert sum(child.counts) == 2 and child.sum < 0.08
+
+
+def test_poker_is_instrumented():
+    calls = METHOD_SECONDS.child("add_player").counts[:]
+    poker = Poker()
+    poker.add_player("first")
+    assert sum(METHOD_SECONDS.child("add_player").counts) == sum(calls) + 1
+    # Reads served from a snapshot count as the methods they stand in for
+    calls = sum(METHOD_SECONDS.child("legal_actions").counts)
+    legal = READS["legal_actions"](poker, poker.state)
+    assert sum(METHOD_SECONDS.child("legal_actions").counts) == calls + 1
+    # And share the table's cache
+    assert poker.legal_actions() is legal
+    assert 'type="ADD_PLAYER"' in metrics.render([[ACTIONS.collect()]])
@@ -0,0 +1,41 @@
+import pytest
+
+from models.player import IllegalAction, PlayerActionType
+from models.poker import Poker
+
+
+def test_legal_actions():
+    poker = Poker()
+    players = [poker.add_player(name) for name in ("first", "second", "third")]
+    for player_uuid in players:
+        poker.buy_in(player_uuid, 100)
+    assert poker.legal_actions().types == frozenset()
+    poker.start_game()
+    poker.deal()
+    small, big, dealer = poker.state.in_play
+
+    legal = poker.legal_actions()
+    assert legal.player_uuid == dealer
+    assert legal.types == {PlayerActionType.FOLD, PlayerActionType.CALL,
+                           PlayerActionType.RAISE}
+    assert (legal.to_call, legal.min_amount, legal.max_amount) == (10, 20, 100)
+    assert poker.legal_actions() is legal
+    assert poker.legal_actions(small).types == {PlayerActionType.FOLD}
+    with pytest.raises(IllegalAction):
+        poker.check(dealer)
+    with pytest.raises(IllegalAction):
+        poker.raise_bet(dealer, 15)
+
+    poker.raise_bet(dealer, 30)
+    legal = poker.legal_actions()
+    assert legal.player_uuid == small
+    assert (legal.to_call, legal.min_amount) == (25, 45)
+    poker.fold(small)
+    poker.call(big, 20)
+    poker.end_round()
+    poker.flop()
+    legal = poker.legal_actions()
+    assert legal.player_uuid == big
+    assert legal.types == {PlayerActionType.FOLD, PlayerActionType.CHECK,
+                           PlayerActionType.BET}
+    assert legal.min_amount == 10
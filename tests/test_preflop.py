@@ -0,0 +1,26 @@
+import pytest
+
+from models.card import *
+from models.preflop import *
+
+aces = [Card("A", "s"), Card("A", "h")]
+kings = [Card("K", "s"), Card("K", "h")]
+big_slick = [Card("K", "d"), Card("A", "d")]
+seven_deuce = [Card(7, "c"), Card(2, "h")]
+
+
+def test_hand_class():
+    assert CLASS_NAMES[hand_class(aces)] == "AA"
+    assert CLASS_NAMES[hand_class(big_slick)] == "AKs"
+    assert CLASS_NAMES[hand_class(seven_deuce)] == "72o"
+    assert class_index("TT") == hand_class([Card(10, "s"), Card(10, "d")])
+    assert len(set(CLASS_NAMES)) == NUM_CLASSES
+    assert sum(len(class_combos(index)) for index in range(NUM_CLASSES)) == 1326
+
+
+def test_table():
+    preflop = table()
+    assert preflop.equity(aces, kings) == pytest.approx(0.82, abs=0.02)
+    assert preflop.equity(aces, kings) + preflop.equity(kings, aces) == pytest.approx(1.0)
+    assert preflop.equity_vs_random(aces) > preflop.equity_vs_random(aces, 9)
+    assert sum(preflop.multiway([aces, kings, seven_deuce])) == pytest.approx(1.0)
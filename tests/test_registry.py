@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+import uuid
+
+import pytest
+
+from models.registry import HashRing, TableManager, TableNotFound, WorkerPool
+
+
+def test_hash_ring_moves_few_keys():
+    keys = [uuid.uuid4().hex for _ in range(2000)]
+    ring = HashRing(range(4))
+    before = {key: ring.node(key) for key in keys}
+    assert set(before.values()) == {0, 1, 2, 3}
+
+    ring.add(4)
+    moved = [key for key in keys if ring.node(key) != before[key]]
+    assert all(ring.node(key) == 4 for key in moved)
+    assert len(moved) < len(keys) / 3
+
+
+def test_table_manager(tmp_path):
+    manager = TableManager(str(tmp_path))
+    table_id = manager.create()
+    manager.get(table_id).add_player("first")
+    with pytest.raises(TableNotFound):
+        manager.get(uuid.uuid4().hex)
+    with pytest.raises(TableNotFound):
+        manager.get("../outside")
+
+    manager.remove(table_id)
+    assert table_id not in manager
+    assert len(TableManager(str(tmp_path)).get(table_id).state.players) == 1
+
+
+def test_worker_pool_routes_responses():
+    pool = WorkerPool(2)
+    try:
+        # Many threads waiting on each worker at once: each gets its own answer
+        table_ids = [uuid.uuid4().hex for _ in range(200)]
+        with ThreadPoolExecutor(16) as threads:
+            assert list(threads.map(pool.create_table, table_ids)) == table_ids
+
+        pool._processes[0].kill()
+        pool._receivers[0].join(10)
+        worker_0 = next(table_id for table_id in table_ids
+                        if pool.ring.node(table_id) == 0)
+        with pytest.raises(ConnectionError):
+            pool.call(worker_0)
+    finally:
+        pool.close()
+
+
+def test_worker_pool_settles_equity():
+    pool = WorkerPool(1)
+    try:
+        table_id = pool.create_table(uuid.uuid4().hex)
+        seats = [pool.call(table_id, "add_player", name)[0]
+                 for name in ("first", "second")]
+        for player_uuid in seats:
+            pool.call(table_id, "buy_in", player_uuid, 100)
+        pool.call(table_id, "start_game")
+        pool.call(table_id, "deal")
+        # Shares worked out off the table's actor, then paid on it
+        winners, _ = pool.call(table_id, "settle_equity")
+        assert winners
+        assert pool.reconcile() == {}
+    finally:
+        pool.close()
@@ -0,0 +1,48 @@
+import json
+
+from models.poker import Poker
+from models.serializer import Serializer, view
+
+
+def _poker():
+    poker = Poker()
+    players = [poker.add_player(name) for name in ("first", "second", "third")]
+    for player_uuid in players:
+        poker.buy_in(player_uuid, 100)
+    poker.start_game()
+    poker.deal()
+    return poker, players
+
+
+def test_view_hides_other_holes():
+    poker, (first, second, third) = _poker()
+    holes = view(poker.state, first)["holes"]
+    assert holes[str(first)] == [card.code for card in poker.state.holes[first]]
+    assert holes[str(second)] is None
+    assert all(hole is None for hole in view(poker.state)["holes"].values())
+
+    poker.fold(poker.state.in_play[0])
+    poker.flop()
+    poker.river()
+    poker.showdown()
+    holes = view(poker.state)["holes"]
+    assert [player_uuid for player_uuid, hole in holes.items()
+            if hole is not None] == [str(id) for id in poker.state.in_play]
+    assert view(poker.state)["board"] == [card.code for card in poker.state.board]
+
+
+def test_encode_is_cached_per_view():
+    poker, (first, second, _) = _poker()
+    serializer = Serializer()
+    encoded = serializer.encode(poker.state, first)
+    assert serializer.encode(poker.state, first) is encoded
+    assert serializer.encode(poker.state, second) != encoded
+    assert json.loads(encoded) == view(poker.state, first)
+
+    version = poker.state.version
+    actor = poker.state.in_play[poker.state.to_act]
+    poker.call(actor, 10)
+    update = json.loads(serializer.encode(poker.state, first, version))
+    assert update["since_version"] == version
+    assert [operation["path"] for operation in update["patch"]] == [
+        "/version", f"/bets/{actor}", "/pot", f"/stacks/{actor}", "/to_act"]
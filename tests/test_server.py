@@ -0,0 +1,53 @@
+import pytest
+
+import server
+from models.registry import WorkerPool
+
+
+@pytest.fixture
+def client():
+    server.tables = WorkerPool(1)
+    yield server.app.test_client()
+    server.tables.close()
+    server.tables = None
+
+
+def test_hand_endpoints(client):
+    table = f"/tables/{client.post('/tables').get_data(as_text=True)}"
+    seated = [client.post(f"{table}/add-player", json={"name": name}).get_json()
+              for name in ("first", "second")]
+    for player in seated:
+        client.post(f"{table}/buy-in",
+                    json={"player_uuid": player["player_uuid"], "amount": 100})
+    client.post(f"{table}/start-game")
+
+    first, second = (player["player_uuid"] for player in seated)
+    authorization = {"Authorization": f"Bearer {seated[0]['token']}"}
+
+    def post(endpoint, **body):
+        response = client.post(
+            f"{table}/{endpoint}", json=body, headers=authorization)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        return response.get_json()
+
+    def to_act():
+        return client.get(f"{table}/legal-actions").get_json()
+
+    holes = post("deal")["holes"]
+    assert len(holes[first]) == 2 and holes[second] is None
+    legal = to_act()
+    post("raise", player_uuid=legal["player_uuid"], amount=legal["min_amount"])
+    legal = to_act()
+    state = post("call", player_uuid=legal["player_uuid"], amount=legal["to_call"])
+    assert (state["pot"], sorted(state["bets"].values())) == (40, [20, 20])
+    assert post("end-round")["bets"] == {}
+    assert len(post("flop")["board"]) == 3
+    post("end-round")
+    assert len(post("turn")["board"]) == 4
+    post("end-round")
+    assert len(post("river")["board"]) == 5
+    post("end-round")
+    state = post("showdown")
+    assert state["winners"]
+    assert sum(state["stacks"].values()) == 200
+    assert client.get("/reconcile").get_json() == {}
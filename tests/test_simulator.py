@@ -0,0 +1,11 @@
+from models.simulator import Result, play
+
+
+def test_play_is_reproducible():
+    policies = ["tight", "random", "call_station"]
+    first = play(policies, 200, seed=1, sample_interval=50)
+    second = play(policies, 200, seed=1, sample_interval=50)
+    assert Result.to_dict(first)["net"] == Result.to_dict(second)["net"]
+    assert first.trajectories == second.trajectories
+    assert sum(first.net) == 0
+    assert sum(first.wins) == 200
@@ -0,0 +1,113 @@
+import copy
+import pickle
+
+import pytest
+
+from models.deck import Deck
+from models.poker import Poker
+from models.state import HISTORY_SIZE, State
+
+
+def test_transitions_keep_old_states():
+    poker = Poker()
+    first = poker.add_player("first")
+    second = poker.add_player("second")
+    poker.buy_in(first, 100)
+    poker.buy_in(second, 100)
+    seated = poker.state
+    poker.start_game()
+    started = poker.state
+    poker.deal()
+    poker.call(poker.state.in_play[0], 5)
+
+    assert seated.stacks == {first: 100, second: 100}
+    assert started.holes == {}
+    assert len(started.deck) == 52
+    assert len(poker.state.deck) == 48
+    assert poker.state.blinds is seated.blinds
+
+    with pytest.raises(AttributeError):
+        poker.state.pot = 0
+    with pytest.raises(TypeError):
+        poker.state.stacks[first] = 0
+
+
+def test_deck_copies_shuffle_independently():
+    deck = Deck(seed=1)
+    other = copy.copy(deck)
+    deck.shuffle()
+    other.shuffle()
+    assert [card.code for card in deck] == [card.code for card in other]
+
+
+def test_pickle():
+    poker = Poker()
+    poker.add_player("first")
+    state = pickle.loads(pickle.dumps(poker.state))
+    assert State.to_dict(state) == State.to_dict(poker.state)
+
+
+def _apply(document, patch):
+    document = copy.deepcopy(document)
+    for operation in patch:
+        *parents, name = operation["path"].split("/")[1:]
+        target = document
+        for parent in parents:
+            target = target[parent]
+        if operation["op"] == "remove":
+            del target[name]
+        else:
+            target[name] = operation["value"]
+    return document
+
+
+def test_diff():
+    poker = Poker()
+    players = [poker.add_player(str(index)) for index in range(4)]
+    states = [poker.state]
+    for player_uuid in players:
+        poker.buy_in(player_uuid, 100)
+        states.append(poker.state)
+    poker.start_game()
+    states.append(poker.state)
+    poker.deal()
+    states.append(poker.state)
+    for _ in range(3):
+        legal = poker.legal_actions()
+        poker.call(legal.player_uuid, legal.to_call)
+        states.append(poker.state)
+    poker.end_round()
+    states.append(poker.state)
+
+    for old in states:
+        for new in states[states.index(old):]:
+            patch = State.diff(new, old.version)
+            assert _apply(State.to_dict(old), patch) == State.to_dict(new)
+
+    assert State.diff(poker.state, poker.state.version) == [
+        {"op": "replace", "path": "/version", "value": poker.state.version}]
+    assert State.diff(poker.state, poker.state.version + 1) is None
+    for _ in range(HISTORY_SIZE + 1):
+        poker.end_round()
+    assert State.diff(poker.state, states[-1].version) is None
+
+
+def test_changelog_is_trimmed():
+    poker = Poker()
+    player_uuid = poker.add_player("first")
+    states = []
+    for amount in range(3 * HISTORY_SIZE):
+        poker.buy_in(player_uuid, amount + 1)
+        states.append(poker.state)
+    # Transitions link to the one before instead of copying the changelog,
+    # and drop the oldest links every HISTORY_SIZE
+    assert len(list(poker.state.changelog)) <= 2 * HISTORY_SIZE
+    for old in states[-HISTORY_SIZE - 1:]:
+        assert State.changes(poker.state, old.version) == (
+            {"stacks": {player_uuid}} if old is not poker.state else {})
+    assert State.changes(poker.state, states[-HISTORY_SIZE - 2].version) is None
+
+    state = pickle.loads(pickle.dumps(poker.state))
+    assert State.diff(state, states[-2].version) == State.diff(
+        poker.state, states[-2].version)
+
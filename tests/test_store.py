@@ -0,0 +1,45 @@
+import sqlite3
+
+from models.registry import TableManager
+from models.store import TableStore
+
+
+def test_batches_and_reloads(tmp_path):
+    path = str(tmp_path / "tables.sqlite3")
+    # No background commits, so only explicit flushes write
+    store = TableStore(path, flush_interval=3600)
+    manager = TableManager(store=store)
+    table_id = manager.create()
+    poker = manager.get(table_id)
+    first = poker.add_player("first")
+    second = poker.add_player("second")
+    poker.buy_in(first, 100)
+    poker.buy_in(second, 200)
+    # Pending, not committed, yet still what the table loads
+    other = TableStore(path)
+    assert other.stacks(table_id) == []
+    assert table_id not in other
+    other.close()
+    assert store.load(table_id) is poker.state
+    assert table_id in store
+
+    store.flush()
+    assert store.stacks(table_id) == [(str(first), 100), (str(second), 200)]
+    poker.cash_out(second)
+    store.close()
+
+    database = sqlite3.connect(path)
+    assert database.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    assert database.execute("SELECT COUNT(*) FROM tables").fetchone() == (1,)
+    database.close()
+
+    # Loaded lazily, on first lookup
+    store = TableStore(path)
+    manager = TableManager(store=store)
+    assert len(manager) == 0
+    state = manager.get(table_id).state
+    assert state.version == 5
+    assert state.players == (first,)
+    assert store.stacks(table_id) == [(str(first), 100)]
+    assert table_id in store and "0" * 32 not in store
+    store.close()
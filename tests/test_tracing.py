@@ -0,0 +1,36 @@
+from models import poker as poker_module
+from models.poker import Poker
+from models.tracing import Profiler, SpanRecorder
+
+
+def test_hooks_see_nested_spans():
+    poker = Poker(table_id="table")
+    player_uuid = poker.add_player("first")
+    recorder = SpanRecorder()
+    poker_module.add_hook(recorder)
+    try:
+        poker.buy_in(player_uuid, 100)
+    finally:
+        poker_module.remove_hook(recorder)
+    poker.buy_in(player_uuid, 100)
+
+    assert [span.name for span in recorder.spans] == ["State.new_state", "next"]
+    new_state, reducer = recorder.spans
+    assert new_state.parent is reducer
+    assert reducer.attributes == {
+        "type": "BUY_IN", "table_id": "table", "version": 1}
+    assert reducer.duration >= new_state.duration
+
+
+def test_profiler_samples_requests(tmp_path):
+    profiler = Profiler(every=2, directory=str(tmp_path))
+    poker = Poker()
+    for _ in range(4):
+        with profiler.request("add_player"):
+            poker.add_player("first")
+
+    lines = (tmp_path / "add_player.folded").read_text().splitlines()
+    stacks = [line.rsplit(" ", 1)[0] for line in lines]
+    assert all(stack.startswith("add_player") for stack in stacks)
+    assert any("new_state (state.py" in stack for stack in stacks)
+    assert all(int(line.rsplit(" ", 1)[1]) > 0 for line in lines)